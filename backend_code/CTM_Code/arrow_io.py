@@ -0,0 +1,76 @@
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # optional: without it every exchange stays CSV
+    pa = None
+
+# Cleaned corpora get an uncompressed Feather (Arrow IPC) copy next to their CSV, which
+# Python and R (with its arrow package) memory-map instead of parsing the CSV text.
+# CTM_ARROW=0 keeps every exchange in CSV even when pyarrow is installed.
+ARROW_ENABLED = pa is not None and os.environ.get("CTM_ARROW", "1") != "0"
+
+def arrow_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".feather"
+
+def current_arrow_copy(csv_path):
+    # The Feather copy of csv_path if it is usable and at least as new as the CSV, else None
+    path = arrow_path(csv_path)
+    if not ARROW_ENABLED or not os.path.exists(path):
+        return None
+    if os.path.getmtime(path) < os.path.getmtime(csv_path):
+        return None
+    return path
+
+def write_corpus(df, csv_path):
+    """
+    Writes a cleaned corpus as CSV (the copy that goes into the results) and,
+    when pyarrow is available, as an uncompressed Feather file next to it.
+    Text-like columns are stored as strings, so columns mixing numbers and
+    text (common in PoP exports) don't stop the Arrow copy from being written.
+    Both files are written under temp names and swapped in, never rewritten in
+    place: df may still be memory-mapped from the Feather file being replaced
+    (e.g. merge_corpora() writing back to its input), and truncating a mapped
+    file kills the process with SIGBUS.
+    """
+    tmp_csv = f"{csv_path}.{os.getpid()}.tmp"
+    df.to_csv(tmp_csv, index=False)
+    os.replace(tmp_csv, csv_path)
+    path = arrow_path(csv_path)
+    if not ARROW_ENABLED:
+        if os.path.exists(path):
+            os.remove(path)
+        return csv_path
+    table = df.reset_index(drop=True).astype({c: "string" for c in df.columns if df[c].dtype == object})
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        print(f"⚠️ Could not write the Arrow copy of {os.path.basename(csv_path)}, readers will use the CSV: {e}")
+        for stale in (tmp_path, path):
+            if os.path.exists(stale):
+                os.remove(stale)
+    return csv_path
+
+def read_corpus(csv_path, columns=None):
+    # A cleaned corpus as a DataFrame, memory-mapped from its Feather copy when there is one
+    path = current_arrow_copy(csv_path)
+    if path is None:
+        return pd.read_csv(csv_path, usecols=columns)
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+def iter_arrow_column(csv_path, column, batch_size):
+    """
+    Values of one column of a cleaned corpus's Feather copy, batch_size at a
+    time (None for missing values). Raises ValueError if the column is absent.
+    """
+    with pa.memory_map(arrow_path(csv_path)) as source:
+        reader = pa.ipc.open_file(source)
+        if column not in reader.schema.names:
+            raise ValueError(f"❌ Error: Input file must contain an '{column}' column.")
+        table = reader.read_all().select([column])
+        for batch in table.to_batches(max_chunksize=batch_size):
+            yield batch.column(0).to_pylist()
@@ -0,0 +1,114 @@
+"""
+Benchmarks the CTM engines against each other on one cleaned corpus: wall
+time, training log-likelihood (both report the same variational bound) and
+perplexity on the same held-out documents.
+
+    python -m CTM_Code.benchmark_engines path/to/cleaned.csv --k 5 --seeds 2026 2027
+
+Run it from backend_code/. The R engine is skipped if Rscript isn't installed.
+"""
+import os
+import csv
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+from CTM_Code.rscript import run_r, find_rscript
+from CTM_Code.r_pool import r_pool
+from CTM_Code.preprocess import build_dtm, read_abstracts, lemmatization_ready
+from CTM_Code import ctm_numpy
+from CTM_Code.topic_metrics import read_fit_stats
+
+def split_dtm(dtm_dir, abstracts, out_dir, holdout, seed):
+    # Train/test DTMs with the full vocabulary (same documents for both engines) plus the training CSV R needs
+    dtm, terms = ctm_numpy.read_dtm(dtm_dir)
+    rng = np.random.default_rng(seed)
+    test_idx = np.sort(rng.choice(dtm.shape[0], size=max(1, round(dtm.shape[0] * holdout)), replace=False))
+    train_idx = np.setdiff1d(np.arange(dtm.shape[0]), test_idx)
+
+    dirs = {}
+    for name, idx in (("train", train_idx), ("test", test_idx)):
+        part_dir = os.path.join(out_dir, name)
+        os.makedirs(part_dir, exist_ok=True)
+        part = dtm[idx].tocoo()
+        with open(os.path.join(part_dir, "dtm.mtx"), "w", encoding="utf-8") as f:
+            f.write("%%MatrixMarket matrix coordinate integer general\n")
+            f.write(f"{part.shape[0]} {part.shape[1]} {part.nnz}\n")
+            f.writelines(f"{i + 1} {j + 1} {int(v)}\n" for i, j, v in zip(part.row, part.col, part.data))
+        shutil.copy2(os.path.join(dtm_dir, "vocab.txt"), os.path.join(part_dir, "vocab.txt"))
+        dirs[name] = part_dir
+
+    train_csv = os.path.join(out_dir, "train.csv")
+    with open(train_csv, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Abstract"])
+        writer.writerows([abstracts[i]] for i in train_idx)
+    return dirs, train_csv
+
+def bench_r(dirs, train_csv, k, seed, work_dir):
+    os.makedirs(work_dir, exist_ok=True)
+    run_r(
+        "ctm_optimized.R",
+        [train_csv, "ctm_model", work_dir, f"--k={k}", f"--seed={seed}", f"--dtm={dirs['train']}",
+         f"--test-dtm={dirs['test']}", "--save-rdata=FALSE"],
+        "CTM benchmark", on_output=lambda line: None, cwd=work_dir
+    )
+    return read_fit_stats(os.path.join(work_dir, "CTMmods", "fit_stats.csv"))
+
+def bench_numpy(dirs, k, seed):
+    train, terms = ctm_numpy.read_dtm(dirs["train"])
+    test, _ = ctm_numpy.read_dtm(dirs["test"])
+    test = test[np.asarray(test.sum(axis=1)).ravel() > 0]
+    with ctm_numpy.blas_limits():
+        model = ctm_numpy.fit_ctm(train, terms, k, seed, on_output=lambda line: None)
+        score = ctm_numpy.perplexity(model, test)
+    return {"k": k, "logLik": model.loglik, "n_train": train.shape[0], "n_test": test.shape[0], "perplexity": score}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the R and NumPy CTM engines")
+    parser.add_argument("cleaned_csv")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[2026])
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--engines", nargs="+", default=["r", "numpy"])
+    parser.add_argument("--out", default="engine_benchmark.csv")
+    args = parser.parse_args()
+
+    if "r" in args.engines:
+        try:
+            # Time the fits, not R's startup: load the packages before the first run
+            r_pool.warm(find_rscript())
+        except FileNotFoundError as e:
+            print(f"⚠️ {e} Skipping the R engine.")
+            args.engines = [e for e in args.engines if e != "r"]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ctm_bench_") as tmp:
+        print("🔤 Building document-term matrix...")
+        # Both engines fit this DTM, so it follows the same lemma rule as the pipeline's
+        lemmatization_ready()
+        build_dtm(args.cleaned_csv, os.path.join(tmp, "dtm"))
+        dirs, train_csv = split_dtm(os.path.join(tmp, "dtm"), read_abstracts(args.cleaned_csv), tmp, args.holdout, args.seeds[0])
+
+        for seed in args.seeds:
+            for engine in args.engines:
+                start = time.perf_counter()
+                if engine == "r":
+                    stats = bench_r(dirs, train_csv, args.k, seed, os.path.join(tmp, f"r_{seed}"))
+                else:
+                    stats = bench_numpy(dirs, args.k, seed)
+                seconds = round(time.perf_counter() - start, 3)
+                results.append({"engine": engine, "seed": seed, "seconds": seconds, **stats})
+                print(f"⏱️ {engine} seed {seed}: {seconds}s, logLik {stats['logLik']}, held-out perplexity {stats['perplexity']}")
+
+    columns = ["engine", "seed", "k", "seconds", "logLik", "perplexity", "n_train", "n_test"]
+    with open(args.out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"📊 Benchmark written to {args.out}")
+
+if __name__ == "__main__":
+    main()
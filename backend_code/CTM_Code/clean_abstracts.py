@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 
+from CTM_Code.arrow_io import write_corpus, read_corpus
+
 def remove_empty_abstracts(input_excel_path, output_csv_path):
     """
     Loads the Excel metadata file, removes rows with missing or empty abstracts,
@@ -25,8 +27,50 @@ def remove_empty_abstracts(input_excel_path, output_csv_path):
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
 
-    # Save cleaned CSV
-    df_cleaned.to_csv(output_csv_path, index=False)
+    # Save cleaned CSV (plus its Arrow copy for the CTM engines)
+    write_corpus(df_cleaned, output_csv_path)
     print(f"✅ Cleaned data saved to {output_csv_path}")
 
     return output_csv_path
+
+def merge_corpora(base_csv_path, new_csv_path, output_csv_path):
+    """
+    Appends newly exported papers to an earlier run's cleaned corpus. The
+    earlier rows keep their order (so the previous model's documents line up)
+    and abstracts already in it are dropped from the new rows.
+    """
+    base = read_corpus(base_csv_path)
+    new = read_corpus(new_csv_path)
+
+    known = set(base['Abstract'].str.strip())
+    added = new[~new['Abstract'].str.strip().isin(known)].drop_duplicates(subset='Abstract')
+    merged = pd.concat([base, added], ignore_index=True)
+    print(f"➕ Added {len(added)} new papers to {len(base)} from the earlier run ({len(new) - len(added)} already there)")
+
+    write_corpus(merged, output_csv_path)
+    return output_csv_path, len(added)
+
+def sample_corpus(input_csv_path, output_csv_path, n, strata="Year", seed=2026):
+    """
+    Writes a random sample of about n rows of a cleaned corpus for a preview
+    fit. Every value of `strata` (missing ones included) keeps its share of
+    the rows and at least one of them, so the sample spans all years.
+    Returns (path, sampled rows, total rows).
+    """
+    df = read_corpus(input_csv_path)
+    if len(df) <= n:
+        sample = df
+    elif strata in df.columns:
+        fraction = n / len(df)
+        groups = df.groupby(df[strata].astype(str), sort=False)
+        sample = pd.concat(
+            group.sample(max(1, round(len(group) * fraction)), random_state=seed)
+            for _, group in groups
+        ).sort_index()
+    else:
+        sample = df.sample(n, random_state=seed).sort_index()
+    print(f"🎲 Sampled {len(sample)} of {len(df)} abstracts for the preview")
+
+    os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
+    write_corpus(sample, output_csv_path)
+    return output_csv_path, len(sample), len(df)
@@ -0,0 +1,309 @@
+import os
+import csv
+from contextlib import nullcontext
+import numpy as np
+from scipy import io as sparse_io
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # optional: without it NumPy keeps its own BLAS thread count
+    threadpool_limits = None
+
+from CTM_Code.r_pool import R_BLAS_THREADS
+from CTM_Code.preprocess import iter_abstract_chunks, dtm_paths
+from CTM_Code.posterior_io import save_matrix, write_terms
+from CTM_Code.topic_documents import summary_columns, summary_row, TOP_DOCS, SUMMARY_FILE
+
+# BLAS threads per fit, like CTM_R_BLAS_THREADS for the R engine
+NUMPY_BLAS_THREADS = int(os.environ.get("CTM_NUMPY_BLAS_THREADS", R_BLAS_THREADS))
+
+# Convergence settings (same names as the --em-tol/--var-tol flags of ctm_optimized.R)
+DEFAULT_CONTROL = {"em_tol": 1e-5, "em_max_iter": 1000, "var_tol": 1e-6, "var_max_iter": 500}
+
+# Documents summed into each topic's starting word distribution
+INIT_DOCS = 5
+# Newton steps per variational iteration for the topic variances
+NU_NEWTON_STEPS = 5
+# Largest change of a topic log-odds in one Newton step
+MAX_LAMBDA_STEP = 2.0
+# Floor for log topic-word probabilities of words a topic never uses
+LOG_BETA_FLOOR = -100.0
+# Non-zero DTM cells processed at once when pairing documents with words
+CHUNK_NNZ = 1 << 18
+
+class CTMModel:
+    """
+    Correlated topic model fitted by variational EM, as in topicmodels' CTM():
+    a logistic normal prior (mu, sigma) over the log-odds of the first k-1
+    topics (the last one is fixed at 0) and topic-word distributions log_beta.
+    doc_topics holds the posterior topic proportions of the fitted corpus.
+    """
+    def __init__(self, mu, sigma, log_beta, terms, doc_topics=None, loglik=None):
+        self.mu = mu
+        self.sigma = sigma
+        self.log_beta = log_beta
+        self.terms = list(terms)
+        self.doc_topics = doc_topics
+        self.loglik = loglik
+        self.k = log_beta.shape[0]
+        self.sigma_inv = np.linalg.inv(sigma)
+        self.log_det_sigma_inv = np.linalg.slogdet(self.sigma_inv)[1]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(
+                f, mu=self.mu, sigma=self.sigma, log_beta=self.log_beta, terms=np.array(self.terms),
+                doc_topics=self.doc_topics, loglik=np.array(self.loglik)
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            return cls(
+                saved["mu"], saved["sigma"], saved["log_beta"], saved["terms"].tolist(),
+                saved["doc_topics"], float(saved["loglik"])
+            )
+
+def blas_limits():
+    # Caps BLAS threads for one fit (a no-op without threadpoolctl)
+    return threadpool_limits(NUMPY_BLAS_THREADS, user_api="blas") if threadpool_limits else nullcontext()
+
+def read_dtm(dtm_dir):
+    # dtm.mtx/vocab.txt written by preprocess.build_dtm, as a CSR matrix of counts
+    paths = dtm_paths(dtm_dir)
+    dtm = sparse_io.mmread(paths["matrix"]).tocsr().astype(np.float64)
+    with open(paths["vocab"], "r", encoding="utf-8") as f:
+        terms = [line.rstrip("\n") for line in f]
+    return dtm, terms
+
+def _logsumexp(x):
+    top = x.max(axis=1, keepdims=True)
+    return (top + np.log(np.exp(x - top).sum(axis=1, keepdims=True))).ravel()
+
+def _word_terms(beta, dtm, rows, lam):
+    """
+    Word side of the E-step for topic log-odds lam. phi (word -> topic) is
+    never materialized: with E = exp(lam) and s_dw = sum_k E_dk beta_kw on the
+    DTM's non-zeros, phi_dwk = E_dk beta_kw / s_dw. Returns E (scaled per
+    document), the sparse matrix n_dw / s_dw and sum_w n_dw log s_dw per document.
+    """
+    shift = lam.max(axis=1, keepdims=True)
+    expected = np.exp(lam - shift)
+    beta_t = beta.T
+    s = np.empty(dtm.nnz)
+    for start in range(0, dtm.nnz, CHUNK_NNZ):
+        stop = min(start + CHUNK_NNZ, dtm.nnz)
+        s[start:stop] = np.einsum("ik,ik->i", expected[rows[start:stop]], beta_t[dtm.indices[start:stop]])
+    s = np.maximum(s, 1e-300)
+    ratio = dtm.copy()
+    ratio.data = dtm.data / s
+    word_lhood = np.bincount(rows, weights=dtm.data * np.log(s), minlength=dtm.shape[0])
+    word_lhood += np.asarray(dtm.sum(axis=1)).ravel() * shift.ravel()
+    return expected, ratio, word_lhood
+
+def _bound(model, lam, nu2, n_words, word_lhood):
+    # Per-document variational bound (the terms of ctm-c's likelihood, so logLik matches R's scale)
+    free = model.k - 1
+    centered = lam[:, :free] - model.mu
+    quad = np.einsum("dk,kj,dj->d", centered, model.sigma_inv, centered)
+    trace = nu2[:, :free] @ np.diag(model.sigma_inv)
+    log_zeta = _logsumexp(lam + nu2 / 2)
+    return (
+        0.5 * model.log_det_sigma_inv - 0.5 * (trace + quad)
+        - n_words * log_zeta + word_lhood
+        + 0.5 * (np.log(nu2[:, :free]) + 1).sum(axis=1)
+    )
+
+def e_step(model, dtm, lam=None, nu2=None, var_tol=DEFAULT_CONTROL["var_tol"], var_max_iter=DEFAULT_CONTROL["var_max_iter"]):
+    """
+    Variational inference for every document at once: Newton steps on the
+    topic log-odds (one batched k-1 x k-1 solve per document) and on the log
+    variances, until the total bound changes by less than var_tol.
+    Returns (lam, nu2, per-document bound, expected topic-word counts).
+    """
+    n_docs, free = dtm.shape[0], model.k - 1
+    rows = np.repeat(np.arange(n_docs), np.diff(dtm.indptr))
+    n_words = np.asarray(dtm.sum(axis=1)).ravel()
+    beta = np.exp(model.log_beta)
+    if lam is None:
+        lam = np.zeros((n_docs, model.k))
+        nu2 = np.zeros((n_docs, model.k))
+        nu2[:, :free] = 1.0
+    a = np.diag(model.sigma_inv)
+
+    previous = None
+    for _ in range(var_max_iter):
+        expected, ratio, word_lhood = _word_terms(beta, dtm, rows, lam)
+        bound = _bound(model, lam, nu2, n_words, word_lhood)
+        total = bound.sum()
+        if previous is not None and abs((previous - total) / previous) < var_tol:
+            break
+        previous = total
+
+        # Topic log-odds: Newton step on the bound with the word assignments held fixed
+        topic_counts = expected * (ratio @ beta.T)
+        p = np.exp(lam + nu2 / 2 - _logsumexp(lam + nu2 / 2)[:, None])[:, :free]
+        gradient = topic_counts[:, :free] - n_words[:, None] * p - (lam[:, :free] - model.mu) @ model.sigma_inv
+        hessian = model.sigma_inv[None] + n_words[:, None, None] * (
+            p[:, :, None] * np.eye(free)[None] - p[:, :, None] * p[:, None, :]
+        )
+        step = np.linalg.solve(hessian, gradient[:, :, None])[:, :, 0]
+        largest = np.abs(step).max(axis=1, keepdims=True)
+        lam[:, :free] += step * np.minimum(1.0, MAX_LAMBDA_STEP / np.maximum(largest, 1e-12))
+
+        # Topic variances: Newton on log(nu2) per topic with zeta held fixed
+        zeta = np.exp(_logsumexp(lam + nu2 / 2))
+        log_nu2 = np.log(nu2[:, :free])
+        for _ in range(NU_NEWTON_STEPS):
+            v = np.exp(log_nu2)
+            t = n_words[:, None] / zeta[:, None] * np.exp(lam[:, :free] + v / 2)
+            h = 0.5 * (1 - a * v - t * v)
+            dh = -0.5 * v * (a + t * (1 + v / 2))
+            log_nu2 = np.clip(log_nu2 - h / dh, -30.0, 3.0)
+        nu2[:, :free] = np.exp(log_nu2)
+
+    expected, ratio, word_lhood = _word_terms(beta, dtm, rows, lam)
+    bound = _bound(model, lam, nu2, n_words, word_lhood)
+    topic_word_counts = beta * (expected.T @ ratio)
+    return lam, nu2, bound, topic_word_counts
+
+def doc_topic_proportions(lam):
+    return np.exp(lam - _logsumexp(lam)[:, None])
+
+def initial_model(dtm, terms, k, seed):
+    # Each topic starts from the word counts of a few random documents plus smoothing
+    rng = np.random.default_rng(seed)
+    counts = np.ones((k, dtm.shape[1])) / dtm.shape[1]
+    for topic in range(k):
+        docs = rng.choice(dtm.shape[0], size=min(INIT_DOCS, dtm.shape[0]), replace=False)
+        counts[topic] += np.asarray(dtm[docs].sum(axis=0)).ravel()
+    log_beta = np.log(counts / counts.sum(axis=1, keepdims=True))
+    return CTMModel(np.zeros(k - 1), np.eye(k - 1), log_beta, terms)
+
+def m_step(lam, nu2, topic_word_counts, terms):
+    free = lam.shape[1] - 1
+    mu = lam[:, :free].mean(axis=0)
+    centered = lam[:, :free] - mu
+    sigma = (centered.T @ centered + np.diag(nu2[:, :free].sum(axis=0))) / lam.shape[0]
+    sigma += np.eye(free) * 1e-8
+    totals = topic_word_counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore"):
+        log_beta = np.maximum(np.log(topic_word_counts / np.maximum(totals, 1e-300)), LOG_BETA_FLOOR)
+    return CTMModel(mu, sigma, log_beta, terms)
+
+def fit_ctm(dtm, terms, k, seed=2026, control=None, on_output=print):
+    """
+    Fits a k-topic CTM to a sparse document-term matrix. Variational
+    parameters are warm-started from the previous EM iteration. Progress is
+    reported in topicmodels' verbose format so VemProgress can follow it.
+    """
+    control = {**DEFAULT_CONTROL, **(control or {})}
+    model = initial_model(dtm, terms, k, seed)
+    lam = nu2 = None
+    previous = None
+    for iteration in range(1, int(control["em_max_iter"]) + 1):
+        on_output(f"**** em iteration {iteration} ****")
+        lam, nu2, bound, topic_word_counts = e_step(
+            model, dtm, lam, nu2, control["var_tol"], int(control["var_max_iter"])
+        )
+        total = float(bound.sum())
+        conv = (previous - total) / previous if previous is not None else 1.0
+        on_output(f"bound: {total:.6f}  conv: {conv:.8f}")
+        model = m_step(lam, nu2, topic_word_counts, terms)
+        if previous is not None and abs(conv) < control["em_tol"]:
+            break
+        previous = total
+
+    # Final bound under the updated model, which is what logLik() reports for R fits
+    lam, nu2, bound, _ = e_step(model, dtm, lam, nu2, control["var_tol"], int(control["var_max_iter"]))
+    model.doc_topics = doc_topic_proportions(lam)
+    model.loglik = float(bound.sum())
+    return model
+
+def perplexity(model, dtm, control=None):
+    # exp(-bound per word) of documents the model was not fitted on, like topicmodels::perplexity()
+    control = {**DEFAULT_CONTROL, **(control or {})}
+    _, _, bound, _ = e_step(model, dtm, var_tol=control["var_tol"], var_max_iter=int(control["var_max_iter"]))
+    return float(np.exp(-bound.sum() / dtm.sum()))
+
+def write_matrix_csv(path, header, rows):
+    # Same layout as R's write.csv(..., row.names = FALSE): quoted header and strings
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def write_summaries(model, output_dir):
+    """
+    Writes the files ctm_summary.R writes (topics with top 15 keywords and
+    their top 10 documents, topic-word and doc-topic matrices as .npy, terms.txt).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    terms = np.exp(model.log_beta)
+    topics = model.doc_topics
+
+    summary = []
+    for i in range(model.k):
+        top_terms = np.argsort(-terms[i], kind="stable")[:15]
+        top_docs = np.argsort(-topics[:, i], kind="stable")[:TOP_DOCS]
+        summary.append(summary_row(
+            i + 1, "; ".join(model.terms[j] for j in top_terms), top_docs, topics[top_docs, i],
+            float(topics[:, i].sum() / topics.sum() * 100)
+        ))
+
+    write_matrix_csv(os.path.join(output_dir, SUMMARY_FILE), summary_columns(), summary)
+    save_matrix(os.path.join(output_dir, "topic_word.npy"), terms)
+    save_matrix(os.path.join(output_dir, "doc_topic.npy"), topics)
+    write_terms(model.terms, os.path.join(output_dir, "terms.txt"))
+    print(f"✅ All CTM summary outputs written to: {output_dir}")
+
+def run_numpy_ctm(dtm_dir, output_dir, model_path, params, on_output=None):
+    """
+    ctm_optimized.R for the NumPy engine: fits on the DTM (minus a seeded
+    holdout share scored by perplexity), saves the model to model_path and
+    writes CTMmods/fit_stats.csv. Doc-topic proportions cover every document.
+    """
+    on_output = on_output or (lambda line: print(f"🔧 CTM: {line}"))
+    dtm, terms = read_dtm(dtm_dir)
+    k = int(params["k"])
+    # Every pass, including the final inference over held-out documents, uses the same settings
+    control = {**DEFAULT_CONTROL, **(params.get("control") or {})}
+    on_output(f"📊 DTM loaded — terms: {len(terms)}  | docs: {dtm.shape[0]}")
+
+    train, test = dtm, None
+    holdout = params.get("holdout") or 0
+    if holdout > 0:
+        rng = np.random.default_rng(params.get("split_seed", params["seed"]))
+        test_idx = rng.choice(dtm.shape[0], size=max(1, round(dtm.shape[0] * holdout)), replace=False)
+        train = dtm[np.setdiff1d(np.arange(dtm.shape[0]), test_idx)]
+        test = dtm[test_idx]
+        test = test[np.asarray(test.sum(axis=1)).ravel() > 0]
+        on_output(f"✂️ Holding out {test.shape[0]} documents for scoring")
+
+    on_output(f"🧠 Running CTM with {k} topics...")
+    with blas_limits():
+        model = fit_ctm(train, terms, k, int(params["seed"]), control, on_output)
+        score = perplexity(model, test, control) if test is not None else None
+        if test is not None:
+            # Held-out documents get their topic proportions by inference, as in ctm_summary.R
+            lam, _, _, _ = e_step(model, dtm, var_tol=control["var_tol"], var_max_iter=int(control["var_max_iter"]))
+            model.doc_topics = doc_topic_proportions(lam)
+
+    mods_dir = os.path.join(output_dir, "CTMmods")
+    os.makedirs(mods_dir, exist_ok=True)
+    write_matrix_csv(
+        os.path.join(mods_dir, "fit_stats.csv"),
+        ["k", "logLik", "n_train", "n_test", "perplexity"],
+        [[k, model.loglik, train.shape[0], test.shape[0] if test is not None else 0, score if score is not None else "NA"]]
+    )
+    on_output(f"📈 Fit statistics — logLik: {model.loglik}  | held-out perplexity: {score}")
+    model.save(model_path)
+    return model
+
+def summarize_numpy_ctm(model_path, cleaned_csv, output_dir):
+    # assess_model.R for the NumPy engine
+    model = CTMModel.load(model_path)
+    n_docs = sum(len(chunk) for chunk in iter_abstract_chunks(cleaned_csv, 10000))
+    if n_docs != model.doc_topics.shape[0]:
+        raise ValueError(f"❌ Model has {model.doc_topics.shape[0]} documents but the input has {n_docs} abstracts.")
+    write_summaries(model, output_dir)
@@ -1,67 +1,322 @@
-import subprocess
 import shutil
 import os
 import sys
 import glob
+import json
+import hashlib
 
-HARDCODED_RSCRIPT = r"C:\Program Files\R\R-4.5.0\bin\Rscript.exe"
+from CTM_Code.rscript import run_r, find_rscript, SCRIPT_DIR
+from CTM_Code.topic_metrics import annotate_fit_stats
+from Pipeline_Code.lazy_imports import lazy
 
-def find_rscript():
-    if shutil.which("Rscript"):
-        return "Rscript"
-    if os.path.exists(HARDCODED_RSCRIPT):
-        return HARDCODED_RSCRIPT
-    raise FileNotFoundError("❌ Rscript executable not found.")
+# NumPy/SciPy engine; only imported when a job uses it
+run_numpy_ctm = lazy("CTM_Code.ctm_numpy", "run_numpy_ctm")
+summarize_numpy_ctm = lazy("CTM_Code.ctm_numpy", "summarize_numpy_ctm")
+run_online_lda = lazy("CTM_Code.online_lda", "run_online_lda")
+write_posterior_exports = lazy("CTM_Code.posterior_io", "write_exports")
+topic_shares = lazy("CTM_Code.posterior_io", "topic_shares")
+write_top_abstracts = lazy("CTM_Code.topic_documents", "write_top_abstracts")
+current_arrow_copy = lazy("CTM_Code.arrow_io", "current_arrow_copy")
 
-def run_ctm_analysis(base_filename, cleaned_csv):
-    rscript = find_rscript()
+# Fit and assess in one R session (CTM_COMBINED_ASSESS=0 runs assess_model.R separately)
+COMBINED_ASSESS = os.environ.get("CTM_COMBINED_ASSESS", "1") != "0"
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    output_base = os.path.join(base_dir, "outputs")
-    os.makedirs(output_base, exist_ok=True)
-    os.makedirs(os.path.join(output_base, "CTMmods"), exist_ok=True)
+# CTM engines: "r" runs topicmodels through ctm_optimized.R, "numpy" fits in-process
+# with ctm_numpy.py (needs the Python DTM), "online" streams the corpus through
+# mini-batch online LDA (online_lda.py). Each saves its model under its own name;
+# no output name carries a topic count, since model selection only picks k at run time.
+ENGINES = {
+    "r": ("rdata", "ctm_model.Rdata"),
+    "numpy": ("model", "ctm_model.npz"),
+    "online": ("model", "online_lda.joblib"),
+}
+# What each engine supports, checked instead of engine names:
+#   dtm:         "optional" (uses the Python DTM when there is one, else builds its own),
+#                "required" (only fits a Python DTM) or "streamed" (tokenizes the corpus itself)
+#   incremental: can warm-start from an earlier run's saved model (init_model)
+ENGINE_CAPABILITIES = {
+    "r": {"dtm": "optional", "incremental": True},
+    "numpy": {"dtm": "required", "incremental": False},
+    "online": {"dtm": "streamed", "incremental": True},
+}
+ENGINE = os.environ.get("CTM_ENGINE", "r")
+if ENGINE not in ENGINES:
+    raise ValueError(f"❌ Unknown CTM_ENGINE '{ENGINE}', use one of {sorted(ENGINES)}")
 
-    rdata_output = os.path.join(output_base, "CTMmods", "ctm5.Rdata")
-    ctm_output_csv = os.path.join(output_base, "CTMmods", "CTM10 - Topics With Keywords and Abstracts.csv")
-    final_output_path = os.path.join(output_base, f"{base_filename}_ctmResults.csv")
+# Posteriors are written as memory-mappable .npy files (topic_word.npy, doc_topic.npy
+# plus terms.txt); the old CSV copies of both matrices are an optional export
+POSTERIOR_CSV = os.environ.get("CTM_POSTERIOR_CSV", "0") == "1"
+# Also keep each topic's N most probable terms as a sparse matrix (0 = off)
+TOPIC_WORD_TOP_N = int(os.environ.get("CTM_TOPIC_WORD_TOP_N", 0))
+# Topic summaries reference their top documents by position in the cleaned corpus;
+# CTM_TOP_ABSTRACTS=0 skips resolving their text into "CTM - Top Abstracts.csv"
+TOP_ABSTRACTS = os.environ.get("CTM_TOP_ABSTRACTS", "1") != "0"
 
-    print("📦 CTM files loading...")
+# Model settings passed to ctm_optimized.R; part of every cache/coalescing key.
+# keep_rdata=False (CTM_KEEP_RDATA=0) leaves the saved model out of the results entirely
+MODEL_PARAMS = {
+    "k": 5,
+    "method": "VEM",
+    "seed": 2026,
+    "keep_rdata": os.environ.get("CTM_KEEP_RDATA", "1") != "0",
+    "engine": ENGINE,
+    "posterior_csv": POSTERIOR_CSV,
+    "topic_word_top_n": TOPIC_WORD_TOP_N,
+    "top_abstracts": TOP_ABSTRACTS,
+}
+
+def ctm_output_paths(base_filename, work_dir, params=MODEL_PARAMS):
+    # Every file run_ctm_analysis leaves behind in work_dir, by logical name
+    mods_dir = os.path.join(os.path.abspath(work_dir), "CTMmods")
+    model_name, model_file = ENGINES[params.get("engine", "r")]
+    paths = {
+        "summary": os.path.join(os.path.abspath(work_dir), f"{base_filename}_ctmResults.csv"),
+        model_name: os.path.join(mods_dir, model_file),
+        # Same name as topic_documents.SUMMARY_FILE (written by every engine)
+        "topics": os.path.join(mods_dir, "CTM - Topics With Keywords and Abstracts.csv"),
+        "topic_word": os.path.join(mods_dir, "topic_word.npy"),
+        "doc_topic": os.path.join(mods_dir, "doc_topic.npy"),
+        "terms": os.path.join(mods_dir, "terms.txt"),
+        "fit_stats": os.path.join(mods_dir, "fit_stats.csv"),
+    }
+    if params.get("topic_word_top_n"):
+        paths["topic_word_top"] = os.path.join(mods_dir, "topic_word_top.npz")
+    if params.get("top_abstracts"):
+        paths["top_abstracts"] = os.path.join(mods_dir, "CTM - Top Abstracts.csv")
+    if params.get("posterior_csv"):
+        paths["topic_word_csv"] = os.path.join(mods_dir, "CTM - Topic Word Matrix.csv")
+        paths["doc_topic_csv"] = os.path.join(mods_dir, "CTM - Doc Topic Matrix.csv")
+    if not params.get("keep_rdata", True):
+        del paths[model_name]
+    return paths
+
+def ctm_code_files():
+    # Source files whose edits change the CTM outputs (used for cache keys)
+    return [
+        os.path.abspath(__file__),
+        os.path.join(SCRIPT_DIR, "ctm_optimized.R"),
+        os.path.join(SCRIPT_DIR, "assess_model.R"),
+        os.path.join(SCRIPT_DIR, "ctm_summary.R"),
+        os.path.join(SCRIPT_DIR, "dtm_io.R"),
+        os.path.join(SCRIPT_DIR, "corpus_io.R"),
+        os.path.join(SCRIPT_DIR, "ctm_numpy.py"),
+        os.path.join(SCRIPT_DIR, "online_lda.py"),
+        os.path.join(SCRIPT_DIR, "posterior_io.py"),
+        os.path.join(SCRIPT_DIR, "topic_documents.py"),
+    ]
+
+# Topics covering less of the corpus than this are reported as nearly empty
+NEAR_EMPTY_TOPIC_SHARE = float(os.environ.get("CTM_NEAR_EMPTY_TOPIC_SHARE", 0.01))
+
+def record_fit_details(fit_stats_path, doc_topic_path, lemmatized):
+    """
+    Adds to fit_stats.csv how the terms were built and each topic's share of
+    the corpus (topic_<i>_share, plus min_topic_share), so nearly empty
+    topics show up in the results and not only in the charts.
+    """
+    columns = {"lemmatized": int(lemmatized)}
+    if os.path.exists(doc_topic_path):
+        shares = topic_shares(doc_topic_path)
+        columns.update({f"topic_{i}_share": round(float(share), 6) for i, share in enumerate(shares, start=1)})
+        columns["min_topic_share"] = round(float(shares.min()), 6)
+        for i, share in enumerate(shares, start=1):
+            if share < NEAR_EMPTY_TOPIC_SHARE:
+                print(f"⚠️ Topic {i} covers only {share:.2%} of the corpus")
+    annotate_fit_stats(fit_stats_path, **columns)
+
+# Differently seeded fits per k (CTM_RESTARTS); the one with the best log-likelihood is kept
+DEFAULT_RESTARTS = int(os.environ.get("CTM_RESTARTS", 1))
+MAX_RESTARTS = int(os.environ.get("CTM_MAX_RESTARTS", 16))
 
+# Share of documents held out for scoring when comparing several k
+SELECTION_HOLDOUT = float(os.environ.get("CTM_SELECTION_HOLDOUT", 0.2))
+
+def parse_k_values(text):
+    """
+    Topic counts from a request: "5", "3-8" or "4,6,8". Raises ValueError
+    for anything else or k < 2.
+    """
+    values = set()
     try:
-        result = subprocess.run(
-            [rscript, os.path.join("CTM_Code", "ctm_optimized.R"), cleaned_csv, "ctm5", output_base],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        # Print standard output and error from the R script
-        print("🔧 Rscript STDOUT:\n", result.stdout)
-        print("🛑 Rscript STDERR:\n", result.stderr)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"❌ Error running CTM script.\n🔧 STDOUT:\n{e.stdout}\n🛑 STDERR:\n{e.stderr}")
+        for part in str(text).replace(" ", "").split(","):
+            if "-" in part:
+                low, high = (int(v) for v in part.split("-", 1))
+                values.update(range(low, high + 1))
+            elif part:
+                values.add(int(part))
+    except ValueError:
+        values = set()
+    if not values or min(values) < 2:
+        raise ValueError(f"❌ Invalid topic counts '{text}': use e.g. 5, 3-8 or 4,6,8 (k >= 2)")
+    return sorted(values)
+
+# Share of each topic given to terms an earlier model never saw when it is updated incrementally
+NEW_TERM_MASS = float(os.environ.get("CTM_NEW_TERM_MASS", 0.05))
+
+# Preview fits: about CTM_PREVIEW_DOCS sampled abstracts with loose VEM convergence
+# settings (passed to ctm_optimized.R as --em-tol=... etc.)
+PREVIEW_DOCS = int(os.environ.get("CTM_PREVIEW_DOCS", 300))
+PREVIEW_CONTROL = {
+    "em_tol": float(os.environ.get("CTM_PREVIEW_EM_TOL", 1e-3)),
+    "em_max_iter": int(os.environ.get("CTM_PREVIEW_EM_MAX_ITER", 30)),
+    "var_tol": float(os.environ.get("CTM_PREVIEW_VAR_TOL", 1e-4)),
+    "var_max_iter": int(os.environ.get("CTM_PREVIEW_VAR_MAX_ITER", 50)),
+}
+
+def preview_params(params):
+    # One quick fit standing in for the full run: no restarts, holdout or k comparison
+    preview = {name: value for name, value in params.items() if name not in ("k_candidates", "restarts", "holdout")}
+    if params.get("k_candidates"):
+        preview["k"] = params["k_candidates"][len(params["k_candidates"]) // 2]
+    preview.update(control=PREVIEW_CONTROL, keep_rdata=False)
+    return preview
 
-    # Step 2: Check that the expected RData file was created
-    if not os.path.exists(rdata_output):
-        raise FileNotFoundError(f"❌ CTM .Rdata file not found at {rdata_output}")
+# Parameters that change the fitted model itself (keep_rdata only changes what we keep)
+FIT_PARAMS = ("k", "method", "seed", "holdout", "split_seed", "init_model", "new_term_mass", "control", "engine")
+
+def model_fingerprint(dtm_dir, params=MODEL_PARAMS):
+    """
+    Key of a fitted model: the DTM's counts and vocabulary, the fit settings
+    and the engine code that fits it. Two runs with different CSVs (extra
+    columns, other metadata) but the same DTM share a model.
+    """
+    engine_code = "ctm_numpy.py" if params.get("engine") == "numpy" else "ctm_optimized.R"
+    digest = hashlib.sha256()
+    for path in (
+        os.path.join(dtm_dir, "dtm.mtx"),
+        os.path.join(dtm_dir, "vocab.txt"),
+        os.path.join(SCRIPT_DIR, engine_code),
+    ):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    digest.update(json.dumps({name: params.get(name) for name in FIT_PARAMS}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def run_ctm_analysis(base_filename, cleaned_csv, work_dir, on_output=None, params=MODEL_PARAMS, combined=COMBINED_ASSESS, dtm_dir=None, model_cache=None, init_model=None, token_cache=None, lemmatized=True):
+    """
+    Fits the CTM and writes its summaries. Every file goes under work_dir
+    (one per pipeline run), so concurrent runs never touch the same paths.
+    With combined=True the summaries are written by the same R session that
+    fitted the model instead of a second assess_model.R run. With dtm_dir
+    (written by preprocess.build_dtm) R skips its own preprocessing, and a
+    model_cache (ArtifactCache) lets an identical DTM + settings reuse an
+    earlier fit: only assess_model.R runs against the cached model.
+    params["holdout"] > 0 fits on that share of documents less and writes the
+    held-out perplexity to fit_stats.csv (this always assesses in-session).
+    init_model (an earlier run's ctm_model.Rdata) warm-starts VEM from that model
+    instead of a random initialization; params["init_model"] should then hold
+    its hash so cache keys tell the two apart. params["control"] overrides
+    the VEM convergence settings (see PREVIEW_CONTROL). params["engine"] =
+    "numpy" fits with ctm_numpy.py instead of R and writes the same files
+    (the model is saved as ctm_model.npz); it needs dtm_dir. "online" fits LDA
+    by streaming cleaned_csv in mini-batches (token_cache speeds up its
+    tokenization) and can update an earlier online model with init_model.
+    Every engine writes the posteriors as .npy files; params["posterior_csv"]
+    and params["topic_word_top_n"] add CSV copies and a sparse top-N form.
+    Summaries reference each topic's top documents by corpus position;
+    params["top_abstracts"] resolves their text into a separate CSV.
+    lemmatized=False (Python tokenization without the lemma table) is
+    recorded in fit_stats.csv, along with each topic's share of the corpus.
+    """
+    output_base = os.path.abspath(work_dir)
+    cleaned_csv = os.path.abspath(cleaned_csv)
+    mods_dir = os.path.join(output_base, "CTMmods")
+    os.makedirs(mods_dir, exist_ok=True)
+
+    keep_rdata = params.get("keep_rdata", True)
+    holdout = params.get("holdout", 0)
+    engine = params.get("engine", "r")
+    combined = combined or holdout > 0
+    paths = ctm_output_paths(base_filename, output_base, params)
+    rdata_output = os.path.join(mods_dir, ENGINES[engine][1])
+    capabilities = ENGINE_CAPABILITIES[engine]
+    if capabilities["dtm"] == "required" and not dtm_dir:
+        raise ValueError(f"❌ The {engine} CTM engine needs the Python DTM (set CTM_PYTHON_DTM=1)")
+    if init_model and not capabilities["incremental"]:
+        incremental = sorted(name for name, c in ENGINE_CAPABILITIES.items() if c["incremental"])
+        raise ValueError(f"❌ The {engine} CTM engine can't update an earlier model, use one of {incremental}")
+    ctm_output_csv = paths["topics"]
+    final_output_path = paths["summary"]
+    # R reads the corpus from its Arrow copy when clean_abstracts.py wrote one
+    arrow_file = current_arrow_copy(cleaned_csv) if engine == "r" else None
+    arrow_args = [f"--arrow={arrow_file}"] if arrow_file else []
+
+    print("📦 CTM files loading...")
+
+    # Step 1: Reuse a model fitted on the same DTM with the same settings
+    # (engines that stream the corpus never read a DTM, so they have no model key)
+    model_key = model_fingerprint(dtm_dir, params) if model_cache and dtm_dir and capabilities["dtm"] != "streamed" else None
+    cached_model = None
+    if model_key:
+        with model_cache.checkout(model_key) as cached_model:
+            if cached_model is not None:
+                shutil.copy2(cached_model["model"], rdata_output)
+                shutil.copy2(cached_model["fit_stats"], paths["fit_stats"])
+    if cached_model is not None:
+        print(f"♻️ Reusing fitted CTM {model_key[:12]}")
+    elif engine == "online":
+        # Step 1 (online engine): streams the corpus and writes every summary itself
+        run_online_lda(cleaned_csv, output_base, rdata_output, params, on_output, token_cache, init_model)
+    elif engine == "numpy":
+        # Step 1 (NumPy engine): fit in this process, summaries are written below
+        run_numpy_ctm(dtm_dir, output_base, rdata_output, params, on_output)
+        if model_key:
+            model_cache.store(model_key, {"model": rdata_output, "fit_stats": paths["fit_stats"]})
+    else:
+        # Step 1: Run the CTM training R script (ctm_optimized.R), assessing in-session if combined.
+        # The model is always saved when it will go into the model cache.
+        save_rdata = keep_rdata or model_key is not None
+        ctm_args = [cleaned_csv, os.path.splitext(ENGINES["r"][1])[0], output_base, f"--k={params['k']}", f"--seed={params['seed']}"]
+        ctm_args += arrow_args
+        if dtm_dir:
+            ctm_args.append(f"--dtm={os.path.abspath(dtm_dir)}")
+        if init_model:
+            ctm_args += [f"--init-model={os.path.abspath(init_model)}", f"--new-term-mass={params.get('new_term_mass', NEW_TERM_MASS)}"]
+        for name, value in (params.get("control") or {}).items():
+            ctm_args.append(f"--{name.replace('_', '-')}={value}")
+        if holdout:
+            # Restarts of one run share the held-out documents so their likelihoods compare
+            ctm_args += [f"--holdout={holdout}", f"--split-seed={params.get('split_seed', params['seed'])}"]
+        if combined:
+            ctm_args += ["--assess=TRUE", f"--save-rdata={'TRUE' if save_rdata else 'FALSE'}"]
+        run_r("ctm_optimized.R", ctm_args, "CTM", on_output, cwd=output_base)
+
+        # Step 2: Check that the expected RData file was created
+        if (save_rdata or not combined) and not os.path.exists(rdata_output):
+            raise FileNotFoundError(f"❌ CTM .Rdata file not found at {rdata_output}")
+        if model_key:
+            model_cache.store(model_key, {"model": rdata_output, "fit_stats": paths["fit_stats"]})
 
     # Step 3: Run the R script to assess and summarize the model (assess_model.R)
-    try:
-        assess = subprocess.run(
-            [rscript, os.path.join("CTM_Code", "assess_model.R"), rdata_output, cleaned_csv],
-            check=True,
-            capture_output=True,
-            text=True
+    if engine == "numpy":
+        summarize_numpy_ctm(rdata_output, cleaned_csv, mods_dir)
+    elif engine == "r" and (not combined or cached_model is not None):
+        assess_args = [rdata_output, cleaned_csv, mods_dir]
+        if holdout and dtm_dir:
+            assess_args.append(f"--dtm={os.path.abspath(dtm_dir)}")
+        run_r(
+            "assess_model.R",
+            assess_args,
+            "Assess model",
+            on_output,
+            cwd=output_base
         )
-        # Print standard output and error from the assessment R script
-        print("🔧 Assess STDOUT:\n", assess.stdout)
-        print("🛑 Assess STDERR:\n", assess.stderr)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"❌ Error running the Assess model script.\n🔧 STDOUT:\n{e.stdout}\n🛑 STDERR:\n{e.stderr}")
+    if not keep_rdata and os.path.exists(rdata_output):
+        os.remove(rdata_output)
+    if os.path.exists(paths["fit_stats"]):
+        record_fit_details(paths["fit_stats"], paths["doc_topic"], lemmatized)
+    if params.get("posterior_csv") or params.get("topic_word_top_n"):
+        write_posterior_exports(paths, params)
 
     # Step 4: Make sure the final output CSV was generated
     if not os.path.exists(ctm_output_csv):
         raise FileNotFoundError(f"❌ CTM output CSV not found at {ctm_output_csv}")
 
+    # Step 4b: Resolve the summary's top documents to their abstracts for readers of the results
+    if params.get("top_abstracts"):
+        write_top_abstracts(ctm_output_csv, cleaned_csv, paths["top_abstracts"])
+
     # Step 5: Copy the output summary CSV to a new location with a clearer name
     try:
         shutil.copy(ctm_output_csv, final_output_path)
@@ -69,5 +324,13 @@ def run_ctm_analysis(base_filename, cleaned_csv):
     except Exception as e:
         raise RuntimeError(f"❌ Error copying output file: {str(e)}")
 
-    # Return paths of the final output files
-    return final_output_path, rdata_output
\ No newline at end of file
+    # Return paths of the final output files (no saved model unless it was kept)
+    return final_output_path, paths.get(ENGINES[engine][0])
+
+def engine_for_model(model_path):
+    # Engine that saved a model file (runs from before the rename kept R models as ctm5.Rdata)
+    extension = os.path.splitext(model_path)[1]
+    for engine, (_, model_file) in ENGINES.items():
+        if os.path.splitext(model_file)[1] == extension:
+            return engine
+    raise ValueError(f"❌ No CTM engine saves models like {os.path.basename(model_path)}")
\ No newline at end of file
@@ -0,0 +1,225 @@
+import os
+import heapq
+import shutil
+from collections import Counter
+import joblib
+import numpy as np
+from scipy import sparse
+from scipy.special import digamma, gammaln
+from sklearn.decomposition import LatentDirichletAllocation
+
+from CTM_Code.preprocess import iter_abstract_chunks, count_terms, sparse_vocabulary, lemmatization_ready, PREPROCESS_WORKERS
+from CTM_Code.ctm_numpy import write_matrix_csv
+from CTM_Code.posterior_io import save_matrix, open_matrix, write_terms
+from CTM_Code.topic_documents import summary_columns, summary_row, TOP_DOCS, SUMMARY_FILE
+
+# Documents read, tokenized and fed to partial_fit at a time; memory is bounded by this
+ONLINE_BATCH_SIZE = int(os.environ.get("CTM_ONLINE_BATCH_SIZE", 1024))
+# Passes over the corpus, stopping early once the topics change less than CTM_ONLINE_TOL
+ONLINE_PASSES = int(os.environ.get("CTM_ONLINE_PASSES", 10))
+ONLINE_TOL = float(os.environ.get("CTM_ONLINE_TOL", 1e-3))
+# Step size schedule of online variational Bayes (Hoffman et al.): (offset + updates) ** -decay
+ONLINE_LEARNING_DECAY = float(os.environ.get("CTM_ONLINE_LEARNING_DECAY", 0.7))
+ONLINE_LEARNING_OFFSET = float(os.environ.get("CTM_ONLINE_LEARNING_OFFSET", 10.0))
+# Distinct terms counted while building the vocabulary before the rarest are dropped
+VOCAB_PRUNE_AT = int(os.environ.get("CTM_ONLINE_VOCAB_PRUNE_AT", 2_000_000))
+
+def stream_counts(cleaned_csv, batch_size, token_cache=None):
+    # (abstracts, term counts per abstract) one batch at a time
+    for abstracts in iter_abstract_chunks(cleaned_csv, batch_size):
+        yield abstracts, count_terms(abstracts, PREPROCESS_WORKERS, token_cache)
+
+def build_vocabulary(cleaned_csv, batch_size, token_cache=None):
+    """
+    First pass: document frequencies of every term, then the same sparsity
+    filter as the DTM. Returns (vocabulary, number of documents).
+    """
+    doc_freq = Counter()
+    n_docs = 0
+    for _, counts in stream_counts(cleaned_csv, batch_size, token_cache):
+        n_docs += len(counts)
+        for doc in counts:
+            doc_freq.update(doc.keys())
+        if len(doc_freq) > VOCAB_PRUNE_AT:
+            # Terms this rare can't pass the filter unless they are very late bloomers
+            doc_freq = Counter(dict(doc_freq.most_common(VOCAB_PRUNE_AT // 2)))
+    vocab = sparse_vocabulary(doc_freq, n_docs)
+    if not vocab or not n_docs:
+        raise ValueError("❌ DTM is empty after filtering. Adjust sparsity threshold or check data.")
+    return vocab, n_docs
+
+def spill_batches(cleaned_csv, vocab, batch_dir, batch_size, holdout=0, split_seed=2026, token_cache=None):
+    """
+    Second pass: vectorizes each batch once and saves it (plus which of its
+    documents are held out) under batch_dir, so later passes read sparse
+    counts from disk instead of tokenizing again. Returns the batch files.
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    index = {term: j for j, term in enumerate(vocab)}
+    rng = np.random.default_rng(split_seed)
+    batches = []
+    for i, (_, counts) in enumerate(stream_counts(cleaned_csv, batch_size, token_cache)):
+        rows, cols, values = [], [], []
+        for row, doc in enumerate(counts):
+            for term, n in doc.items():
+                if term in index:
+                    rows.append(row)
+                    cols.append(index[term])
+                    values.append(n)
+        counts_path = os.path.join(batch_dir, f"batch_{i:06d}.npz")
+        held_out_path = os.path.join(batch_dir, f"held_out_{i:06d}.npy")
+        sparse.save_npz(counts_path, sparse.csr_matrix((values, (rows, cols)), shape=(len(counts), len(vocab)), dtype=np.float64))
+        np.save(held_out_path, rng.random(len(counts)) < holdout if holdout else np.zeros(len(counts), dtype=bool))
+        batches.append((counts_path, held_out_path))
+    return batches
+
+def load_batch(batch):
+    counts_path, held_out_path = batch
+    return sparse.load_npz(counts_path).tocsr(), np.load(held_out_path)
+
+def topic_word_bound(lda):
+    # E[log p(beta | eta) - log q(beta | lambda)]: the part of lda.score() that doesn't depend on the documents
+    lam = lda.components_
+    eta = lda.topic_word_prior_
+    e_log_beta = digamma(lam) - digamma(lam.sum(axis=1))[:, None]
+    return float(
+        np.sum((eta - lam) * e_log_beta) + np.sum(gammaln(lam) - gammaln(eta))
+        + np.sum(gammaln(eta * lam.shape[1]) - gammaln(lam.sum(axis=1)))
+    )
+
+def new_lda(k, seed, n_train, control):
+    return LatentDirichletAllocation(
+        n_components=k,
+        learning_method="online",
+        learning_decay=ONLINE_LEARNING_DECAY,
+        learning_offset=ONLINE_LEARNING_OFFSET,
+        batch_size=ONLINE_BATCH_SIZE,
+        total_samples=max(n_train, 1),
+        max_doc_update_iter=int(control.get("var_max_iter", 100)),
+        mean_change_tol=float(control.get("var_tol", 1e-3)),
+        random_state=seed,
+    )
+
+def run_online_lda(cleaned_csv, output_dir, model_path, params, on_output=None, token_cache=None, init_model=None):
+    """
+    Mini-batch online LDA over the cleaned CSV, for corpora too large for the
+    batch CTM. Memory stays bounded by ONLINE_BATCH_SIZE: the corpus is read in
+    batches to build the vocabulary, spilled to sparse batch files once, and
+    every pass feeds those to partial_fit. Writes the same CTMmods files as
+    ctm_optimized.R --assess=TRUE (topics, topic-word and doc-topic .npy
+    matrices, terms.txt, fit_stats.csv) and saves the model to model_path.
+    With init_model (an earlier run's saved model, whose corpus is the start of
+    this one) only the appended documents are fed to partial_fit; the earlier
+    vocabulary is kept, so terms it never saw are ignored.
+    """
+    on_output = on_output or (lambda line: print(f"🔧 Online LDA: {line}"))
+    # Tokens follow the Python DTM's rule: without the lemma table this is an error
+    # (unless CTM_REQUIRE_LEMMAS=0), not a silently different vocabulary
+    lemmatization_ready()
+    k = int(params["k"])
+    control = params.get("control") or {}
+    holdout = params.get("holdout") or 0
+    passes = min(ONLINE_PASSES, int(control.get("em_max_iter", ONLINE_PASSES)))
+    tol = float(control.get("em_tol", ONLINE_TOL))
+
+    if init_model:
+        saved = joblib.load(init_model)
+        lda, vocab, first_new = saved["lda"], saved["vocab"], saved["n_docs"]
+        on_output(f"🔁 Updating an online LDA fitted on {first_new} documents")
+    else:
+        lda, first_new = None, 0
+        vocab, _ = build_vocabulary(cleaned_csv, ONLINE_BATCH_SIZE, token_cache)
+    batch_dir = os.path.join(output_dir, "online_batches")
+    batches = spill_batches(
+        cleaned_csv, vocab, batch_dir, ONLINE_BATCH_SIZE, holdout,
+        params.get("split_seed", params["seed"]), token_cache
+    )
+
+    # Documents partial_fit learns from: not held out, and new when updating an earlier model
+    n_train = n_total = 0
+    for i, batch in enumerate(batches):
+        _, held_out = load_batch(batch)
+        n_train += int((~held_out[max(0, first_new - i * ONLINE_BATCH_SIZE):]).sum())
+        n_total += len(held_out)
+    on_output(f"📊 Vocabulary — terms: {len(vocab)}  | batches: {len(batches)}  | training docs: {n_train}")
+
+    if lda is None:
+        lda = new_lda(k, int(params["seed"]), n_train, control)
+    else:
+        k = lda.n_components
+        lda.total_samples = max(n_train, 1)
+
+    on_output(f"🧠 Running online LDA with {k} topics...")
+    for iteration in range(1, passes + 1):
+        on_output(f"**** em iteration {iteration} ****")
+        before = lda.components_ / lda.components_.sum(axis=1, keepdims=True) if hasattr(lda, "components_") else None
+        for i, batch in enumerate(batches):
+            counts, held_out = load_batch(batch)
+            train = ~held_out
+            train[:max(0, first_new - i * ONLINE_BATCH_SIZE)] = False
+            if train.any():
+                lda.partial_fit(counts[train])
+        if before is None:
+            continue
+        after = lda.components_ / lda.components_.sum(axis=1, keepdims=True)
+        change = float(np.abs(after - before).sum() / before.sum())
+        on_output(f"topic-word change conv: {change:.8f}")
+        if change < tol:
+            break
+
+    # Final pass: doc-topic rows go straight into a memory-mapped .npy, only the top documents per topic are kept
+    mods_dir = os.path.join(output_dir, "CTMmods")
+    os.makedirs(mods_dir, exist_ok=True)
+    topic_word = lda.components_ / lda.components_.sum(axis=1, keepdims=True)
+    beta_bound = topic_word_bound(lda)
+    top_docs = [[] for _ in range(k)]
+    topic_totals = np.zeros(k)
+    train_bound, test_bound, test_words, n_test, n_docs = beta_bound, 0.0, 0.0, 0, 0
+    doc_topic = open_matrix(os.path.join(mods_dir, "doc_topic.npy"), (n_total, k))
+    for batch in batches:
+        counts, held_out = load_batch(batch)
+        theta = lda.transform(counts)
+        doc_topic[n_docs:n_docs + len(theta)] = theta
+        topic_totals += theta.sum(axis=0)
+        for topic in range(k):
+            for row in np.argsort(-theta[:, topic], kind="stable")[:TOP_DOCS]:
+                # Ties go to the earlier document, like R's order()
+                item = (theta[row, topic], -(n_docs + row))
+                if len(top_docs[topic]) < TOP_DOCS:
+                    heapq.heappush(top_docs[topic], item)
+                else:
+                    heapq.heappushpop(top_docs[topic], item)
+        if (~held_out).any():
+            train_bound += lda.score(counts[~held_out]) - beta_bound
+        if held_out.any():
+            test_bound += lda.score(counts[held_out]) - beta_bound
+            test_words += counts[held_out].sum()
+            n_test += int(held_out.sum())
+        n_docs += len(theta)
+    doc_topic.flush()
+    del doc_topic
+
+    summary = []
+    for i in range(k):
+        keywords = "; ".join(vocab[j] for j in np.argsort(-topic_word[i], kind="stable")[:15])
+        best = sorted(top_docs[i], reverse=True)
+        summary.append(summary_row(
+            i + 1, keywords, [-doc for _, doc in best], [score for score, _ in best],
+            float(topic_totals[i] / topic_totals.sum() * 100)
+        ))
+    write_matrix_csv(os.path.join(mods_dir, SUMMARY_FILE), summary_columns(), summary)
+    save_matrix(os.path.join(mods_dir, "topic_word.npy"), topic_word)
+    write_terms(vocab, os.path.join(mods_dir, "terms.txt"))
+
+    score = float(np.exp(-test_bound / test_words)) if test_words else None
+    write_matrix_csv(
+        os.path.join(mods_dir, "fit_stats.csv"),
+        ["k", "logLik", "n_train", "n_test", "perplexity"],
+        [[k, train_bound, n_docs - n_test, n_test, score if score is not None else "NA"]]
+    )
+    on_output(f"📈 Fit statistics — logLik: {train_bound}  | held-out perplexity: {score}")
+
+    joblib.dump({"lda": lda, "vocab": vocab, "n_docs": n_docs}, model_path)
+    shutil.rmtree(batch_dir, ignore_errors=True)
+    print(f"✅ All CTM summary outputs written to: {mods_dir}")
+    return model_path
@@ -0,0 +1,70 @@
+import os
+import csv
+import numpy as np
+from scipy import sparse
+
+# Rows converted at a time when exporting CSVs or picking the top terms
+EXPORT_CHUNK = int(os.environ.get("CTM_POSTERIOR_CHUNK", 4096))
+
+def write_terms(terms, path):
+    # One term per line, in the column order of the topic-word matrix
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{term}\n" for term in terms)
+
+def read_terms(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f]
+
+def save_matrix(path, matrix):
+    np.save(path, np.ascontiguousarray(matrix, dtype=np.float64))
+
+def open_matrix(path, shape):
+    # Preallocated .npy on disk for writers that produce the rows a batch at a time
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape)
+
+def load_matrix(path):
+    # Memory-mapped: only the rows (or blocks) a caller touches are read from disk
+    return np.load(path, mmap_mode="r")
+
+def topic_shares(doc_topic_path):
+    # Share of the corpus each topic covers (column sums of the doc-topic matrix over their total)
+    doc_topic = load_matrix(doc_topic_path)
+    totals = np.zeros(doc_topic.shape[1])
+    for start in range(0, doc_topic.shape[0], EXPORT_CHUNK):
+        totals += np.asarray(doc_topic[start:start + EXPORT_CHUNK]).sum(axis=0)
+    return totals / totals.sum() if totals.sum() else totals
+
+def write_top_terms(topic_word_path, output_path, top_n):
+    """
+    Sparse topics x terms matrix keeping each topic's top_n probabilities
+    (everything else dropped), saved with scipy.sparse.save_npz.
+    """
+    topic_word = load_matrix(topic_word_path)
+    n = min(top_n, topic_word.shape[1])
+    blocks = []
+    for start in range(0, topic_word.shape[0], EXPORT_CHUNK):
+        block = np.asarray(topic_word[start:start + EXPORT_CHUNK])
+        cols = np.argpartition(-block, n - 1, axis=1)[:, :n]
+        rows = np.repeat(np.arange(block.shape[0]), n)
+        blocks.append(sparse.csr_matrix(
+            (np.take_along_axis(block, cols, axis=1).ravel(), (rows, cols.ravel())), shape=block.shape
+        ))
+    sparse.save_npz(output_path, sparse.vstack(blocks).tocsr())
+
+def export_csv(matrix_path, csv_path, header):
+    # Same layout as R's write.csv(..., row.names = FALSE), streamed a block of rows at a time
+    matrix = load_matrix(matrix_path)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, quoting=csv.QUOTE_NONNUMERIC).writerow(header)
+        for start in range(0, matrix.shape[0], EXPORT_CHUNK):
+            np.savetxt(f, matrix[start:start + EXPORT_CHUNK], fmt="%.15g", delimiter=",")
+
+def write_exports(paths, params):
+    # The optional files ctm_output_paths() lists, derived from the .npy posteriors
+    if "topic_word_top" in paths:
+        write_top_terms(paths["topic_word"], paths["topic_word_top"], int(params["topic_word_top_n"]))
+    if "topic_word_csv" in paths:
+        export_csv(paths["topic_word"], paths["topic_word_csv"], read_terms(paths["terms"]))
+    if "doc_topic_csv" in paths:
+        k = load_matrix(paths["doc_topic"]).shape[1]
+        export_csv(paths["doc_topic"], paths["doc_topic_csv"], [str(i) for i in range(1, k + 1)])
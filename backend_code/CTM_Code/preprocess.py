@@ -0,0 +1,319 @@
+import os
+import re
+import csv
+import sys
+import shutil
+import hashlib
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from CTM_Code.rscript import run_r, SCRIPT_DIR
+from Pipeline_Code.lazy_imports import lazy
+
+# Arrow copies of cleaned corpora (optional pyarrow); imported when a corpus is first read
+current_arrow_copy = lazy("CTM_Code.arrow_io", "current_arrow_copy")
+iter_arrow_column = lazy("CTM_Code.arrow_io", "iter_arrow_column")
+
+# Bump whenever the normalization below changes so cached DTMs are rebuilt
+PREPROCESS_VERSION = 1
+
+# CTM_PYTHON_DTM: "auto" (use it when the lemma table is available), "1" (always), "0" (never)
+PYTHON_DTM = os.environ.get("CTM_PYTHON_DTM", "auto")
+# Tokenizing in Python without the lemma table gives a different vocabulary from R's tm
+# pipeline, so it is an error unless CTM_REQUIRE_LEMMAS=0 accepts unlemmatized terms
+REQUIRE_LEMMAS = os.environ.get("CTM_REQUIRE_LEMMAS", "1") != "0"
+PREPROCESS_WORKERS = int(os.environ.get("CTM_PREPROCESS_WORKERS", os.cpu_count() or 1))
+# Below this many abstracts a process pool costs more than it saves
+PARALLEL_MIN_DOCS = int(os.environ.get("CTM_PREPROCESS_PARALLEL_MIN_DOCS", 2000))
+# How tokenizer processes start. spawn re-imports the parent's main script (app.py, with the
+# Flask app and its startup work) in every child; fork doesn't, and the children only run
+# normalize(), which takes no locks another server thread could be holding
+PREPROCESS_START_METHOD = os.environ.get(
+    "CTM_PREPROCESS_START_METHOD", "fork" if sys.platform.startswith("linux") else "spawn"
+)
+
+# Exported by export_lemmas.R on first use. Hosts without R (e.g. running the numpy engine)
+# can point CTM_LEMMA_FILE at a copy exported elsewhere instead.
+LEMMA_FILE = os.environ.get("CTM_LEMMA_FILE", os.path.join(SCRIPT_DIR, "lemmas.tsv"))
+# Copy of export_lemmas.R's output committed next to the code, used when the export fails
+BUNDLED_LEMMA_FILE = os.path.join(SCRIPT_DIR, "lemmas_bundled.tsv")
+
+# tm::stopwords("english"), plus the query words ctm_optimized.R also removes
+TM_STOPWORDS = """
+i me my myself we our ours ourselves you your yours yourself yourselves he him his himself
+she her hers herself it its itself they them their theirs themselves what which who whom this
+that these those am is are was were be been being have has had having do does did doing would
+should could ought i'm you're he's she's it's we're they're i've you've we've they've i'd you'd
+he'd she'd we'd they'd i'll you'll he'll she'll we'll they'll isn't aren't wasn't weren't hasn't
+haven't hadn't doesn't don't didn't won't wouldn't shan't shouldn't can't cannot couldn't mustn't
+let's that's who's what's here's there's when's where's why's how's a an the and but if or
+because as until while of at by for with about against between into through during before after
+above below to from up down in out on off over under again further then once here there when
+where why how all any both each few more most other some such no nor not only own same so than
+too very
+""".split()
+EXTRA_STOPWORDS = ["food", "security", "insecurity"]
+
+# DocumentTermMatrix's default wordLengths = c(3, Inf)
+MIN_TERM_LENGTH = 3
+
+DTM_FILES = {"matrix": "dtm.mtx", "vocab": "vocab.txt"}
+
+# Same regex tm::removeWords builds: longest words first, whole words only
+_STOPWORD_RE = re.compile(
+    r"\b(" + "|".join(re.escape(w) for w in sorted(TM_STOPWORDS + EXTRA_STOPWORDS, reverse=True)) + r")\b"
+)
+_DIGITS_RE = re.compile(r"[0-9]+")
+
+_punctuation_table = None
+_lemmas = {}
+_loaded_lemma_signature = None
+# Set once export_lemmas.R has failed, so later jobs don't start R again just to fail
+_lemma_export_failed = False
+
+def punctuation_table():
+    # str.translate table deleting every Unicode punctuation (P*) character, like removePunctuation(ucp = TRUE)
+    global _punctuation_table
+    if _punctuation_table is None:
+        _punctuation_table = {
+            cp: None for cp in range(sys.maxunicode + 1)
+            if unicodedata.category(chr(cp)).startswith("P")
+        }
+    return _punctuation_table
+
+def ensure_lemmas():
+    """
+    Exports lexicon::hash_lemmas (textstem's default dictionary) once with
+    export_lemmas.R. A failed export (e.g. no R) isn't retried in this
+    process; the bundled table is copied into place instead when there is
+    one. Returns True if the lemma table is available.
+    """
+    global _lemma_export_failed
+    if os.path.exists(LEMMA_FILE):
+        return True
+    tmp_path = f"{LEMMA_FILE}.{os.getpid()}.tmp"
+    if not _lemma_export_failed:
+        try:
+            run_r("export_lemmas.R", [tmp_path], "Export lemmas", cwd=SCRIPT_DIR)
+            os.replace(tmp_path, LEMMA_FILE)
+            return True
+        except (OSError, RuntimeError) as e:
+            _lemma_export_failed = True
+            print(f"⚠️ Could not export the lemma dictionary, not retrying until restart: {e}")
+    if os.path.exists(BUNDLED_LEMMA_FILE):
+        shutil.copyfile(BUNDLED_LEMMA_FILE, tmp_path)
+        os.replace(tmp_path, LEMMA_FILE)
+        print(f"📚 Using the bundled lemma dictionary {os.path.basename(BUNDLED_LEMMA_FILE)}")
+        return True
+    return False
+
+def lemmas_available():
+    return os.path.exists(LEMMA_FILE)
+
+def lemmatization_ready():
+    """
+    For code that must tokenize in Python: exports the lemma table if needed.
+    Raises RuntimeError when it can't be had, unless CTM_REQUIRE_LEMMAS=0, in
+    which case it returns False and the terms stay unlemmatized.
+    """
+    if ensure_lemmas():
+        return True
+    if REQUIRE_LEMMAS:
+        raise RuntimeError(
+            "❌ Tokenizing in Python needs the lemma dictionary (export_lemmas.R, which needs R with "
+            "the lexicon package) to match the R pipeline's terms. Without R, commit an exported table as "
+            "CTM_Code/lemmas_bundled.tsv, set CTM_LEMMA_FILE to one, or set CTM_REQUIRE_LEMMAS=0 to go on "
+            "without lemmatization."
+        )
+    return False
+
+def python_dtm_enabled():
+    # Whether the pipeline should build the DTM here instead of inside ctm_optimized.R
+    if PYTHON_DTM == "0":
+        return False
+    if PYTHON_DTM == "1":
+        lemmatization_ready()
+        return True
+    return ensure_lemmas()
+
+def load_lemmas(path=LEMMA_FILE):
+    lemmas = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            next(f, None)
+            for line in f:
+                token, _, lemma = line.rstrip("\n").partition("\t")
+                if token and lemma:
+                    lemmas[token] = lemma
+    return lemmas
+
+def _init_worker(lemma_path):
+    # (Re)loads the lemma table when it differs from the one the cache keys were built with
+    global _lemmas, _loaded_lemma_signature
+    signature = lemma_signature()
+    if signature != _loaded_lemma_signature:
+        _lemmas = load_lemmas(lemma_path)
+        _loaded_lemma_signature = signature
+    punctuation_table()
+
+def normalize(text, lemmas=None):
+    """
+    Mirrors the tm_map chain in ctm_optimized.R: tolower, removePunctuation
+    (Unicode), removeNumbers, removeWords(stopwords), lemmatize_strings,
+    stripWhitespace. Returns the document's tokens.
+    """
+    lemmas = _lemmas if lemmas is None else lemmas
+    text = text.lower().translate(punctuation_table())
+    text = _DIGITS_RE.sub("", text)
+    text = _STOPWORD_RE.sub("", text)
+    return [lemmas.get(token, token).lower() for token in text.split()]
+
+def document_terms(tokens):
+    # BigramTokenizer: unigrams plus "_"-joined bigrams, then DocumentTermMatrix's word length filter
+    terms = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    return Counter(term for term in terms if len(term) >= MIN_TERM_LENGTH)
+
+# (size and mtime of lemmas.tsv, hash of its content) from the last lemma_signature() call
+_lemma_signature = (None, None)
+
+def lemma_signature():
+    """
+    Hash of the lemma table ("no table" hashes as empty). Rehashed whenever
+    lemmas.tsv's size or mtime changes, e.g. once ensure_lemmas() writes it.
+    """
+    global _lemma_signature
+    try:
+        stat = os.stat(LEMMA_FILE)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        stamp = None
+    cached_stamp, signature = _lemma_signature
+    if signature is None or cached_stamp != stamp:
+        digest = hashlib.sha256()
+        if stamp is not None:
+            with open(LEMMA_FILE, "rb") as f:
+                digest.update(f.read())
+        signature = digest.hexdigest()
+        _lemma_signature = (stamp, signature)
+    return signature
+
+def token_keys(abstracts):
+    """
+    Token cache keys: hash of the abstract, the preprocessing version and the
+    lemma table, so a new normalization never reuses stale tokens.
+    """
+    prefix = f"{PREPROCESS_VERSION}:{lemma_signature()}:"
+    return [hashlib.sha256((prefix + a).encode("utf-8")).hexdigest() for a in abstracts]
+
+def iter_csv_column(csv_path, column, batch_size):
+    # Values of one CSV column, batch_size at a time
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        if column not in (reader.fieldnames or []):
+            raise ValueError(f"❌ Error: Input file must contain an '{column}' column.")
+        batch = []
+        for row in reader:
+            batch.append(row[column])
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def iter_abstract_chunks(csv_path, chunk_size):
+    """
+    Streams the abstracts of a cleaned CSV as lists of at most chunk_size,
+    memory-mapped from its Arrow copy when clean_abstracts.py wrote one.
+    Same rows ctm_optimized.R keeps: read_csv() treats "" and "NA" as missing,
+    then empty ones are dropped.
+    """
+    if current_arrow_copy(csv_path):
+        values = iter_arrow_column(csv_path, "Abstract", chunk_size)
+    else:
+        values = iter_csv_column(csv_path, "Abstract", chunk_size)
+    chunk = []
+    for batch in values:
+        for abstract in batch:
+            if abstract is not None and abstract.strip() not in ("", "NA"):
+                chunk.append(abstract.strip())
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+def read_abstracts(csv_path):
+    return [a for chunk in iter_abstract_chunks(csv_path, 10000) for a in chunk]
+
+def tokenize(abstracts, workers=PREPROCESS_WORKERS):
+    if workers <= 1 or len(abstracts) < PARALLEL_MIN_DOCS:
+        _init_worker(LEMMA_FILE)
+        return [normalize(a) for a in abstracts]
+
+    context = multiprocessing.get_context(PREPROCESS_START_METHOD)
+    chunksize = max(1, len(abstracts) // (workers * 4))
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(LEMMA_FILE,)) as pool:
+        return list(pool.map(normalize, abstracts, chunksize=chunksize))
+
+def count_terms(abstracts, workers=PREPROCESS_WORKERS, token_cache=None):
+    # Term counts per abstract; with a token cache only unseen abstracts are normalized
+    if token_cache is None:
+        return [document_terms(tokens) for tokens in tokenize(abstracts, workers)]
+
+    keys = token_keys(abstracts)
+    cached = token_cache.get_many(keys)
+    missing = {key: a for key, a in zip(keys, abstracts) if key not in cached}
+    if missing:
+        fresh = dict(zip(missing, tokenize(list(missing.values()), workers)))
+        token_cache.put_many(fresh)
+        cached.update(fresh)
+    print(f"🔁 Token cache: {len(abstracts) - len(missing)} of {len(abstracts)} abstracts already tokenized")
+    return [document_terms(cached[key]) for key in keys]
+
+def dtm_paths(dtm_dir):
+    return {name: os.path.join(dtm_dir, filename) for name, filename in DTM_FILES.items()}
+
+def sparse_vocabulary(doc_freq, n_docs):
+    # removeSparseTerms keeps terms found in more than n_docs * (1 - sparse) documents
+    sparse = max(0.1, 1 - 10 / n_docs) if n_docs else 0.1
+    return sorted(term for term, df in doc_freq.items() if df > n_docs * (1 - sparse))
+
+def build_dtm(cleaned_csv, dtm_dir, workers=PREPROCESS_WORKERS, token_cache=None):
+    """
+    Builds the document-term matrix ctm_optimized.R would (including
+    removeSparseTerms) and writes it to dtm_dir as a Matrix Market triplet
+    file plus a vocabulary file, ready for ctm_optimized.R --dtm=dtm_dir.
+    """
+    abstracts = read_abstracts(cleaned_csv)
+    counts = count_terms(abstracts, workers, token_cache)
+    n_docs = len(counts)
+    print(f"✅ Preprocessed {n_docs} abstracts")
+
+    vocab = sparse_vocabulary(Counter(term for doc in counts for term in doc), n_docs)
+    index = {term: j for j, term in enumerate(vocab, start=1)}
+    if not vocab or not n_docs:
+        raise ValueError("❌ DTM is empty after filtering. Adjust sparsity threshold or check data.")
+
+    triplets = [
+        (i, index[term], n)
+        for i, doc in enumerate(counts, start=1)
+        for term, n in doc.items() if term in index
+    ]
+
+    os.makedirs(dtm_dir, exist_ok=True)
+    paths = dtm_paths(dtm_dir)
+    with open(paths["matrix"], "w", encoding="utf-8") as f:
+        f.write("%%MatrixMarket matrix coordinate integer general\n")
+        f.write(f"{n_docs} {len(vocab)} {len(triplets)}\n")
+        f.writelines(f"{i} {j} {n}\n" for i, j, n in triplets)
+    with open(paths["vocab"], "w", encoding="utf-8") as f:
+        f.writelines(f"{term}\n" for term in vocab)
+
+    print(f"📊 DTM created — terms: {len(vocab)}  | docs: {n_docs}")
+    return paths
+
+def preprocess_code_files():
+    # Source files whose edits change the DTM (used for cache keys)
+    return [os.path.abspath(__file__)] + ([LEMMA_FILE] if os.path.exists(LEMMA_FILE) else [])
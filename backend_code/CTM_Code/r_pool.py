@@ -0,0 +1,244 @@
+import os
+import atexit
+import threading
+import subprocess
+from collections import deque
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_SCRIPT = os.path.join(SCRIPT_DIR, "r_worker.R")
+SENTINEL = "@@CTM_WORKER@@"
+
+CPU_COUNT = os.cpu_count() or 2
+
+# CTM_R_WORKERS=0 disables the pool and every R script runs through a fresh Rscript again
+R_WORKERS = int(os.environ.get("CTM_R_WORKERS", max(1, CPU_COUNT // 2)))
+# BLAS/OpenMP threads per worker, so workers x threads stays within the core count
+R_BLAS_THREADS = int(os.environ.get("CTM_R_BLAS_THREADS", max(1, CPU_COUNT // max(1, R_WORKERS))))
+# Seconds to wait for a new worker to finish loading its libraries
+R_WORKER_STARTUP_TIMEOUT = int(os.environ.get("CTM_R_WORKER_STARTUP_TIMEOUT", 120))
+# Seconds one script may run on a worker before the worker is killed (0 = no limit)
+R_JOB_TIMEOUT = int(os.environ.get("CTM_R_JOB_TIMEOUT", 6 * 3600))
+
+OUTPUT_TAIL_LINES = 200
+
+def blas_env(threads=R_BLAS_THREADS):
+    # Environment for an R process with its BLAS/OpenMP thread count pinned
+    env = dict(os.environ)
+    for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        env[var] = str(threads)
+    return env
+
+class WorkerDied(RuntimeError):
+    pass
+
+def split_status(line):
+    """
+    (output, status) of one line of worker output; status is None unless the
+    line carries the worker's status. R output that doesn't end in a newline
+    (a cat() without one) puts the status in the middle of the line.
+    """
+    output, sentinel, rest = line.partition(SENTINEL)
+    if not sentinel:
+        return line, None
+    words = rest.split()
+    return output, words[0] if words else ""
+
+class RWorker:
+    """
+    One long-lived R process running r_worker.R. Jobs are sent one per line on
+    its stdin; its output is streamed back until the worker's status line.
+    """
+    def __init__(self, rscript):
+        self.process = subprocess.Popen(
+            [rscript, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=blas_env()
+        )
+        self._wait_ready()
+
+    def _wait_ready(self):
+        # Reads library loading output until READY; a worker that cannot load R packages exits
+        ready = threading.Event()
+        startup = deque(maxlen=OUTPUT_TAIL_LINES)
+
+        def read():
+            for line in self.process.stdout:
+                output, status = split_status(line.rstrip("\n"))
+                if status == "READY":
+                    ready.set()
+                    return
+                startup.append(output)
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(R_WORKER_STARTUP_TIMEOUT)
+        if not ready.is_set():
+            self.close()
+            raise WorkerDied("❌ R worker failed to start:\n" + "\n".join(startup))
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, script, args, cwd, on_output, timeout=R_JOB_TIMEOUT):
+        """
+        Returns True if the script finished without error, streaming its output
+        to on_output. A script still running after timeout seconds gets the
+        worker killed, so a hung R process can't hold on to the caller forever.
+        """
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            self.process.kill()
+
+        watchdog = threading.Timer(timeout, kill) if timeout else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            self.process.stdin.write("\t".join([script, cwd, *args]) + "\n")
+            self.process.stdin.flush()
+            for line in self.process.stdout:
+                output, status = split_status(line.rstrip("\n"))
+                if output or status is None:
+                    on_output(output)
+                if status is not None:
+                    return status == "OK"
+        finally:
+            if watchdog:
+                watchdog.cancel()
+        if timed_out.is_set():
+            raise WorkerDied(f"❌ R worker killed after the job ran for more than {timeout}s")
+        raise WorkerDied("❌ R worker exited in the middle of a job")
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+class RWorkerPool:
+    """
+    Pool of warm R workers shared by every job in this process. Workers are
+    started on first use (or by warm()) and replaced if one dies. If R workers
+    cannot be started at all the pool marks itself unavailable and callers fall
+    back to a fresh Rscript per call.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._started = 0
+        self._lock = threading.Lock()
+        # Signalled whenever a worker goes back to idle, dies or the pool gives up,
+        # so callers waiting for a worker re-check what they can do
+        self._changed = threading.Condition(self._lock)
+        self.available = size > 0
+        self._workers = []
+
+    def _start_worker(self, rscript):
+        worker = RWorker(rscript)
+        with self._lock:
+            self._workers.append(worker)
+        print(f"🔥 R worker {worker.process.pid} is warm")
+        return worker
+
+    def _start_failed(self, error):
+        # A worker could not be started: give up on the pool and wake everyone waiting for it
+        with self._changed:
+            self._started -= 1
+            self.available = False
+            self._changed.notify_all()
+        print(f"⚠️ R worker pool unavailable, falling back to Rscript: {error}")
+
+    def warm(self, rscript):
+        # Starts every worker up front so the first fit does not pay for loading R
+        while self.available:
+            with self._lock:
+                if self._started >= self.size:
+                    return
+                self._started += 1
+            try:
+                worker = self._start_worker(rscript)
+            except (OSError, WorkerDied) as e:
+                self._start_failed(e)
+                return
+            self._release(worker)
+
+    def _acquire(self, rscript):
+        # An idle worker, a newly started one if the pool has room, or None once the pool is unavailable
+        with self._changed:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if not self.available:
+                    return None
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._changed.wait()
+        try:
+            return self._start_worker(rscript)
+        except (OSError, WorkerDied) as e:
+            self._start_failed(e)
+            return None
+
+    def _release(self, worker):
+        with self._changed:
+            if worker.alive():
+                self._idle.append(worker)
+            else:
+                # Frees its slot; the caller woken below starts a replacement
+                self._started -= 1
+                if worker in self._workers:
+                    self._workers.remove(worker)
+            self._changed.notify()
+
+    def run(self, rscript, script, args, label, on_output=None, cwd=None):
+        """
+        Runs an R script on a warm worker. Returns False when no worker is
+        available (the caller should use Rscript instead); raises RuntimeError
+        with the script's last output lines if the script fails.
+        """
+        if not self.available:
+            return False
+        worker = self._acquire(rscript)
+        if worker is None:
+            return False
+
+        tail = deque(maxlen=OUTPUT_TAIL_LINES)
+
+        def emit(line):
+            tail.append(line)
+            if on_output:
+                on_output(line)
+            else:
+                print(f"🔧 {label}: {line}")
+
+        try:
+            ok = worker.run(script, args, os.path.abspath(cwd or os.getcwd()), emit)
+        except (OSError, WorkerDied) as e:
+            worker.close()
+            tail.append(str(e))
+            ok = False
+        finally:
+            self._release(worker)
+
+        if not ok:
+            output = "\n".join(tail)
+            raise RuntimeError(f"❌ Error running the {label} script.\n🔧 OUTPUT (last {len(tail)} lines):\n{output}")
+        return True
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.close()
+
+r_pool = RWorkerPool(R_WORKERS)
+atexit.register(r_pool.close)
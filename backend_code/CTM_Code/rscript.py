@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+from collections import deque
+
+from CTM_Code.r_pool import r_pool
+
+# Starting R scripts, shared by ctm_runner.py and preprocess.py (which ctm_runner's
+# engines import in turn, so neither can import the other's R helpers)
+
+HARDCODED_RSCRIPT = r"C:\Program Files\R\R-4.5.0\bin\Rscript.exe"
+
+# The R scripts live next to this file; never resolve them from the CWD
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def find_rscript():
+    if shutil.which("Rscript"):
+        return "Rscript"
+    if os.path.exists(HARDCODED_RSCRIPT):
+        return HARDCODED_RSCRIPT
+    raise FileNotFoundError("❌ Rscript executable not found.")
+
+# Number of trailing R output lines kept for error messages
+OUTPUT_TAIL_LINES = 200
+
+def run_rscript(cmd, label, on_output=None, cwd=None):
+    """
+    Runs an Rscript command and streams its combined stdout/stderr line by line
+    to on_output (or the console) instead of buffering it until the process exits.
+    """
+    tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        cwd=cwd
+    )
+    for line in process.stdout:
+        line = line.rstrip("\n")
+        tail.append(line)
+        if on_output:
+            on_output(line)
+        else:
+            print(f"🔧 {label}: {line}")
+    process.stdout.close()
+    returncode = process.wait()
+
+    if returncode != 0:
+        output = "\n".join(tail)
+        raise RuntimeError(f"❌ Error running the {label} script.\n🔧 OUTPUT (last {len(tail)} lines):\n{output}")
+
+def run_r(script_name, args, label, on_output=None, cwd=None):
+    """
+    Runs one of the R scripts next to this file, on a warm pooled R worker when
+    one is available and through a fresh Rscript process otherwise.
+    """
+    rscript = find_rscript()
+    script = os.path.join(SCRIPT_DIR, script_name)
+    args = [str(arg) for arg in args]
+
+    # The worker protocol is tab/line based, so odd paths go through Rscript
+    if not any(ch in arg for arg in [script, *args] for ch in "\t\n"):
+        if r_pool.run(rscript, script, args, label, on_output, cwd=cwd):
+            return
+    run_rscript([rscript, script, *args], label, on_output, cwd=cwd)
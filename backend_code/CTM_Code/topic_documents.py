@@ -0,0 +1,73 @@
+import csv
+
+from CTM_Code.preprocess import iter_abstract_chunks
+
+# Top documents kept per topic in the summary
+TOP_DOCS = 10
+# Topic summary every engine writes (ctm_summary.R spells it out too)
+SUMMARY_FILE = "CTM - Topics With Keywords and Abstracts.csv"
+
+def summary_columns():
+    """
+    Columns of SUMMARY_FILE. Doc_j is the
+    0-based position of a topic's j-th best document in the cleaned corpus
+    (its row of doc_topic.npy) and Score_j that document's topic proportion;
+    the abstracts themselves are resolved from the corpus only when needed.
+    """
+    columns = ["Topic_Number", "Keywords"]
+    for j in range(1, TOP_DOCS + 1):
+        columns += [f"Doc_{j}", f"Score_{j}"]
+    return columns + ["Perc_of_Corpus"]
+
+def summary_row(topic, keywords, docs, scores, perc):
+    # One summary row; topics with fewer than TOP_DOCS documents leave the rest empty
+    row = [topic, keywords]
+    for j in range(TOP_DOCS):
+        row += [int(docs[j]), float(scores[j])] if j < len(docs) else ["", ""]
+    return row + [perc]
+
+def read_top_documents(summary_csv):
+    # {topic number: [(doc, score), ...] best first} from a topic summary
+    with open(summary_csv, "r", encoding="utf-8", newline="") as f:
+        top_docs = {}
+        for row in csv.DictReader(f):
+            docs = []
+            for j in range(1, TOP_DOCS + 1):
+                doc = row.get(f"Doc_{j}", "")
+                if doc not in ("", "NA"):
+                    docs.append((int(float(doc)), float(row[f"Score_{j}"])))
+            top_docs[int(float(row["Topic_Number"]))] = docs
+    return top_docs
+
+def resolve_abstracts(doc_ids, cleaned_csv):
+    """
+    {doc: abstract} for just the requested documents, streaming the cleaned
+    corpus (its Arrow copy when there is one) so only those abstracts are
+    kept in memory. Positions count the same rows as the CTM engines.
+    """
+    wanted = set(doc_ids)
+    found = {}
+    start = 0
+    for chunk in iter_abstract_chunks(cleaned_csv, 10000):
+        for doc in wanted:
+            if start <= doc < start + len(chunk):
+                found[doc] = chunk[doc - start]
+        start += len(chunk)
+        if len(found) == len(wanted):
+            break
+    return found
+
+def write_top_abstracts(summary_csv, cleaned_csv, output_csv):
+    """
+    The top abstracts of every topic, one row per (topic, rank), for readers
+    of the results; nothing in the pipeline parses this file.
+    """
+    top_docs = read_top_documents(summary_csv)
+    abstracts = resolve_abstracts([doc for docs in top_docs.values() for doc, _ in docs], cleaned_csv)
+    with open(output_csv, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Topic_Number", "Rank", "Doc", "Score", "Abstract"])
+        for topic, docs in sorted(top_docs.items()):
+            for rank, (doc, score) in enumerate(docs, start=1):
+                writer.writerow([topic, rank, doc, score, abstracts.get(doc, "")])
+    return output_csv
@@ -0,0 +1,70 @@
+import csv
+
+def read_fit_stats(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        row = next(csv.DictReader(f))
+    stats = {
+        name: (None if value in ("", "NA") else float(value))
+        for name, value in row.items()
+    }
+    for name in ("k", "n_train", "n_test"):
+        if stats.get(name) is not None:
+            stats[name] = int(stats[name])
+    return stats
+
+def annotate_fit_stats(path, **columns):
+    # Adds (or overwrites) columns of fit_stats.csv, e.g. how the corpus was preprocessed
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        row = next(reader)
+        fieldnames = list(reader.fieldnames)
+    row.update(columns)
+    fieldnames += [name for name in columns if name not in fieldnames]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerow(row)
+    return path
+
+def rank_candidates(candidates):
+    """
+    Picks the best of several fits (dicts with k, perplexity, coherence).
+    Each candidate is ranked by held-out perplexity (lower is better) and by
+    coherence (higher is better); the lowest mean rank wins, ties go to the
+    smaller k. Adds 'rank' and 'selected' to every candidate and returns the winner.
+    """
+    def ranks(metric, reverse):
+        scored = [c for c in candidates if c.get(metric) is not None]
+        ordered = sorted(scored, key=lambda c: c[metric], reverse=reverse)
+        return {c["k"]: position for position, c in enumerate(ordered, start=1)}
+
+    perplexity_ranks = ranks("perplexity", reverse=False)
+    coherence_ranks = ranks("coherence", reverse=True)
+    for c in candidates:
+        used = [r[c["k"]] for r in (perplexity_ranks, coherence_ranks) if c["k"] in r]
+        c["score"] = sum(used) / len(used) if used else float("inf")
+
+    best = min(candidates, key=lambda c: (c["score"], c["k"]))
+    for position, c in enumerate(sorted(candidates, key=lambda c: (c["score"], c["k"])), start=1):
+        c["rank"] = position
+        c["selected"] = c is best
+    return best
+
+def write_comparison(candidates, path):
+    columns = ["k", "perplexity", "coherence", "logLik", "n_train", "n_test", "score", "rank", "selected"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for c in sorted(candidates, key=lambda c: c["k"]):
+            writer.writerow(c)
+    return path
+
+def write_restarts(fits, path):
+    # Final log-likelihood of every seeded fit, with the one kept per k marked
+    columns = ["k", "seed", "logLik", "perplexity", "n_train", "n_test", "selected"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for fit in sorted(fits, key=lambda f: (f["k"], f["seed"])):
+            writer.writerow(fit)
+    return path
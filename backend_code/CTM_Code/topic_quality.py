@@ -0,0 +1,182 @@
+import os
+import csv
+import numpy as np
+from scipy import sparse
+
+from CTM_Code.ctm_numpy import read_dtm
+from CTM_Code.topic_metrics import read_fit_stats
+from CTM_Code.posterior_io import load_matrix, read_terms
+
+# Top terms per topic used for coherence and exclusivity
+COHERENCE_TOP_N = int(os.environ.get("CTM_COHERENCE_TOP_N", 10))
+# Top terms per topic compared across topics for diversity (Dieng et al. use 25)
+DIVERSITY_TOP_N = int(os.environ.get("CTM_DIVERSITY_TOP_N", 25))
+# Documents scored at a time for the posterior perplexity; bounds the dense theta @ beta block
+QUALITY_CHUNK = int(os.environ.get("CTM_QUALITY_CHUNK", 1024))
+
+def top_term_indices(beta, top_n):
+    # Highest-probability terms of every topic (ties keep vocabulary order), shape (topics, top_n)
+    return np.argsort(-beta, axis=1, kind="stable")[:, :min(top_n, beta.shape[1])]
+
+def read_presence(dtm_dir, terms):
+    """
+    Which documents contain which term, as a sparse 0/1 matrix whose columns
+    follow the topic-word matrix's terms (terms the DTM lacks stay empty).
+    Returns (presence, counts) where counts is the DTM in the same column order.
+    """
+    dtm, vocab = read_dtm(dtm_dir)
+    if vocab != terms:
+        index = {term: j for j, term in enumerate(vocab)}
+        cols = np.array([index.get(term, -1) for term in terms])
+        dtm = dtm[:, np.maximum(cols, 0)] @ sparse.diags((cols >= 0).astype(np.float64))
+    dtm = sparse.csc_matrix(dtm)
+    presence = dtm.copy()
+    presence.data = (presence.data > 0).astype(np.float64)
+    return presence, dtm.tocsr()
+
+def cooccurrence(presence, top):
+    """
+    Document frequencies D(w) of every topic's top terms and D(w_i, w_j) of
+    every pair of them, from one sparse product over the union of all top
+    terms instead of intersecting document sets pair by pair.
+    Returns arrays shaped (topics, n) and (topics, n, n).
+    """
+    union, positions = np.unique(top, return_inverse=True)
+    positions = positions.reshape(top.shape)
+    sub = presence[:, union]
+    joint = (sub.T @ sub).tocsr()
+    freq = joint.diagonal()[positions]
+    n_topics, n = positions.shape
+    rows = np.broadcast_to(positions[:, :, None], (n_topics, n, n)).ravel()
+    cols = np.broadcast_to(positions[:, None, :], (n_topics, n, n)).ravel()
+    pairs = np.asarray(joint[rows, cols]).reshape(n_topics, n, n)
+    return freq, pairs
+
+def umass_scores(freq, pairs):
+    # Per topic: sum over pairs (w_i ranked above w_j) of log((D(w_i, w_j) + 1) / D(w_i))
+    upper = np.triu(np.ones(pairs.shape[1:], dtype=bool), 1)
+    valid = upper & (freq > 0)[:, :, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.log((pairs + 1) / freq[:, :, None])
+    return np.where(valid, terms, 0.0).sum(axis=(1, 2))
+
+def npmi_scores(freq, pairs, n_docs):
+    """
+    Per topic: mean normalized PMI over pairs of top terms, with documents as
+    the co-occurrence window. -1 for pairs that never co-occur, 1 for pairs
+    that occur together in every document; higher is better.
+    """
+    upper = np.triu(np.ones(pairs.shape[1:], dtype=bool), 1)
+    p_i = freq[:, :, None] / n_docs
+    p_j = freq[:, None, :] / n_docs
+    p_ij = pairs / n_docs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        npmi = np.log(p_ij / (p_i * p_j)) / -np.log(p_ij)
+    npmi = np.where(p_ij <= 0, -1.0, np.where(p_ij >= 1, 1.0, npmi))
+    return np.where(upper, npmi, 0.0).sum(axis=(1, 2)) / max(upper.sum(), 1)
+
+def topic_diversity(beta, top_n=DIVERSITY_TOP_N):
+    # Share of unique terms among all topics' top terms: 1 means no two topics share a top term
+    top = top_term_indices(beta, top_n)
+    return len(np.unique(top)) / top.size
+
+def exclusivity_scores(beta, top):
+    # Per topic: mean share of each top term's probability (summed over topics) that this topic holds
+    share = beta / np.maximum(beta.sum(axis=0, keepdims=True), 1e-300)
+    return np.take_along_axis(share, top, axis=1).mean(axis=1)
+
+def posterior_perplexity(counts, theta, beta, chunk=QUALITY_CHUNK):
+    """
+    exp(-log-likelihood per word) of the corpus under each document's topic
+    proportions, scoring log(sum_k theta_dk beta_kw) at the non-zero DTM cells
+    a block of documents at a time so theta @ beta is never held in full.
+    """
+    loglik = 0.0
+    for start in range(0, counts.shape[0], chunk):
+        block = counts[start:start + chunk].tocoo()
+        probs = theta[start:start + chunk] @ beta
+        loglik += float(block.data @ np.log(np.maximum(probs[block.row, block.col], 1e-300)))
+    words = counts.sum()
+    return float(np.exp(-loglik / words)) if words else None
+
+def umass_coherence(dtm_dir, topic_word_path, terms_path, top_n=COHERENCE_TOP_N):
+    """
+    Mean UMass coherence of the topics: for each pair of top terms (w_i ranked
+    above w_j), log((D(w_i, w_j) + 1) / D(w_i)) over document frequencies D.
+    Closer to zero is better.
+    """
+    beta = load_matrix(topic_word_path)
+    presence, _ = read_presence(dtm_dir, read_terms(terms_path))
+    scores = umass_scores(*cooccurrence(presence, top_term_indices(beta, top_n)))
+    # Rounded so float noise doesn't decide between otherwise equal candidates
+    return round(float(scores.mean()), 6) if len(scores) else None
+
+def rounded(value):
+    return None if value is None else round(float(value), 6)
+
+def evaluate_topics(topic_word_path, doc_topic_path, terms_path, fit_stats_csv, output_dir, dtm_dir=None):
+    """
+    Quantitative quality of a fitted model, for comparing runs and engines:
+    UMass and NPMI coherence (need the DTM), topic diversity and exclusivity
+    (topic-word matrix only), held-out perplexity (from fit_stats, when the
+    fit held documents out) and the corpus perplexity under the fitted
+    posteriors. Writes topic_quality.csv (one row per topic) and
+    model_quality.csv (one row) to output_dir; returns the model-level dict.
+    """
+    terms = read_terms(terms_path)
+    beta = load_matrix(topic_word_path)
+    beta = beta / beta.sum(axis=1, keepdims=True)
+    top = top_term_indices(beta, COHERENCE_TOP_N)
+    n_topics = beta.shape[0]
+
+    umass = npmi = [None] * n_topics
+    perplexity_posterior = None
+    n_docs = None
+    if dtm_dir:
+        presence, counts = read_presence(dtm_dir, terms)
+        n_docs = presence.shape[0]
+        freq, pairs = cooccurrence(presence, top)
+        umass = umass_scores(freq, pairs)
+        npmi = npmi_scores(freq, pairs, n_docs)
+        theta = load_matrix(doc_topic_path)
+        if theta.shape == (n_docs, n_topics):
+            perplexity_posterior = posterior_perplexity(counts, theta, beta)
+        else:
+            print(f"⚠️ Doc-topic matrix is {theta.shape[0]}x{theta.shape[1]} but the DTM has {n_docs} documents; skipping posterior perplexity")
+    exclusivity = exclusivity_scores(beta, top)
+    fit_stats = read_fit_stats(fit_stats_csv)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "topic_quality.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Topic_Number", "UMass", "NPMI", "Exclusivity", "Top_Terms"])
+        for i in range(n_topics):
+            writer.writerow([i + 1, rounded(umass[i]), rounded(npmi[i]), rounded(exclusivity[i]), "; ".join(terms[j] for j in top[i])])
+
+    quality = {
+        "k": n_topics,
+        "umass": rounded(np.mean(umass)) if dtm_dir else None,
+        "npmi": rounded(np.mean(npmi)) if dtm_dir else None,
+        "diversity": rounded(topic_diversity(beta)),
+        "exclusivity": rounded(exclusivity.mean()),
+        "heldout_perplexity": rounded(fit_stats.get("perplexity")),
+        "posterior_perplexity": rounded(perplexity_posterior),
+        "n_docs": n_docs,
+        "n_test": fit_stats.get("n_test"),
+        "top_n": COHERENCE_TOP_N,
+    }
+    with open(os.path.join(output_dir, "model_quality.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(quality))
+        writer.writeheader()
+        writer.writerow(quality)
+    print(f"📏 Topic quality — UMass: {quality['umass']}  | NPMI: {quality['npmi']}  | diversity: {quality['diversity']}  | exclusivity: {quality['exclusivity']}")
+    return quality
+
+def read_quality(path):
+    # model_quality.csv back into the dict evaluate_topics returned
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        row = next(csv.DictReader(f))
+    return {
+        name: None if value == "" else int(value) if name in ("k", "n_docs", "n_test", "top_n") else float(value)
+        for name, value in row.items()
+    }
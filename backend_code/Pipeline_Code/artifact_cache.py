@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from Pipeline_Code.workspace import BACKEND_DIR
+
+CACHE_DIR = os.environ.get("CTM_CACHE_DIR", os.path.join(BACKEND_DIR, "cache"))
+ARTIFACT_CACHE_MB = int(os.environ.get("CTM_ARTIFACT_CACHE_MB", 2048))
+RESULT_CACHE_MB = int(os.environ.get("CTM_RESULT_CACHE_MB", 1024))
+MODEL_CACHE_MB = int(os.environ.get("CTM_MODEL_CACHE_MB", 1024))
+MANIFEST = "manifest.json"
+
+class ArtifactCache:
+    """
+    Content-addressed store of stage outputs on local disk. Each entry is a
+    directory named after its key holding the output files plus a manifest
+    mapping logical output names to file names. Entries are touched on every
+    hit and the least recently used ones are evicted once the store grows
+    past max_bytes. Callers that copy files out of an entry use checkout(),
+    which keeps the entry from being evicted until they are done.
+    """
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None           # bytes stored; scanned on the first store, then kept up to date
+        self._pins = Counter()      # entry dir -> callers restoring from it right now
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def lookup(self, key):
+        # Returns {logical name: cached file path} or None on a miss
+        entry = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry, MANIFEST), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        files = {name: os.path.join(entry, filename) for name, filename in manifest.items()}
+        if not all(os.path.exists(path) for path in files.values()):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        os.utime(entry, (now, now))
+        with self._lock:
+            self.hits += 1
+        return files
+
+    @contextmanager
+    def checkout(self, key):
+        """
+        lookup() for callers that copy the cached files somewhere: the entry is
+        pinned, so a concurrent evict() can't remove it before the with-block
+        exits. Yields None on a miss.
+        """
+        entry = self._entry_dir(key)
+        with self._lock:
+            self._pins[entry] += 1
+        try:
+            yield self.lookup(key)
+        finally:
+            with self._lock:
+                self._pins[entry] -= 1
+                if not self._pins[entry]:
+                    del self._pins[entry]
+
+    def store(self, key, files, link=False):
+        # files: {logical name: path of the produced output}
+        # link=True hard links instead of copying; only safe for files that are
+        # replaced rather than rewritten in place (e.g. finished zips)
+        entry = self._entry_dir(key)
+        if os.path.exists(os.path.join(entry, MANIFEST)):
+            return
+        staging = os.path.join(self.root, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        manifest = {}
+        for i, (name, path) in enumerate(sorted(files.items())):
+            if not os.path.exists(path):
+                continue
+            filename = f"{i}_{os.path.basename(path)}"
+            if link:
+                link_or_copy(path, os.path.join(staging, filename))
+            else:
+                shutil.copy2(path, os.path.join(staging, filename))
+            manifest[name] = filename
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+        size = _dir_size(staging)
+
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another run stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        # Only scan the store when this entry takes it past the limit, not on every store
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += size
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def _entries(self):
+        # (last used, size, entry dir) of every stored entry
+        entries = []
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard.startswith("tmp-") or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                entry = os.path.join(shard_dir, key)
+                try:
+                    entries.append((os.path.getmtime(entry), _dir_size(entry), entry))
+                except OSError:
+                    # Removed by another process while we were scanning
+                    continue
+        return entries
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the store is 10% under
+        max_bytes, so the next few stores don't evict again. Entries pinned by
+        checkout() are skipped. Holds the lock throughout, so a checkout()
+        either pins an entry before it is considered or misses it cleanly.
+        """
+        with self._lock:
+            entries = self._entries()
+            self._size = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            for _, size, entry in sorted(entries):
+                if self._size <= target:
+                    break
+                if self._pins.get(entry):
+                    continue
+                shutil.rmtree(entry, ignore_errors=True)
+                self._size -= size
+                print(f"🧹 Evicted cached artifact {os.path.basename(entry)[:12]}")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, name))
+        for dirpath, _, names in os.walk(path) for name in names
+    )
+
+def link_or_copy(src, dest):
+    # Hard link when possible (same filesystem, no extra disk I/O), copy otherwise
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+def restore_files(cached, destinations):
+    # Copies cached outputs back to where the stage would have written them
+    for name, path in cached.items():
+        dest = destinations.get(name)
+        if dest:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copy2(path, dest)
+
+# Shared by every job; disabled with CTM_ARTIFACT_CACHE=0
+artifact_cache = None
+if os.environ.get("CTM_ARTIFACT_CACHE", "1") != "0":
+    artifact_cache = ArtifactCache(os.path.join(CACHE_DIR, "artifacts"), ARTIFACT_CACHE_MB * 1024 * 1024)
+
+# Finished zips keyed by query slug + exported rows; disabled with CTM_RESULT_CACHE=0
+result_cache = None
+if os.environ.get("CTM_RESULT_CACHE", "1") != "0":
+    result_cache = ArtifactCache(os.path.join(CACHE_DIR, "results"), RESULT_CACHE_MB * 1024 * 1024)
+
+# Fitted CTMs keyed by DTM fingerprint + fit settings; disabled with CTM_MODEL_CACHE=0
+model_cache = None
+if os.environ.get("CTM_MODEL_CACHE", "1") != "0":
+    model_cache = ArtifactCache(os.path.join(CACHE_DIR, "models"), MODEL_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,54 @@
+import os
+import json
+import time
+import threading
+
+class Checkpoint:
+    """
+    Durable manifest of a run's progress, stored as checkpoint.json in its
+    workspace. It records the run's inputs and every stage that completed
+    (with the files it produced), so a failed run can be resumed later, even
+    from a fresh server process, starting at the first incomplete stage.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"run": {}, "stages": {}, "status": "running", "error": None}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.data = json.load(f)
+
+    def _save(self):
+        # Write to a temp file and swap it in so a crash never leaves half a manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def run(self):
+        return self.data["run"]
+
+    def update_run(self, **info):
+        with self._lock:
+            self.data["run"].update(info)
+            self._save()
+
+    def complete(self, stage, outputs=None):
+        with self._lock:
+            self.data["stages"][stage] = {"finished_at": time.time(), "outputs": outputs or {}}
+            self._save()
+
+    def is_complete(self, stage):
+        # A stage only counts as done if everything it produced is still on disk
+        with self._lock:
+            entry = self.data["stages"].get(stage)
+        if entry is None:
+            return False
+        return all(os.path.exists(path) for path in entry["outputs"].values())
+
+    def mark(self, status, error=None):
+        with self._lock:
+            self.data["status"] = status
+            self.data["error"] = error
+            self._save()
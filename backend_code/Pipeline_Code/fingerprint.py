@@ -0,0 +1,20 @@
+import json
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path):
+    """Content hash of a file, read in chunks so large exports don't load into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint(*parts):
+    """
+    Stable hash of any mix of strings, numbers, lists and dicts
+    (dict keys are sorted, so parameter order doesn't matter).
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
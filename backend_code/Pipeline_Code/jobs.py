@@ -0,0 +1,110 @@
+import os
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from Pipeline_Code.progress import ProgressStream
+
+# How many pipelines may run at the same time in this process
+MAX_WORKERS = int(os.environ.get("CTM_MAX_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# How many jobs may wait for a worker before new submissions are rejected
+MAX_QUEUED_JOBS = int(os.environ.get("CTM_MAX_QUEUED_JOBS", MAX_WORKERS * 4))
+
+class AdmissionError(RuntimeError):
+    """Raised when the server is saturated and a new job can't be accepted."""
+
+class Job:
+    """
+    One submitted pipeline run. The worker thread updates the status fields,
+    the Flask routes only read them through to_dict().
+    """
+    def __init__(self, params=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params or {}
+        self.status = "queued"       # queued -> running -> done | failed
+        self.stage_name = None
+        self.result_path = None
+        self.preview_path = None     # provisional zip of a preview run, until result_path replaces it
+        self.error = None
+        self.traceback = None
+        self.warnings = []           # fallbacks the user should know about (e.g. no lemmatization)
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.progress = ProgressStream()
+        self.workspace = None
+
+    def stage(self, name):
+        # Context manager marking the current pipeline stage (see ProgressStream.stage)
+        self.stage_name = name
+        return self.progress.stage(name)
+
+    def warn(self, message):
+        # Reported in the job's status and as a progress event, not just on the console
+        self.warnings.append(message)
+        self.progress.publish("warning", message=message)
+        print(message)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage_name,
+            "stage_timings": self.progress.stage_timings,
+            "error": self.error,
+            "warnings": self.warnings,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result_ready": self.result_path is not None and os.path.exists(self.result_path),
+            "preview_ready": self.preview_path is not None and os.path.exists(self.preview_path),
+        }
+
+class JobManager:
+    """Runs pipeline jobs on a bounded thread pool and keeps track of them by id."""
+    def __init__(self, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ctm-job")
+        self._capacity = max_workers + max_queued
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, params=None):
+        # fn(job) runs the pipeline and returns the path of the result zip
+        job = Job(params)
+        with self._lock:
+            # Admission control: refuse work instead of letting the backlog grow unbounded
+            active = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if active >= self._capacity:
+                raise AdmissionError(f"Server is busy ({active} jobs queued or running), try again later")
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn)
+        print(f"📥 Job {job.id} queued")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.started_at = time.time()
+        job.progress.publish("status", status="running")
+        try:
+            job.result_path = fn(job)
+            job.status = "done"
+            job.progress.publish("status", status="done", seconds=round(time.time() - job.started_at, 3))
+            print(f"✅ Job {job.id} finished")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.traceback = traceback.format_exc()
+            job.progress.publish("status", status="failed", error=job.error)
+            print(f"❌ Job {job.id} failed:")
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            job.progress.close()
+        return job.result_path
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import importlib
+import importlib.util
+import threading
+
+# CTM_LAZY_IMPORTS=0 restores the old behaviour of importing everything at startup
+LAZY_IMPORTS = os.environ.get("CTM_LAZY_IMPORTS", "1") != "0"
+
+# module name -> seconds its first import took (including anything it pulled in)
+IMPORT_TIMINGS = {}
+# Reentrant: a module that calls lazy() at import time (eagerly with CTM_LAZY_IMPORTS=0)
+# runs timed_import again while its own import still holds the lock
+_lock = threading.RLock()
+
+def timed_import(module_name):
+    # sys.modules also holds modules another thread is still importing, so
+    # only trust it for imports that have finished
+    if module_name in IMPORT_TIMINGS:
+        return sys.modules[module_name]
+    with _lock:
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        if module_name not in IMPORT_TIMINGS:
+            IMPORT_TIMINGS[module_name] = round(time.perf_counter() - start, 4)
+            print(f"📦 Imported {module_name} in {IMPORT_TIMINGS[module_name]}s")
+    return module
+
+def lazy(module_name, attr):
+    """
+    Stand-in for `from module_name import attr` that defers the (often heavy)
+    import until the function is first called, e.g. when its stage runs.
+    """
+    if not LAZY_IMPORTS:
+        return getattr(timed_import(module_name), attr)
+
+    def call(*args, **kwargs):
+        return getattr(timed_import(module_name), attr)(*args, **kwargs)
+
+    call.__name__ = attr
+    call.__qualname__ = attr
+    call.lazy_module = module_name
+    return call
+
+def module_source(fn):
+    # Source file of a (possibly lazy) function without importing its module
+    module_name = getattr(fn, "lazy_module", None)
+    if module_name is None:
+        return None
+    return importlib.util.find_spec(module_name).origin
@@ -0,0 +1,126 @@
+import re
+import json
+import time
+import threading
+from math import log
+from collections import deque
+from contextlib import contextmanager
+
+# Keep only the most recent events per job so long R logs don't pile up in memory
+MAX_EVENTS = 2000
+
+# topicmodels prints lines like "**** em iteration 12 ****" when verbose > 0
+EM_ITERATION_RE = re.compile(r"em\s+iteration\s+(\d+)", re.IGNORECASE)
+CONV_RE = re.compile(r"conv(?:ergence)?\s*[=:]?\s*([0-9.eE+-]+)", re.IGNORECASE)
+
+class ProgressStream:
+    """
+    Append-only list of progress events for one job. Any number of Server-Sent
+    Events clients can follow it, each resuming from the last id it has seen.
+    """
+    def __init__(self):
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._next_id = 1
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stage_timings = {}
+
+    def publish(self, event, **data):
+        with self._cond:
+            self._events.append((self._next_id, event, data))
+            self._next_id += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @contextmanager
+    def stage(self, name):
+        # Wraps one pipeline stage with start/end events and records its duration
+        start = time.time()
+        self.publish("stage", stage=name, state="started")
+        print(f"▶️ Stage '{name}' started")
+        try:
+            yield
+        except Exception as e:
+            self.publish("stage", stage=name, state="failed", seconds=round(time.time() - start, 3), error=str(e))
+            raise
+        seconds = round(time.time() - start, 3)
+        self.stage_timings[name] = seconds
+        self.publish("stage", stage=name, state="finished", seconds=seconds)
+        print(f"⏱️ Stage '{name}' finished in {seconds}s")
+
+    def follow(self, last_id=0, heartbeat=15):
+        # Yields (id, event, data) tuples until the stream is closed.
+        # None is yielded every `heartbeat` seconds so the caller can keep the connection alive.
+        while True:
+            with self._cond:
+                pending = [e for e in self._events if e[0] > last_id]
+                if not pending and not self._closed:
+                    self._cond.wait(timeout=heartbeat)
+                    pending = [e for e in self._events if e[0] > last_id]
+                closed = self._closed
+            if not pending:
+                if closed:
+                    return
+                yield None
+                continue
+            for item in pending:
+                last_id = item[0]
+                yield item
+
+def format_sse(item):
+    if item is None:
+        return ": keep-alive\n\n"
+    event_id, event, data = item
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+class VemProgress:
+    """
+    Turns R output lines into progress events. EM iteration lines get an
+    iteration count and an ETA based on the average iteration time so far,
+    every other line is forwarded as a log event.
+    """
+    def __init__(self, progress, stage, max_iterations=1000, tolerance=1e-5):
+        self.progress = progress
+        self.stage = stage
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.started = None
+        self.last_conv = None
+
+    def __call__(self, line):
+        match = EM_ITERATION_RE.search(line)
+        if not match:
+            conv = CONV_RE.search(line)
+            if conv:
+                try:
+                    self.last_conv = abs(float(conv.group(1)))
+                except ValueError:
+                    pass
+            self.progress.publish("log", stage=self.stage, line=line)
+            return
+
+        iteration = int(match.group(1))
+        now = time.time()
+        if self.started is None:
+            self.started = now
+        per_iteration = (now - self.started) / max(iteration - 1, 1)
+
+        # With a convergence value we can guess how many iterations are left
+        # assuming geometric convergence; otherwise fall back to the iteration cap
+        remaining = self.max_iterations - iteration
+        if self.last_conv and self.last_conv > self.tolerance and iteration > 1:
+            rate = self.last_conv ** (1.0 / iteration)
+            if 0 < rate < 1:
+                remaining = min(remaining, max(0, int(log(self.tolerance / self.last_conv) / log(rate))))
+
+        self.progress.publish(
+            "iteration",
+            stage=self.stage,
+            iteration=iteration,
+            seconds_per_iteration=round(per_iteration, 3),
+            eta_seconds=round(per_iteration * max(remaining, 0), 1),
+        )
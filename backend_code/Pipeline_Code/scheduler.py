@@ -0,0 +1,200 @@
+import os
+import inspect
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from Pipeline_Code.artifact_cache import artifact_cache, restore_files
+from Pipeline_Code.fingerprint import fingerprint, file_sha256
+from Pipeline_Code.lazy_imports import module_source
+
+CPU_COUNT = os.cpu_count() or 2
+
+# Resource classes a stage can be tagged with
+R_FIT = "r_fit"      # CPU-heavy Rscript topic model fits
+PYTHON = "python"    # light pandas / plotting work
+IO = "io"            # clipboard, file moves, zipping
+
+# How many stages of each class may run at once across *all* jobs in this process
+RESOURCE_LIMITS = {
+    R_FIT: int(os.environ.get("CTM_MAX_R_FITS", max(1, CPU_COUNT // 2))),
+    PYTHON: int(os.environ.get("CTM_MAX_PYTHON_STAGES", CPU_COUNT)),
+    IO: int(os.environ.get("CTM_MAX_IO_STAGES", 8)),
+}
+_SLOTS = {name: threading.BoundedSemaphore(limit) for name, limit in RESOURCE_LIMITS.items()}
+
+# Stages that must never overlap with each other (matplotlib's pyplot keeps global state)
+_SERIAL_LOCKS = {"pyplot": threading.Lock()}
+
+def source_file(fn):
+    # Source file of a stage function; editing it invalidates that stage's cached outputs
+    return module_source(fn) or inspect.getsourcefile(fn)
+
+class StageCache:
+    """
+    Make-style reuse of a stage's outputs. The key is a hash of the stage name,
+    its parameters, the content of its input files and of the code that
+    produces it; on a hit the cached outputs are restored instead of running fn.
+    """
+    def __init__(self, inputs, outputs, params=None, code=(), restore=None):
+        self.inputs = inputs        # callable -> list of input file paths
+        self.outputs = outputs      # callable -> {logical name: path} written by the stage
+        self.params = params or {}
+        self.code = tuple(code)
+        self.restore = restore      # callable({logical name: cached path}); default copies onto outputs()
+
+    def input_digests(self):
+        # {input path: content hash}, or None while any input is missing
+        inputs = self.inputs()
+        if not all(os.path.exists(path) for path in inputs):
+            return None
+        return {path: file_sha256(path) for path in inputs}
+
+    def key(self, stage_name, digests=None):
+        if digests is None:
+            digests = self.input_digests()
+        if digests is None:
+            return None
+        return fingerprint(
+            stage_name,
+            self.params,
+            list(digests.values()),
+            [file_sha256(path) for path in self.code],
+        )
+
+    def inputs_changed(self, digests):
+        """
+        Inputs whose content differs from `digests` (taken before the stage
+        ran), ignoring files the stage itself rewrites as outputs.
+        """
+        written = set(self.outputs().values())
+        return [
+            path for path, digest in digests.items()
+            if path not in written and (not os.path.exists(path) or file_sha256(path) != digest)
+        ]
+
+    def restore_outputs(self, cached):
+        if self.restore:
+            self.restore(cached)
+        else:
+            restore_files(cached, self.outputs())
+
+class Stage:
+    """One node of the pipeline graph: fn() runs once every stage in deps has finished."""
+    def __init__(self, name, fn, deps=(), resource=PYTHON, serialize=None, cache=None, outputs=None):
+        if resource not in RESOURCE_LIMITS:
+            raise ValueError(f"❌ Unknown resource class '{resource}' for stage '{name}'")
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.resource = resource
+        self.serialize = serialize
+        self.cache = cache
+        # callable -> {logical name: path}, recorded in the checkpoint (defaults to the cache's outputs)
+        self.outputs = outputs or (cache.outputs if cache else dict)
+
+def _run_stage(stage, job):
+    # Waits for a slot of the stage's resource class, then runs (or restores) it
+    slot = _SLOTS[stage.resource]
+    if not slot.acquire(blocking=False):
+        # All slots of this class are busy (e.g. every core already runs an R fit): queue
+        job.progress.publish("stage", stage=stage.name, state="waiting", resource=stage.resource)
+        slot.acquire()
+    try:
+        lock = _SERIAL_LOCKS.get(stage.serialize)
+        if lock:
+            with lock, job.stage(stage.name):
+                return _run_cached(stage, job)
+        with job.stage(stage.name):
+            return _run_cached(stage, job)
+    finally:
+        slot.release()
+
+def _run_cached(stage, job):
+    key = None
+    if stage.cache and artifact_cache:
+        digests = stage.cache.input_digests()
+        key = stage.cache.key(stage.name, digests) if digests is not None else None
+        cached = None
+        if key:
+            with artifact_cache.checkout(key) as cached:
+                if cached is not None:
+                    stage.cache.restore_outputs(cached)
+        if cached is not None:
+            job.progress.publish("stage", stage=stage.name, state="cached")
+            print(f"♻️ Stage '{stage.name}' reused cached outputs")
+            return None
+
+    result = stage.fn()
+    if key:
+        # The key describes the inputs as they were when the stage started; if one was
+        # replaced while it ran, the outputs may come from either version, so don't cache them
+        changed = stage.cache.inputs_changed(digests)
+        if changed:
+            print(f"⚠️ Inputs of stage '{stage.name}' changed while it ran, not caching its outputs: {changed}")
+        else:
+            artifact_cache.store(key, stage.cache.outputs())
+    return result
+
+def _run_and_checkpoint(stage, job, checkpoint):
+    result = _run_stage(stage, job)
+    if checkpoint is not None:
+        checkpoint.complete(stage.name, stage.outputs())
+    return result
+
+def pool_size(stages):
+    """
+    Threads one job needs: no more stages of a resource class can hold a slot
+    at once than that class's limit, so extra threads would only park on its
+    semaphore. Stages beyond that wait in the executor's queue instead.
+    """
+    per_class = Counter(stage.resource for stage in stages)
+    return max(1, sum(min(count, RESOURCE_LIMITS[resource]) for resource, count in per_class.items()))
+
+def run_dag(stages, job, checkpoint=None):
+    """
+    Runs the stages of one job, starting each as soon as its dependencies are
+    done so independent stages run concurrently. The first failure stops new
+    stages from starting and is re-raised once the running ones have finished.
+    With a checkpoint, stages it already lists as complete are skipped and
+    each newly finished stage is recorded in it.
+    """
+    pending = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in pending]
+        if missing:
+            raise ValueError(f"❌ Stage '{stage.name}' depends on unknown stages: {missing}")
+
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=pool_size(stages), thread_name_prefix=f"stage-{job.id}") as executor:
+        while pending or running:
+            # Start every stage whose dependencies are done; skipped stages may unlock more
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in [s for s in pending.values() if all(d in done for d in s.deps)]:
+                    del pending[stage.name]
+                    if checkpoint is not None and checkpoint.is_complete(stage.name):
+                        job.progress.publish("stage", stage=stage.name, state="skipped")
+                        print(f"⏭️ Stage '{stage.name}' already completed, skipping")
+                        done.add(stage.name)
+                        progressed = True
+                        continue
+                    running[executor.submit(_run_and_checkpoint, stage, job, checkpoint)] = stage
+
+            if not running:
+                if pending:
+                    raise RuntimeError(f"❌ Stage graph has a cycle: {sorted(pending)}")
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    # Let in-flight stages finish, but don't start anything new
+                    wait(running)
+                    raise error
+                done.add(stage.name)
+    return done
@@ -0,0 +1,49 @@
+import threading
+
+class _Call:
+    def __init__(self, owner):
+        self.owner = owner
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent work. The first caller for a key runs fn();
+    callers arriving while it is in flight wait for it and share its result
+    (or its exception) instead of doing the work again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, owner=None):
+        # Returns (result, leader_owner) where leader_owner is None for the caller that did the work
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(owner)
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise RuntimeError(f"Coalesced run {call.owner} failed: {call.error}")
+            return call.result, call.owner
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, None
+
+    def in_flight(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            return call.owner if call else None
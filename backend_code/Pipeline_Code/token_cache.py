@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from Pipeline_Code.artifact_cache import CACHE_DIR
+
+TOKEN_CACHE_MB = int(os.environ.get("CTM_TOKEN_CACHE_MB", 256))
+
+class TokenCache:
+    """
+    SQLite store mapping a hash of an abstract (plus the preprocessing version
+    and lemma table) to its normalized tokens, shared by every run. Related
+    searches share most of their abstracts, so only new ones are tokenized.
+    Rows are touched on every hit and the least recently used ones are deleted
+    once the stored tokens grow past max_bytes.
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            # auto_vacuum only takes effect on a new database; it lets evict() give space back
+            self._db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "key TEXT PRIMARY KEY, tokens TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tokens_used ON tokens (used)")
+            self._db.commit()
+
+    def get_many(self, keys):
+        # Returns {key: token list} for the keys that are cached
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, tokens FROM tokens WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((key, json.loads(tokens)) for key, tokens in rows)
+            now = time.time()
+            self._db.executemany("UPDATE tokens SET used = ? WHERE key = ?", [(now, key) for key in found])
+            self._db.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, items):
+        # items: {key: token list}
+        now = time.time()
+        rows = []
+        for key, tokens in items.items():
+            payload = json.dumps(tokens, ensure_ascii=False)
+            rows.append((key, payload, len(payload.encode("utf-8")), now))
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM tokens").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            # Drop the oldest rows until we are 10% under the limit, so we don't evict on every put
+            target = total - int(self.max_bytes * 0.9)
+            removed = 0
+            keys = []
+            for key, size in self._db.execute("SELECT key, size FROM tokens ORDER BY used").fetchall():
+                if removed >= target:
+                    break
+                keys.append((key,))
+                removed += size
+            self._db.executemany("DELETE FROM tokens WHERE key = ?", keys)
+            self._db.commit()
+            self._db.execute("PRAGMA incremental_vacuum").fetchall()
+        print(f"🧹 Evicted {len(keys)} cached token lists")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+# Shared by every job; disabled with CTM_TOKEN_CACHE=0
+token_cache = None
+if os.environ.get("CTM_TOKEN_CACHE", "1") != "0":
+    token_cache = TokenCache(os.path.join(CACHE_DIR, "tokens.sqlite3"), TOKEN_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,82 @@
+import os
+import glob
+
+from Pipeline_Code.checkpoint import Checkpoint
+
+# backend_code/ — everything below is resolved from here, never from the CWD
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS_DIR = os.environ.get("CTM_RUNS_DIR", os.path.join(BACKEND_DIR, "outputs", "runs"))
+# Where finished zips are published for the frontend (point it outside the repo for tests)
+PUBLIC_OUTPUTS_DIR = os.environ.get("CTM_PUBLIC_OUTPUTS_DIR", os.path.join(BACKEND_DIR, "frontend", "public", "outputs"))
+
+class Workspace:
+    """
+    Private working directory for one pipeline run. Every stage reads and
+    writes only inside it, so concurrent runs never share files:
+
+        runs/<run_id>/input/        raw export + last_keywords.txt + export_hash.txt
+        runs/<run_id>/model/        R scratch space (Rdata, CTM matrices)
+        runs/<run_id>/<keyword>_data/   folder that ends up in the zip
+        runs/<run_id>/checkpoint.json   completed stages, used to resume
+    """
+    def __init__(self, run_id, root=RUNS_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(root, run_id)
+        self.input_dir = os.path.join(self.path, "input")
+        self.model_dir = os.path.join(self.path, "model")
+        self.checkpoint_path = os.path.join(self.path, "checkpoint.json")
+        self.checkpoint = None
+
+    def exists(self):
+        return os.path.exists(self.checkpoint_path)
+
+    def create(self):
+        for folder in (self.input_dir, self.model_dir):
+            os.makedirs(folder, exist_ok=True)
+        self.checkpoint = Checkpoint(self.checkpoint_path)
+        return self
+
+    def keyword(self, fallback):
+        # Slug written by the PoP interface for this run
+        try:
+            with open(os.path.join(self.input_dir, "last_keywords.txt"), "r") as f:
+                return f.read().strip() or fallback
+        except OSError:
+            return fallback
+
+    def export_hash(self):
+        # Hash of the exported rows written by the PoP interface (None for older runs)
+        try:
+            with open(os.path.join(self.input_dir, "export_hash.txt"), "r") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def output_folder(self, keyword_base):
+        return os.path.join(self.path, f"{keyword_base}_data")
+
+    def result_folders(self, keyword_base):
+        # (Cleaned Dataset, CTM Results, Visualizations) inside the zipped folder
+        output_folder = self.output_folder(keyword_base)
+        folders = tuple(
+            os.path.join(output_folder, name)
+            for name in ("Cleaned Dataset", "CTM Results", "Visualizations")
+        )
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+        return folders
+
+    def cleaned_csv(self):
+        # Cleaned corpus recorded by the run's 'clean' stage (None if it never got there)
+        entry = self.checkpoint.data["stages"].get("clean") if self.checkpoint else None
+        path = entry["outputs"].get("cleaned") if entry else None
+        return path if path and os.path.exists(path) else None
+
+    def saved_model(self):
+        # ctm_model.Rdata (R engine, ctm5.Rdata in older runs) or online_lda.joblib
+        # (online engine) the run packaged into its results; None if it didn't keep one
+        for name in ("ctm_model.Rdata", "ctm5.Rdata", "online_lda.joblib"):
+            matches = glob.glob(os.path.join(self.path, "*_data", "CTM Results", name))
+            if matches:
+                return matches[0]
+        return None
@@ -0,0 +1,36 @@
+import os
+import zipfile
+
+# Already-compressed formats gain nothing from deflate, so they are stored as-is
+# (.npy and np.savez archives hold raw float64 arrays, which deflate well)
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".xlsx", ".zip", ".rdata", ".feather", ".parquet"}
+DEFLATE_LEVEL = int(os.environ.get("CTM_ZIP_LEVEL", 6))
+
+def compression_for(filename):
+    # (compress_type, compresslevel) for one archive entry
+    if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, DEFLATE_LEVEL
+
+def write_zip(folder, zip_path):
+    """
+    Zips the contents of folder (same layout as shutil.make_archive) in a single
+    pass, copying each file into the archive with a per-entry compression
+    type and level. The archive is built on disk under a temp name and
+    swapped in, so readers never see a half-written zip; it is served as a
+    finished file, not streamed into the response.
+    """
+    tmp_path = f"{zip_path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w") as archive:
+        for dirpath, dirnames, filenames in os.walk(folder):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, folder)
+            if rel_dir != ".":
+                archive.write(dirpath, rel_dir + "/")
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                arcname = os.path.normpath(os.path.join(rel_dir, filename))
+                compress_type, level = compression_for(filename)
+                archive.write(path, arcname, compress_type=compress_type, compresslevel=level)
+    os.replace(tmp_path, zip_path)
+    return zip_path
@@ -4,9 +4,14 @@ import time
 import os
 import subprocess
 import re
+import hashlib
+import threading
 from datetime import datetime
 from io import StringIO
 
+# Only one job can drive the desktop clipboard / Publish or Perish at a time
+_CLIPBOARD_LOCK = threading.Lock()
+
 def open_publish_or_perish():
     path = r"C:\ProgramData\Microsoft\Windows\Start Menu\Programs\Publish or Perish 8.lnk"
     subprocess.Popen(['cmd', '/c', 'start', '', path])
@@ -20,8 +25,68 @@ def close_publish_or_perish():
     )
     print("❌ Closed Publish or Perish")
 
+# Turn the search terms of a PoP export into a filesystem-friendly slug
+def keyword_slug_from_dataframe(df):
+    keyword_col = next((col for col in df.columns if 'search term' in col.lower() or 'query' in col.lower()), None)
+    if keyword_col:
+        raw_keyword = str(df[keyword_col].iloc[0])
+    else:
+        raw_keyword = "project"
+
+    keyword_slug = raw_keyword.lower().strip().replace(" ", "_").replace("-", "_")
+    return ''.join(c for c in keyword_slug if c.isalnum() or c == "_")[:50]
+
+# Columns that change every time a search is exported even if the results don't
+VOLATILE_COLUMNS = {"QueryDate"}
+
+# Hash of the exported rows themselves (not the Excel file, whose metadata changes on every save)
+def rows_fingerprint(df):
+    stable = df[[col for col in df.columns if col not in VOLATILE_COLUMNS]]
+    row_hashes = pd.util.hash_pandas_object(stable, index=False).values
+    digest = hashlib.sha256("|".join(map(str, stable.columns)).encode("utf-8"))
+    digest.update(row_hashes.tobytes())
+    return digest.hexdigest()
+
+# Save a PoP export DataFrame as a timestamped Excel file and remember its keywords.
+# work_dir keeps concurrent runs from overwriting each other's files.
+def save_export(df, work_dir="."):
+    keyword_slug = keyword_slug_from_dataframe(df)
+    os.makedirs(work_dir, exist_ok=True)
+
+    with open(os.path.join(work_dir, "last_keywords.txt"), "w") as f:
+        f.write(keyword_slug)
+
+    with open(os.path.join(work_dir, "export_hash.txt"), "w") as f:
+        f.write(rows_fingerprint(df))
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = os.path.join(work_dir, f"{keyword_slug}_{timestamp}.xlsx")
+    df.to_excel(filename, index=False)
+    return filename
+
+# Load a PoP export uploaded as a file (Excel, CSV or tab-separated text)
+def load_export_file(path, work_dir="."):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xls"):
+        df = pd.read_excel(path)
+    elif ext in (".tsv", ".txt"):
+        df = pd.read_csv(path, sep="\t")
+    else:
+        df = pd.read_csv(path)
+
+    if 'Abstract' not in df.columns:
+        raise ValueError("❌ 'Abstract' column not found in uploaded export.")
+
+    filename = save_export(df, work_dir)
+    print(f"✅ Saved uploaded data to {filename}")
+    return filename
+
 # Main function to wait for Excel-format data copied from Publish or Perish
-def wait_for_excel_clipboard_and_process():
+def wait_for_excel_clipboard_and_process(work_dir="."):
+    with _CLIPBOARD_LOCK:
+        return _wait_for_clipboard(work_dir)
+
+def _wait_for_clipboard(work_dir):
     open_publish_or_perish()
     print("📋 Waiting for Excel data from clipboard... Please use 'Copy results with Excel header'")
 
@@ -42,22 +107,8 @@ def wait_for_excel_clipboard_and_process():
                     print("⚠️ 'Abstract' column not found in copied data.")
                     continue
 
-                # Extract keywords from the first row of the 'Search terms' or similar column
-                keyword_col = next((col for col in df.columns if 'search term' in col.lower() or 'query' in col.lower()), None)
-                if keyword_col:
-                    raw_keyword = str(df[keyword_col].iloc[0])
-                else:
-                    raw_keyword = "project"
-
-                keyword_slug = raw_keyword.lower().strip().replace(" ", "_").replace("-", "_")
-                keyword_slug = ''.join(c for c in keyword_slug if c.isalnum() or c == "_")[:50]
-
-                with open("last_keywords.txt", "w") as f:
-                    f.write(keyword_slug)
-
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{keyword_slug}_{timestamp}.xlsx"
-                df.to_excel(filename, index=False)
+                # Extract keywords from the 'Search terms' column and save the export
+                filename = save_export(df, work_dir)
 
                 print(f"✅ Saved copied data to {filename}")
                 close_publish_or_perish()
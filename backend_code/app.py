@@ -1,163 +1,706 @@
 import sys
 import os
+import time
 import zipfile
 import subprocess
 import shutil
+import re
 import traceback
-import pandas as pd
-from flask import Flask, send_file, jsonify
+import threading
+import uuid
+
+STARTUP_BEGAN = time.perf_counter()
+
+from flask import Flask, send_file, jsonify, request, url_for, Response, stream_with_context
 from flask_cors import CORS
-from tqdm import tqdm
+from werkzeug.utils import secure_filename
+
+from Pipeline_Code.jobs import JobManager, AdmissionError
+from Pipeline_Code.scheduler import Stage, StageCache, run_dag, source_file, R_FIT, PYTHON, IO
+from Pipeline_Code.artifact_cache import restore_files, link_or_copy, result_cache, model_cache
+from Pipeline_Code.progress import VemProgress, format_sse
+from Pipeline_Code.singleflight import SingleFlight
+from Pipeline_Code.fingerprint import fingerprint, file_sha256
+from Pipeline_Code.workspace import Workspace, BACKEND_DIR, PUBLIC_OUTPUTS_DIR
+from Pipeline_Code.zip_writer import write_zip
+from Pipeline_Code.token_cache import token_cache
+from Pipeline_Code.lazy_imports import lazy, LAZY_IMPORTS, IMPORT_TIMINGS
+from CTM_Code.ctm_runner import run_ctm_analysis, ctm_output_paths, ctm_code_files, find_rscript, parse_k_values, engine_for_model, MODEL_PARAMS, ENGINE, ENGINE_CAPABILITIES, SELECTION_HOLDOUT, DEFAULT_RESTARTS, MAX_RESTARTS, NEW_TERM_MASS, PREVIEW_DOCS, preview_params
+from CTM_Code.topic_metrics import read_fit_stats, rank_candidates, write_comparison, write_restarts
+from CTM_Code.r_pool import r_pool
+from CTM_Code.preprocess import build_dtm, dtm_paths, python_dtm_enabled, lemmatization_ready, lemmas_available, preprocess_code_files, PREPROCESS_VERSION
 
-from PoP_Interface.fetch_from_pop import wait_for_excel_clipboard_and_process
-from CTM_Code.clean_abstracts import remove_empty_abstracts
-from CTM_Code.ctm_runner import run_ctm_analysis
-from CTM_Code.summarize_keywords import generate_summary_topics
-from assign_topic_to_row.assign_tor import assign_topics_to_metadata
+# pandas, sklearn, plotly, networkx and matplotlib are only imported once a stage needs them
+# (set CTM_LAZY_IMPORTS=0 to import everything up front)
+wait_for_excel_clipboard_and_process = lazy("PoP_Interface.fetch_from_pop", "wait_for_excel_clipboard_and_process")
+load_export_file = lazy("PoP_Interface.fetch_from_pop", "load_export_file")
+remove_empty_abstracts = lazy("CTM_Code.clean_abstracts", "remove_empty_abstracts")
+merge_corpora = lazy("CTM_Code.clean_abstracts", "merge_corpora")
+sample_corpus = lazy("CTM_Code.clean_abstracts", "sample_corpus")
+umass_coherence = lazy("CTM_Code.topic_quality", "umass_coherence")
+evaluate_topics = lazy("CTM_Code.topic_quality", "evaluate_topics")
+read_quality = lazy("CTM_Code.topic_quality", "read_quality")
+generate_summary_topics = lazy("CTM_Code.summarize_keywords", "generate_summary_topics")
+assign_topics_to_metadata = lazy("assign_topic_to_row.assign_tor", "assign_topics_to_metadata")
 
-from Visualization_Code.bar_graph import bar_chart_overview
-from Visualization_Code.linechart import line_chart_overview
-from Visualization_Code.pie_chart import generate_pie_chart
-from Visualization_Code.sum_sunburst import create_sunburst_chart
-from Visualization_Code.keyword_network import generate_keyword_network
-from Visualization_Code.venn_diagram import generate_venn_diagram
+bar_chart_overview = lazy("Visualization_Code.bar_graph", "bar_chart_overview")
+line_chart_overview = lazy("Visualization_Code.linechart", "line_chart_overview")
+generate_pie_chart = lazy("Visualization_Code.pie_chart", "generate_pie_chart")
+create_sunburst_chart = lazy("Visualization_Code.sum_sunburst", "create_sunburst_chart")
+generate_keyword_network = lazy("Visualization_Code.keyword_network", "generate_keyword_network")
+generate_venn_diagram = lazy("Visualization_Code.venn_diagram", "generate_venn_diagram")
 
-print("✅ Flask app is loaded and waiting...")
+STARTUP_SECONDS = round(time.perf_counter() - STARTUP_BEGAN, 4)
+print(f"✅ Flask app is loaded and waiting... (startup {STARTUP_SECONDS}s, lazy imports {'on' if LAZY_IMPORTS else 'off'})")
 
 app = Flask(__name__)
 CORS(app)
 app.config['PROPAGATE_EXCEPTIONS'] = True
 app.debug = True
 
-@app.route('/run_ctm', methods=['POST'])
-def run_pipeline():
-    print("🚨 Received POST /run_ctm request")
+jobs = JobManager()
+inflight = SingleFlight()
+
+# Uploaded exports wait here until their job starts and moves them into its workspace
+UPLOADS_DIR = os.path.join(BACKEND_DIR, "uploads")
+
+def execute_pipeline(job):
+    # Every run works in its own directory so concurrent runs can't clobber each other;
+    # a resumed run reopens the workspace (and checkpoint) of the run it continues
+    workspace = Workspace(job.params.get("resume_run") or job.id).create()
+    job.workspace = workspace
+    # An uploaded export moves out of the shared staging folder into the run, so it is
+    # kept (for resume) and removed together with the run instead of piling up
+    upload_path = job.params.get("upload_path")
+    if upload_path and os.path.dirname(upload_path) == UPLOADS_DIR and os.path.exists(upload_path):
+        job.params["upload_path"] = os.path.join(workspace.input_dir, os.path.basename(upload_path))
+        shutil.move(upload_path, job.params["upload_path"])
+    workspace.checkpoint.mark("running")
     try:
-        steps = tqdm(total=8, desc="🔄 Running CTM pipeline", ncols=80)
-        root_dir = os.getcwd()
-        outputs_dir = os.path.join(root_dir, "outputs")
-        os.makedirs(outputs_dir, exist_ok=True)
+        zip_path = run_stages(job, workspace)
+    except Exception as e:
+        workspace.checkpoint.mark("failed", str(e))
+        raise
+    workspace.checkpoint.mark("done")
+    return zip_path
 
-        # Step 1: Clipboard Input
-        print("📋 Starting clipboard extraction...")
-        filename = wait_for_excel_clipboard_and_process()
-        if not filename or not os.path.exists(filename):
-            raise FileNotFoundError("Failed to get valid Excel file from clipboard")
+def run_stages(job, workspace):
+    progress = job.progress
+    checkpoint = workspace.checkpoint
+    if not job.params.get("resume_run"):
+        checkpoint.update_run(params=job.params)
 
-        base_filename = os.path.splitext(os.path.basename(filename))[0]
+    # Step 1: Clipboard Input (or an uploaded export)
+    if checkpoint.is_complete("input"):
+        filename = checkpoint.run["export_path"]
+        progress.publish("stage", stage="input", state="skipped")
+    else:
+        with job.stage("input"):
+            if job.params.get("upload_path"):
+                print("📤 Loading uploaded export...")
+                filename = load_export_file(job.params["upload_path"], workspace.input_dir)
+            else:
+                print("📋 Starting clipboard extraction...")
+                filename = wait_for_excel_clipboard_and_process(workspace.input_dir)
+            if not filename or not os.path.exists(filename):
+                raise FileNotFoundError("Failed to get valid Excel file from clipboard")
+            print(f"✅ Clipboard data saved to {filename}")
+        checkpoint.update_run(export_path=filename)
+        checkpoint.complete("input", {"export": filename})
 
-        try:
-            with open("last_keywords.txt", "r") as f:
-                keyword_base = f.read().strip()
-        except:
-            keyword_base = base_filename.lower().replace(" ", "_").replace("-", "_")
+    base_filename = os.path.splitext(os.path.basename(filename))[0]
+    keyword_base = workspace.keyword(base_filename.lower().replace(" ", "_").replace("-", "_"))
 
-        output_folder = os.path.join(outputs_dir, f"{keyword_base}_data")
+    # Topic count(s) requested with the job; several k values turn on model selection.
+    # With a base run the model is updated from that run's fit instead of refitted.
+    base_run = load_base_run(job.params["base_run"]) if job.params.get("base_run") else None
+    model_params = job_model_params(job.params, base_run)
+
+    # Step 6 (early): results are written straight into the folder that gets zipped
+    output_folder = workspace.output_folder(keyword_base)
+    cleaned_folder, ctm_folder, viz_folder = workspace.result_folders(keyword_base)
+    zip_path = f"{output_folder}.zip"
+
+    # Repeat of a search we already answered: hand back the finished zip right away
+    result_key = None
+    if result_cache and workspace.export_hash():
+        result_key = fingerprint(normalize_slug(keyword_base), workspace.export_hash(), model_params)
+        with result_cache.checkout(result_key) as cached:
+            if cached is not None:
+                link_or_copy(cached["zip"], zip_path)
+        if cached is not None:
+            publish_zip(zip_path, job.id)
+            progress.publish("result_cache", state="hit")
+            print(f"⚡ Returning cached result for '{keyword_base}'")
+            return zip_path
+
+    # Step 2: Clean Abstracts
+    cleaned_csv_path = os.path.join(cleaned_folder, f"cleaned_{base_filename}.csv")
+    if checkpoint.is_complete("clean"):
+        progress.publish("stage", stage="clean", state="skipped")
+    else:
+        with job.stage("clean"):
+            remove_empty_abstracts(filename, cleaned_csv_path)
+            if not os.path.exists(cleaned_csv_path):
+                raise FileNotFoundError(f"Failed to create cleaned CSV at {cleaned_csv_path}")
+            print(f"🧼 Abstracts cleaned and saved to {cleaned_csv_path}")
+            if base_run:
+                # Incremental update: the earlier run's corpus plus the newly pasted papers
+                merge_corpora(base_run.cleaned_csv(), cleaned_csv_path, cleaned_csv_path)
+        checkpoint.complete("clean", {"cleaned": cleaned_csv_path})
+
+    # Identical submissions (same keywords, same cleaned corpus, same model settings)
+    # attach to the run already in flight instead of fitting their own CTM
+    coalesce_key = fingerprint(keyword_base, file_sha256(cleaned_csv_path), model_params)
+
+    def fit_and_render(workspace, cleaned_csv_path, model_params):
+        # Fits the model and renders every result inside `workspace`; returns its zip.
+        # Paths produced by earlier stages and read by later ones
+        checkpoint = workspace.checkpoint
+        output_folder = workspace.output_folder(keyword_base)
+        cleaned_folder, ctm_folder, viz_folder = workspace.result_folders(keyword_base)
         zip_path = f"{output_folder}.zip"
+        ctm_paths = ctm_output_paths(base_filename, workspace.model_dir, model_params)
+        k_candidates = model_params.get("k_candidates")
+        restart_seeds = [model_params["seed"] + i for i in range(model_params.get("restarts", 1))]
+        if k_candidates:
+            ctm_paths["selection"] = os.path.join(workspace.model_dir, "CTMmods", "model_selection.csv")
+        if len(restart_seeds) > 1:
+            ctm_paths["restarts"] = os.path.join(workspace.model_dir, "CTMmods", "restarts.csv")
+        ctm_output_csv = ctm_paths["summary"]
+        quality_paths = {
+            "topic_quality": os.path.join(workspace.model_dir, "CTMmods", "topic_quality.csv"),
+            "model_quality": os.path.join(workspace.model_dir, "CTMmods", "model_quality.csv"),
+        }
+        assigned_output_path = os.path.join(cleaned_folder, f"{base_filename}_with_assigned_topics.xlsx")
+
+        # Step 3a: Build the document-term matrix in Python (falls back to R's tm pipeline
+        # when the lemma dictionary can't be exported, except for engines that need it).
+        # Engines that stream the corpus tokenize it themselves and never hold a full DTM.
+        # Python tokenization without lemmas only goes ahead with CTM_REQUIRE_LEMMAS=0.
+        dtm_use = ENGINE_CAPABILITIES[model_params.get("engine", "r")]["dtm"]
+        if dtm_use in ("required", "streamed"):
+            # No tm pipeline to fall back to: these engines always tokenize in Python
+            lemmatization_ready()
+        use_python_dtm = dtm_use == "required" or (dtm_use == "optional" and python_dtm_enabled())
+        # R's own tm pipeline always lemmatizes
+        lemmatized = (dtm_use == "optional" and not use_python_dtm) or lemmas_available()
+        if not lemmatized:
+            job.warn("⚠️ Lemma dictionary unavailable: terms are not lemmatized and differ from the R pipeline's (CTM_REQUIRE_LEMMAS=0)")
+        dtm_dir = os.path.join(workspace.model_dir, "dtm")
+
+        def preprocess():
+            print("🔤 Building document-term matrix...")
+            build_dtm(cleaned_csv_path, dtm_dir, token_cache=token_cache)
+
+        # Step 3: Run CTM (R output is streamed to the job's progress events)
+        def run_ctm():
+            print("⚙️ Running CTM analysis...")
+            run_ctm_analysis(
+                base_filename, cleaned_csv_path, workspace.model_dir,
+                on_output=VemProgress(progress, "ctm"),
+                params=model_params,
+                dtm_dir=dtm_dir if use_python_dtm else None,
+                model_cache=model_cache,
+                init_model=base_run.saved_model() if base_run else None,
+                token_cache=token_cache,
+                lemmatized=lemmatized
+            )
+            checkpoint.update_run(selected_k=model_params["k"], selected_seed=model_params["seed"])
+            print("🔍 CTM analysis complete.")
+
+        # Step 3 (model selection / restarts): one fit per candidate k and seed, run in
+        # parallel on the shared DTM; restarts of the same k keep the best log-likelihood
+        fits = [(k, seed) for k in k_candidates or [model_params["k"]] for seed in restart_seeds]
+
+        def candidate_name(k, seed):
+            return "ctm_" + "_".join(
+                ([f"k{k}"] if k_candidates else []) + ([f"s{seed}"] if len(restart_seeds) > 1 else [])
+            )
 
-        print(f"✅ Clipboard data saved to {filename}")
-        steps.update(1)
+        def candidate_dir(k, seed):
+            return os.path.join(workspace.model_dir, "candidates", f"k{k}_s{seed}")
 
-        # Step 2: Clean Abstracts
-        cleaned_csv_path = os.path.join(outputs_dir, f"cleaned_{base_filename}.csv")
-        remove_empty_abstracts(filename, cleaned_csv_path)
-        if not os.path.exists(cleaned_csv_path):
-            raise FileNotFoundError(f"Failed to create cleaned CSV at {cleaned_csv_path}")
-        print(f"🧼 Abstracts cleaned and saved to {cleaned_csv_path}")
-        steps.update(1)
+        def candidate_params(k, seed):
+            return {**model_params, "k": k, "seed": seed, "split_seed": model_params["seed"]}
 
-        # Step 3: Run CTM
-        print("⚙️ Running CTM analysis...")
-        ctm_output_csv, ctm_rdata_path = run_ctm_analysis(base_filename, cleaned_csv_path)
-        print("🔍 CTM analysis complete.")
-        steps.update(1)
+        def fit_candidate(k, seed):
+            def fit():
+                print(f"⚙️ Fitting candidate CTM with k={k}, seed={seed}...")
+                run_ctm_analysis(
+                    base_filename, cleaned_csv_path, candidate_dir(k, seed),
+                    on_output=VemProgress(progress, candidate_name(k, seed)),
+                    params=candidate_params(k, seed),
+                    dtm_dir=dtm_dir if use_python_dtm else None,
+                    model_cache=model_cache,
+                    token_cache=token_cache,
+                    lemmatized=lemmatized
+                )
+            return Stage(
+                candidate_name(k, seed), fit, deps=[s.name for s in preprocess_stages], resource=R_FIT,
+                outputs=lambda: ctm_output_paths(base_filename, candidate_dir(k, seed), candidate_params(k, seed))
+            )
+
+        def select_model():
+            # Best restart per k by final log-likelihood, then the best k by perplexity/coherence
+            fit_stats = []
+            for k, seed in fits:
+                stats = read_fit_stats(ctm_output_paths(base_filename, candidate_dir(k, seed), candidate_params(k, seed))["fit_stats"])
+                fit_stats.append({**stats, "k": k, "seed": seed})
+
+            candidates = []
+            for k in k_candidates or [model_params["k"]]:
+                restarts = [f for f in fit_stats if f["k"] == k]
+                best_restart = max(restarts, key=lambda f: f["logLik"])
+                for f in restarts:
+                    f["selected"] = f is best_restart
+                candidates.append(dict(best_restart))
+
+            os.makedirs(os.path.join(workspace.model_dir, "CTMmods"), exist_ok=True)
+            if len(restart_seeds) > 1:
+                write_restarts(fit_stats, ctm_paths["restarts"])
+            if k_candidates:
+                for c in candidates:
+                    paths = ctm_output_paths(base_filename, candidate_dir(c["k"], c["seed"]), candidate_params(c["k"], c["seed"]))
+                    c["coherence"] = umass_coherence(dtm_dir, paths["topic_word"], paths["terms"]) if use_python_dtm else None
+                best = rank_candidates(candidates)
+                write_comparison(candidates, ctm_paths["selection"])
+            else:
+                best = candidates[0]
+
+            best_paths = ctm_output_paths(base_filename, candidate_dir(best["k"], best["seed"]), candidate_params(best["k"], best["seed"]))
+            for name, path in best_paths.items():
+                shutil.copy2(path, ctm_paths[name])
+            checkpoint.update_run(selected_k=best["k"], selected_seed=best["seed"])
+            progress.publish("model_selection", selected_k=best["k"], selected_seed=best["seed"], fits=fit_stats)
+            print(f"🏆 Selected k={best['k']} (seed {best['seed']}, logLik {best['logLik']}) out of {len(fits)} fits")
 
         # Step 4: Generate Keywords
-        if os.path.exists(ctm_output_csv):
-            try:
-                generate_summary_topics(ctm_output_csv, ctm_output_csv)
-                print("🧠 Summary topics generated")
-            except Exception as e:
-                print(f"⚠️ Failed to generate summary topics: {str(e)}")
-        steps.update(1)
+        def summarize():
+            if os.path.exists(ctm_output_csv):
+                try:
+                    generate_summary_topics(ctm_output_csv, ctm_output_csv)
+                    print("🧠 Summary topics generated")
+                except Exception as e:
+                    print(f"⚠️ Failed to generate summary topics: {str(e)}")
+
+        # Step 4b: Topic quality metrics (coherence, perplexity, diversity, exclusivity),
+        # written next to the CTM files for the zip and recorded in the run's checkpoint
+        def record_quality(quality):
+            checkpoint.update_run(quality=quality)
+            progress.publish("quality", **quality)
+
+        def evaluate():
+            quality = evaluate_topics(
+                ctm_paths["topic_word"], ctm_paths["doc_topic"], ctm_paths["terms"], ctm_paths["fit_stats"],
+                os.path.dirname(quality_paths["model_quality"]),
+                dtm_dir=dtm_dir if use_python_dtm else None
+            )
+            record_quality(quality)
+
+        def restore_quality(cached):
+            restore_files(cached, quality_paths)
+            record_quality(read_quality(quality_paths["model_quality"]))
 
         # Step 5: Assign Topics
-        assigned_output_path = os.path.join(outputs_dir, f"{base_filename}_with_assigned_topics.xlsx")
-        if os.path.exists(cleaned_csv_path) and os.path.exists(ctm_output_csv):
-            assign_topics_to_metadata(cleaned_csv_path, ctm_output_csv, assigned_output_path)
-            print("🏷️ Topics assigned")
-        steps.update(1)
+        def assign():
+            if os.path.exists(cleaned_csv_path) and os.path.exists(ctm_output_csv):
+                assign_topics_to_metadata(cleaned_csv_path, ctm_output_csv, assigned_output_path)
+                print("🏷️ Topics assigned")
 
-        # Step 6: Organize folders
-        cleaned_folder = os.path.join(output_folder, "Cleaned Dataset")
-        ctm_folder = os.path.join(output_folder, "CTM Results")
-        viz_folder = os.path.join(output_folder, "Visualizations")
+        # Step 8: Move CTM files out of the run's scratch space, then zip
+        def package():
+            files_to_move = [
+                (path, os.path.join(ctm_folder, os.path.basename(path)))
+                for path in [*ctm_paths.values(), *quality_paths.values()]
+            ]
 
-        os.makedirs(cleaned_folder, exist_ok=True)
-        os.makedirs(ctm_folder, exist_ok=True)
-        os.makedirs(viz_folder, exist_ok=True)
+            for src, dst in files_to_move:
+                if os.path.exists(src):
+                    shutil.move(src, dst)
 
-        # Step 7: Visualizations
-        bar_chart_overview(assigned_output_path, output_folder)
-        generate_pie_chart(ctm_output_csv, output_folder)
-        create_sunburst_chart(ctm_output_csv, output_folder)
-        line_chart_overview(assigned_output_path, output_folder)
-        generate_keyword_network(ctm_output_csv, output_folder)
-        generate_venn_diagram(ctm_output_csv, output_folder)
+            print(f"📂 All results saved to: {output_folder}")
 
+            # Step 9: Zip it up in one pass (PNG/XLSX stored, HTML/CSV deflated)
+            write_zip(output_folder, zip_path)
 
+            # Also expose it under public outputs
+            publish_zip(zip_path, job.id)
 
-        print("📊 Visualizations done")
-        steps.update(1)
-
-        # Step 8: Move files
-        files_to_move = [
-            (cleaned_csv_path, os.path.join(cleaned_folder, os.path.basename(cleaned_csv_path))),
-            (assigned_output_path, os.path.join(cleaned_folder, os.path.basename(assigned_output_path))),
-            (ctm_output_csv, os.path.join(ctm_folder, os.path.basename(ctm_output_csv))),
-            (ctm_rdata_path, os.path.join(ctm_folder, os.path.basename(ctm_rdata_path)))
+        # Step 7: Visualizations, each as its own stage so independent charts run in parallel.
+        # Charts render into a private staging folder first so we know exactly which files
+        # a stage produced; file names carry the run's base name, stored as "{base}" in the cache.
+        chart_files = {}
+
+        def chart(name, fn, source):
+            staging = os.path.join(workspace.path, "stages", name)
+
+            def render():
+                fn(source, staging)
+                staged_viz = os.path.join(staging, "Visualizations")
+                produced = {}
+                for filename in os.listdir(staged_viz):
+                    dest = os.path.join(viz_folder, filename)
+                    shutil.move(os.path.join(staged_viz, filename), dest)
+                    produced[filename.replace(base_filename, "{base}")] = dest
+                chart_files[name] = produced
+
+            def restore(cached):
+                destinations = {
+                    logical: os.path.join(viz_folder, logical.replace("{base}", base_filename))
+                    for logical in cached
+                }
+                restore_files(cached, destinations)
+                chart_files[name] = destinations
+
+            cache = StageCache(
+                inputs=lambda: [source],
+                outputs=lambda: chart_files.get(name, {}),
+                code=[source_file(fn)],
+                restore=restore
+            )
+            serialize = "pyplot" if source == assigned_output_path else None
+            deps = ["assign"] if source == assigned_output_path else ["summarize"]
+            return Stage(name, render, deps=deps, serialize=serialize, cache=cache)
+
+        # The CTM CSV charts read it after summarize() has added 'Summary topic' to it
+        charts = [
+            chart("pie_chart", generate_pie_chart, ctm_output_csv),
+            chart("sunburst_chart", create_sunburst_chart, ctm_output_csv),
+            chart("keyword_network", generate_keyword_network, ctm_output_csv),
+            chart("venn_diagram", generate_venn_diagram, ctm_output_csv),
+            chart("bar_chart", bar_chart_overview, assigned_output_path),
+            chart("line_chart", line_chart_overview, assigned_output_path),
         ]
 
-        for src, dst in files_to_move:
-            if os.path.exists(src):
-                shutil.move(src, dst)
-
-        for extra_file in [
-            "CTM10 - Topics With Keywords and Abstracts.csv",
-            "CTM10 - Topic Word Matrix.csv",
-            "CTM10 - Doc Topic Matrix.csv"
-        ]:
-            full_path = os.path.join(outputs_dir, extra_file)
-            if os.path.exists(full_path):
-                shutil.move(full_path, os.path.join(ctm_folder, extra_file))
-
-        print(f"📂 All results saved to: {output_folder}")
-        steps.update(1)
-
-        # Step 9: Zip it up
-        shutil.make_archive(output_folder, 'zip', output_folder)
-
-        # Also copy to public outputs
-        public_outputs_dir = os.path.join(root_dir, "frontend", "public", "outputs")
-        os.makedirs(public_outputs_dir, exist_ok=True)
-        shutil.copy(zip_path, os.path.join(public_outputs_dir, os.path.basename(zip_path)))
-        print(f"📁 Zip copied to frontend/public/outputs/{os.path.basename(zip_path)}")
-
-        steps.close()
-
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            download_name=os.path.basename(zip_path)
+        # Unchanged stages are restored from the artifact cache instead of re-running:
+        # the CTM is keyed on cleaned CSV + model params, later stages on their inputs
+        preprocess_stages = []
+        if use_python_dtm:
+            preprocess_stages.append(Stage("dtm", preprocess, cache=StageCache(
+                inputs=lambda: [cleaned_csv_path],
+                outputs=lambda: dtm_paths(dtm_dir),
+                params={"version": PREPROCESS_VERSION},
+                code=preprocess_code_files()
+            )))
+
+        ctm_cache = StageCache(
+            inputs=lambda: [cleaned_csv_path] + (list(dtm_paths(dtm_dir).values()) if use_python_dtm else []),
+            outputs=lambda: ctm_paths,
+            params={**model_params, "python_dtm": use_python_dtm},
+            code=ctm_code_files()
         )
+        if len(fits) > 1:
+            candidate_stages = [fit_candidate(k, seed) for k, seed in fits]
+            ctm_stages = [
+                *candidate_stages,
+                Stage("ctm", select_model, deps=[s.name for s in candidate_stages], resource=PYTHON, cache=ctm_cache),
+            ]
+        else:
+            ctm_stages = [Stage("ctm", run_ctm, deps=[s.name for s in preprocess_stages], resource=R_FIT, cache=ctm_cache)]
 
-    except Exception as e:
+        run_dag([
+            *preprocess_stages,
+            *ctm_stages,
+            Stage("summarize", summarize, deps=["ctm"], cache=StageCache(
+                inputs=lambda: [ctm_output_csv],
+                outputs=lambda: {"summary": ctm_output_csv},
+                code=[source_file(generate_summary_topics)]
+            )),
+            Stage("assign", assign, deps=["summarize"], cache=StageCache(
+                inputs=lambda: [cleaned_csv_path, ctm_output_csv],
+                outputs=lambda: {"assigned": assigned_output_path},
+                code=[source_file(assign_topics_to_metadata)]
+            )),
+            Stage("evaluate", evaluate, deps=["ctm"], cache=StageCache(
+                inputs=lambda: [ctm_paths[name] for name in ("topic_word", "doc_topic", "terms", "fit_stats")]
+                + (list(dtm_paths(dtm_dir).values()) if use_python_dtm else []),
+                outputs=lambda: quality_paths,
+                code=[source_file(evaluate_topics)],
+                restore=restore_quality
+            )),
+            *charts,
+            Stage("package", package, deps=["evaluate", *[c.name for c in charts]], resource=IO,
+                  outputs=lambda: {"zip": zip_path}),
+        ], job, checkpoint)
+        print("📊 Visualizations done")
+        return zip_path
+
+    def fit_preview():
+        # Preview: a Year-stratified sample fitted with loose VEM tolerances, rendered and
+        # published first; the full fit then overwrites the published zip when it finishes
+        preview_workspace = Workspace("preview", root=workspace.path).create()
+        preview_csv = os.path.join(preview_workspace.result_folders(keyword_base)[0], f"cleaned_{base_filename}.csv")
+        _, sampled, total = sample_corpus(cleaned_csv_path, preview_csv, PREVIEW_DOCS, strata="Year", seed=model_params["seed"])
+        if sampled >= total:
+            print("⏭️ Corpus is small enough to fit in full, skipping the preview")
+            return
+        progress.publish("preview", state="running", docs=sampled, total_docs=total)
+        job.preview_path = fit_and_render(preview_workspace, preview_csv, preview_params(model_params))
+        progress.publish("preview", state="ready", docs=sampled, total_docs=total)
+        print(f"👀 Preview on {sampled} of {total} abstracts ready, running the full fit...")
+
+    def fit_with_preview():
+        if job.params.get("preview") and not checkpoint.is_complete("ctm"):
+            fit_preview()
+        return fit_and_render(workspace, cleaned_csv_path, model_params)
+
+    leader = inflight.in_flight(coalesce_key)
+    if leader:
+        print(f"🔗 Job {job.id} is attaching to in-flight job {leader}")
+        progress.publish("coalesced", leader_job_id=leader)
+
+    result_zip, _ = inflight.do(coalesce_key, fit_with_preview, owner=job.id)
+    if result_key:
+        result_cache.store(result_key, {"zip": result_zip}, link=True)
+    return result_zip
+
+def load_base_run(run_id):
+    """
+    Workspace of a finished run to update incrementally. Raises ValueError if
+    it can't be used: it needs its cleaned corpus and a saved model.
+    """
+    base = Workspace(secure_filename(run_id or ""))
+    if not run_id or not base.exists():
+        raise ValueError(f"❌ No run {run_id} to update")
+    base.create()
+    if base.checkpoint.data["status"] != "done":
+        raise ValueError(f"❌ Run {run_id} has not finished")
+    if not base.cleaned_csv() or not base.saved_model():
+        raise ValueError(f"❌ Run {run_id} has no cleaned corpus or saved model (was it run with CTM_KEEP_RDATA=0?)")
+    return base
+
+def job_model_params(params, base_run=None):
+    # MODEL_PARAMS with the job's "k" and "restarts" applied: one k value sets k, several are compared
+    model_params = dict(MODEL_PARAMS)
+    if base_run:
+        # Incremental update: one warm-started fit with the earlier model's k
+        base_params = base_run.checkpoint.run
+        model_params["k"] = base_params.get("selected_k") or job_model_params(base_params.get("params", {}))["k"]
+        model_params["init_model"] = file_sha256(base_run.saved_model())
+        # Warm starts continue the earlier model in the engine that saved it
+        model_params["engine"] = engine_for_model(base_run.saved_model())
+        model_params["new_term_mass"] = NEW_TERM_MASS
+        return model_params
+    restarts = int(params.get("restarts") or DEFAULT_RESTARTS)
+    if restarts > 1:
+        model_params["restarts"] = restarts
+    if params.get("k"):
+        k_values = parse_k_values(params["k"])
+        if len(k_values) == 1:
+            model_params["k"] = k_values[0]
+        else:
+            model_params["k_candidates"] = k_values
+            model_params["holdout"] = float(params.get("holdout") or SELECTION_HOLDOUT)
+    return model_params
+
+def publish_zip(zip_path, job_id):
+    # Hard link (no second copy of the bytes) under a temp name, then swap it in
+    # so parallel runs never expose half a zip
+    public_zip = os.path.join(PUBLIC_OUTPUTS_DIR, os.path.basename(zip_path))
+    tmp_zip = f"{public_zip}.{job_id}.tmp"
+    link_or_copy(zip_path, tmp_zip)
+    os.replace(tmp_zip, public_zip)
+    if os.path.exists(tmp_zip):
+        # rename() is a no-op when both names already link to the same file
+        os.remove(tmp_zip)
+    print(f"📁 Zip published to {public_zip}")
+
+def normalize_slug(slug):
+    # "Climate  Change" and "climate_change_" should share a cache entry
+    return re.sub(r"_+", "_", slug.lower()).strip("_")
+
+def job_urls(job):
+    return {
+        "job_id": job.id,
+        "status_url": url_for("job_status", job_id=job.id),
+        "result_url": url_for("job_result", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+        "preview_url": url_for("job_preview", job_id=job.id),
+    }
+
+@app.route('/health', methods=['GET'])
+def health():
+    # Cheap liveness check; also reports startup and per-module import cost
+    return jsonify({
+        "status": "ok",
+        "startup_seconds": STARTUP_SECONDS,
+        "lazy_imports": LAZY_IMPORTS,
+        "import_seconds": IMPORT_TIMINGS,
+        "engine": ENGINE,
+        "r_workers": {"size": r_pool.size, "available": r_pool.available},
+        "token_cache": token_cache.stats() if token_cache else None,
+        "model_cache": model_cache.stats() if model_cache else None,
+    })
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    print("🚨 Received POST /jobs request")
+    params = {}
+
+    # Optional topic count(s): "5", "3-8" or "4,6,8" (several compare models and keep the best)
+    if request.form.get("k"):
+        try:
+            parse_k_values(request.form["k"])
+            holdout = float(request.form.get("holdout") or SELECTION_HOLDOUT)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not 0 < holdout < 1:
+            return jsonify({"error": "❌ holdout must be between 0 and 1"}), 400
+        params["k"] = request.form["k"]
+        params["holdout"] = holdout
+
+    # Optional finished run to grow: its corpus gets the new papers and its model is updated
+    if request.form.get("base_run"):
+        try:
+            load_base_run(request.form["base_run"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        params["base_run"] = request.form["base_run"]
+
+    # Optional preview: a quick fit on a sample is published first, the full fit replaces it
+    if request.form.get("preview", "").lower() in ("1", "true", "yes", "on"):
+        params["preview"] = True
+
+    # Optional number of differently seeded fits per k; the best log-likelihood is kept
+    if request.form.get("restarts"):
+        try:
+            restarts = int(request.form["restarts"])
+        except ValueError:
+            restarts = 0
+        if not 1 <= restarts <= MAX_RESTARTS:
+            return jsonify({"error": f"❌ restarts must be between 1 and {MAX_RESTARTS}"}), 400
+        params["restarts"] = restarts
+
+    # Optional uploaded PoP export; without one the job reads the clipboard.
+    # Saved only once the request is valid so rejected requests leave nothing behind
+    upload = request.files.get("file")
+    if upload and upload.filename:
+        os.makedirs(UPLOADS_DIR, exist_ok=True)
+        upload_path = os.path.join(UPLOADS_DIR, f"{uuid.uuid4().hex[:8]}_{secure_filename(upload.filename)}")
+        upload.save(upload_path)
+        params["upload_path"] = upload_path
+
+    try:
+        job = jobs.submit(execute_pipeline, params)
+    except AdmissionError as e:
+        if params.get("upload_path"):
+            os.remove(params["upload_path"])
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "30"}
+    return jsonify(job_urls(job)), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify({**job.to_dict(), **job_urls(job)})
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+
+    # EventSource sends Last-Event-ID when it reconnects
+    last_id = int(request.headers.get("Last-Event-ID", request.args.get("last_id", 0)) or 0)
+
+    def stream():
+        for item in job.progress.follow(last_id):
+            yield format_sse(item)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    # Continues a failed run from its first incomplete stage, reusing its checkpointed artifacts.
+    # Works from the workspace on disk, so it also survives a server restart.
+    previous = jobs.get(job_id)
+    if previous is not None and previous.status in ("queued", "running"):
+        return jsonify({"error": f"Job {job_id} is still {previous.status}"}), 409
+
+    # The id becomes a directory under RUNS_DIR, so anything that isn't a plain name is unknown
+    if secure_filename(job_id) != job_id:
+        return jsonify({"error": f"No checkpoint found for job {job_id}"}), 404
+    workspace = Workspace(job_id)
+    if not workspace.exists():
+        return jsonify({"error": f"No checkpoint found for job {job_id}"}), 404
+
+    params = dict(workspace.create().checkpoint.run.get("params", {}))
+    params["resume_run"] = job_id
+    try:
+        job = jobs.submit(execute_pipeline, params)
+    except AdmissionError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "30"}
+    return jsonify({**job_urls(job), "resumed_from": job_id}), 202
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    if job.status == "failed":
+        return jsonify({"error": job.error, "traceback": job.traceback}), 500
+    if job.status != "done" or not job.result_path:
+        return jsonify(job.to_dict()), 409
+
+    return send_file(
+        job.result_path,
+        as_attachment=True,
+        download_name=os.path.basename(job.result_path)
+    )
+
+@app.route('/jobs/<job_id>/preview', methods=['GET'])
+def job_preview(job_id):
+    # Provisional zip from the sampled, loosely converged fit (available while the full fit runs)
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    if not job.preview_path or not os.path.exists(job.preview_path):
+        return jsonify(job.to_dict()), 409
+
+    return send_file(
+        job.preview_path,
+        as_attachment=True,
+        download_name=os.path.basename(job.preview_path)
+    )
+
+@app.route('/run_ctm', methods=['POST'])
+def run_pipeline():
+    # Blocking variant kept for older clients: submits a job and waits for it
+    print("🚨 Received POST /run_ctm request")
+    try:
+        job = jobs.submit(execute_pipeline)
+    except AdmissionError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "30"}
+    job.future.result()
+
+    if job.status == "failed":
         print("❌ Error during CTM pipeline execution:")
-        traceback.print_exc()
         return jsonify({
-            "error": str(e),
-            "traceback": traceback.format_exc()
+            "error": job.error,
+            "traceback": job.traceback
         }), 500
 
+    return send_file(
+        job.result_path,
+        as_attachment=True,
+        download_name=os.path.basename(job.result_path)
+    )
+
+def warm_r_workers():
+    # Load R and the CTM libraries in the background so the first fit starts warm
+    try:
+        r_pool.warm(find_rscript())
+    except FileNotFoundError as e:
+        print(f"⚠️ {e} R workers not started")
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true" and ENGINE == "r":
+        threading.Thread(target=warm_r_workers, daemon=True).start()
+    app.run(debug=True, threaded=True)
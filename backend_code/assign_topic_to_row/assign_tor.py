@@ -3,6 +3,8 @@ import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+from CTM_Code.arrow_io import read_corpus
+
 def clean_text(text):
     """Remove extra spaces and normalize text formatting."""
     if pd.isna(text):
@@ -11,7 +13,7 @@ def clean_text(text):
 
 def assign_topics_to_metadata(metadata_file, topics_file, output_file):
     # Load the metadata file (support both CSV and Excel)
-    df = pd.read_csv(metadata_file) if metadata_file.endswith(".csv") else pd.read_excel(metadata_file)
+    df = read_corpus(metadata_file) if metadata_file.endswith(".csv") else pd.read_excel(metadata_file)
     topics_df = pd.read_csv(topics_file) if topics_file.endswith(".csv") else pd.read_excel(topics_file)
 
     # Limit to top 5 topics for testing
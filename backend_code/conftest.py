@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Keep every cache, run workspace and published zip the modules set up at import time
+# out of the checkout; tests that need a cache build their own under tmp_path
+_scratch = tempfile.mkdtemp(prefix="ctm-tests-")
+os.environ.setdefault("CTM_CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("CTM_RUNS_DIR", os.path.join(_scratch, "runs"))
+os.environ.setdefault("CTM_PUBLIC_OUTPUTS_DIR", os.path.join(_scratch, "public"))
+os.environ.setdefault("CTM_ARTIFACT_CACHE", "0")
+os.environ.setdefault("CTM_RESULT_CACHE", "0")
+os.environ.setdefault("CTM_MODEL_CACHE", "0")
+os.environ.setdefault("CTM_TOKEN_CACHE", "0")
+os.environ.setdefault("CTM_R_WORKERS", "0")
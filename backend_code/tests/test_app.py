@@ -0,0 +1,27 @@
+import os
+import json
+
+import pytest
+
+import app as server
+from Pipeline_Code.workspace import RUNS_DIR
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+def test_resume_rejects_ids_that_leave_the_runs_directory(client):
+    # A checkpoint one level above RUNS_DIR must not be reachable as job ".."
+    os.makedirs(RUNS_DIR, exist_ok=True)
+    outside = os.path.join(os.path.dirname(RUNS_DIR), "checkpoint.json")
+    with open(outside, "w") as f:
+        json.dump({"run": {"params": {}}, "stages": {}, "status": "failed", "error": None}, f)
+    try:
+        response = client.post("/jobs/%2E%2E/resume")
+        assert response.status_code == 404
+        assert server.jobs.get("..") is None
+    finally:
+        os.remove(outside)
+
+def test_resume_of_an_unknown_run_is_404(client):
+    assert client.post("/jobs/0123456789ab/resume").status_code == 404
@@ -0,0 +1,103 @@
+import os
+import sys
+import subprocess
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from CTM_Code import arrow_io
+from CTM_Code.arrow_io import write_corpus, read_corpus, current_arrow_copy, iter_arrow_column, arrow_path
+from CTM_Code.preprocess import read_abstracts
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def arrow_enabled(monkeypatch):
+    monkeypatch.setattr(arrow_io, "ARROW_ENABLED", True)
+
+def corpus():
+    # PoP exports mix numbers and text in one column; missing and "NA" abstracts are dropped by readers
+    return pd.DataFrame({
+        "Title": ["Patient care", "Models", "Children", "Risk", "Care models"],
+        "Year": [2021, "n.d.", 2019, 2020, 2024],
+        "Abstract": ["Patients' care: 12 studies.", None, "NA", "  Risk of models.  ", "Care, again."],
+    })
+
+def test_corpus_round_trip(tmp_path):
+    csv_path = str(tmp_path / "cleaned.csv")
+    assert write_corpus(corpus(), csv_path) == csv_path
+    assert current_arrow_copy(csv_path) == arrow_path(csv_path)
+
+    from_arrow = read_corpus(csv_path)
+    assert list(from_arrow.columns) == ["Title", "Year", "Abstract"]
+    assert from_arrow["Title"].tolist() == corpus()["Title"].tolist()
+    assert from_arrow["Year"].tolist() == ["2021", "n.d.", "2019", "2020", "2024"]
+    assert from_arrow["Abstract"].isna().tolist() == [False, True, False, False, False]
+    assert read_corpus(csv_path, columns=["Title"]).columns.tolist() == ["Title"]
+
+def test_arrow_and_csv_readers_keep_the_same_abstracts(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "cleaned.csv")
+    write_corpus(corpus(), csv_path)
+    from_arrow = read_abstracts(csv_path)
+
+    monkeypatch.setattr(arrow_io, "ARROW_ENABLED", False)
+    assert current_arrow_copy(csv_path) is None
+    assert read_abstracts(csv_path) == from_arrow == ["Patients' care: 12 studies.", "Risk of models.", "Care, again."]
+
+def test_column_is_streamed_in_batches(tmp_path):
+    csv_path = str(tmp_path / "cleaned.csv")
+    write_corpus(corpus(), csv_path)
+    batches = list(iter_arrow_column(csv_path, "Title", 2))
+    assert batches == [["Patient care", "Models"], ["Children", "Risk"], ["Care models"]]
+
+    no_abstracts = str(tmp_path / "no_abstracts.csv")
+    write_corpus(corpus().drop(columns="Abstract"), no_abstracts)
+    with pytest.raises(ValueError, match="'Abstract' column"):
+        list(iter_arrow_column(no_abstracts, "Abstract", 2))
+
+def test_copy_older_than_the_csv_is_ignored(tmp_path):
+    csv_path = str(tmp_path / "cleaned.csv")
+    write_corpus(corpus(), csv_path)
+    stat = os.stat(csv_path)
+    os.utime(arrow_path(csv_path), ns=(stat.st_atime_ns, stat.st_mtime_ns - 1_000_000_000))
+    assert current_arrow_copy(csv_path) is None
+
+def test_disabled_arrow_removes_a_stale_copy(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "cleaned.csv")
+    write_corpus(corpus(), csv_path)
+    monkeypatch.setattr(arrow_io, "ARROW_ENABLED", False)
+    write_corpus(corpus().head(2), csv_path)
+    assert not os.path.exists(arrow_path(csv_path))
+    assert len(read_corpus(csv_path)) == 2
+
+MERGE_INTO_BASE = """
+import sys
+import pandas as pd
+from CTM_Code.arrow_io import write_corpus, read_corpus
+from CTM_Code.clean_abstracts import merge_corpora
+
+base, new = sys.argv[1:]
+# Numeric columns come back from the Feather copy as views of the memory-mapped file
+write_corpus(pd.DataFrame({
+    "Title": [f"Paper {i}" for i in range(20000)],
+    "Year": range(20000),
+    "Abstract": [f"Abstract {i} on patient care. " * 10 for i in range(20000)],
+}), base)
+write_corpus(pd.DataFrame({"Title": ["New"], "Year": [2026], "Abstract": ["A new abstract."]}), new)
+merge_corpora(base, new, base)
+merged = read_corpus(base)
+print(len(merged), merged["Year"].iloc[-1], merged["Abstract"].iloc[-1])
+"""
+
+def test_merging_into_the_base_corpus_path(tmp_path):
+    # An incremental run merges into the earlier corpus's own path while it is memory-mapped;
+    # rewriting the mapped file in place would kill the process with SIGBUS, so run it in a child
+    result = subprocess.run(
+        [sys.executable, "-c", MERGE_INTO_BASE, str(tmp_path / "cleaned.csv"), str(tmp_path / "new.csv")],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == "20001 2026 A new abstract."
+    assert sorted(os.listdir(tmp_path)) == ["cleaned.csv", "cleaned.feather", "new.csv", "new.feather"]
@@ -0,0 +1,111 @@
+import os
+import time
+
+from Pipeline_Code.artifact_cache import ArtifactCache, restore_files
+from Pipeline_Code.scheduler import StageCache
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+def test_lookup_hit_and_miss(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1 << 20)
+    output = write(tmp_path / "topics.csv", "topic,keywords\n1,health\n")
+
+    assert cache.lookup("ab" * 32) is None
+    cache.store("ab" * 32, {"topics": output, "missing": str(tmp_path / "never_written.csv")})
+    cached = cache.lookup("ab" * 32)
+
+    assert set(cached) == {"topics"}
+    with open(cached["topics"]) as f:
+        assert f.read() == "topic,keywords\n1,health\n"
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+    restore_files(cached, {"topics": str(tmp_path / "restored" / "topics.csv")})
+    assert (tmp_path / "restored" / "topics.csv").read_text() == "topic,keywords\n1,health\n"
+
+def test_entry_with_a_missing_file_is_a_miss(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1 << 20)
+    cache.store("cd" * 32, {"topics": write(tmp_path / "topics.csv", "x")})
+    os.remove(cache.lookup("cd" * 32)["topics"])
+    assert cache.lookup("cd" * 32) is None
+
+def store(cache, tmp_path, key, size, age=0):
+    # Stores a size-byte entry last used `age` seconds ago
+    cache.store(key, {"blob": write(tmp_path / f"{key[:4]}.bin", "x" * size)})
+    if age:
+        used = time.time() - age
+        os.utime(os.path.join(cache.root, key[:2], key), (used, used))
+
+def test_least_recently_used_entries_are_evicted_past_the_limit(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 2500)
+    old, used, new = "01" * 32, "02" * 32, "03" * 32
+    store(cache, tmp_path, old, 1000, age=30)
+    store(cache, tmp_path, used, 1000, age=20)
+    # Under the limit nothing is evicted, and the hit makes "old" the most recently used
+    assert cache.lookup(old) and cache.lookup(used)
+    os.utime(os.path.join(cache.root, used[:2], used), (time.time() - 20,) * 2)
+
+    store(cache, tmp_path, new, 1000)
+    assert cache.lookup(used) is None
+    assert cache.lookup(old) and cache.lookup(new)
+
+def test_checked_out_entries_are_not_evicted(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1500)
+    pinned, other, third = "04" * 32, "05" * 32, "06" * 32
+    store(cache, tmp_path, pinned, 1000, age=30)
+
+    with cache.checkout(pinned) as cached:
+        # Over the limit, but the only older entry is pinned: the new one goes instead
+        store(cache, tmp_path, other, 1000)
+        assert os.path.exists(cached["blob"])
+    assert cache.lookup(other) is None
+    assert cache.lookup(pinned)
+    os.utime(os.path.join(cache.root, pinned[:2], pinned), (time.time() - 30,) * 2)
+
+    # Unpinned, it is evicted by the next store that goes over the limit
+    store(cache, tmp_path, third, 1000)
+    assert cache.lookup(pinned) is None
+    assert cache.lookup(third)
+
+def test_checkout_of_a_missing_entry_yields_none(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1 << 20)
+    with cache.checkout("07" * 32) as cached:
+        assert cached is None
+
+def stage_cache(tmp_path, params=None):
+    source = tmp_path / "cleaned.csv"
+    code = tmp_path / "stage.py"
+    if not code.exists():
+        code.write_text("print('v1')\n")
+    return StageCache(
+        inputs=lambda: [str(source)],
+        outputs=lambda: {"out": str(tmp_path / "out.csv"), "cleaned": str(source)},
+        params=params or {"k": 5},
+        code=[str(code)],
+    ), source, code
+
+def test_stage_key_follows_inputs_params_and_code(tmp_path):
+    cache, source, code = stage_cache(tmp_path)
+    assert cache.key("fit") is None
+
+    source.write_text("abstract one\n")
+    key = cache.key("fit")
+    assert key == cache.key("fit")
+    assert key != cache.key("plot")
+    assert key != stage_cache(tmp_path, {"k": 6})[0].key("fit")
+
+    code.write_text("print('v2')\n")
+    assert cache.key("fit") != key
+    code.write_text("print('v1')\n")
+    source.write_text("abstract two\n")
+    assert cache.key("fit") != key
+
+def test_inputs_changed_ignores_inputs_the_stage_rewrites(tmp_path):
+    cache, source, _ = stage_cache(tmp_path)
+    source.write_text("abstract one\n")
+    other = write(tmp_path / "keywords.txt", "health")
+    digests = dict(cache.input_digests(), **{other: "not the real digest"})
+
+    source.write_text("rewritten by the stage\n")
+    assert cache.inputs_changed(digests) == [other]
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from Pipeline_Code.checkpoint import Checkpoint
+from Pipeline_Code.jobs import Job
+from Pipeline_Code.scheduler import Stage, run_dag
+
+def test_progress_survives_a_reload(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    output = tmp_path / "cleaned.csv"
+    output.write_text("Abstract\n")
+
+    checkpoint = Checkpoint(path)
+    checkpoint.update_run(keyword="health", k=5)
+    checkpoint.complete("clean", {"cleaned": str(output)})
+    checkpoint.mark("failed", "R fit failed")
+
+    reloaded = Checkpoint(path)
+    assert reloaded.run == {"keyword": "health", "k": 5}
+    assert reloaded.is_complete("clean")
+    assert not reloaded.is_complete("fit")
+    with open(path) as f:
+        assert json.load(f)["status"] == "failed"
+
+def test_stage_with_a_missing_output_is_not_complete(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.complete("clean", {"cleaned": str(tmp_path / "deleted.csv")})
+    assert not checkpoint.is_complete("clean")
+
+def test_resume_starts_at_the_first_incomplete_stage(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    runs = []
+    fit_fails = [True]
+
+    def stage(name):
+        output = tmp_path / f"{name}.out"
+
+        def run():
+            runs.append(name)
+            if name == "fit" and fit_fails[0]:
+                raise RuntimeError("❌ R fit failed")
+            output.write_text(name)
+        return Stage(name, run, deps=[] if name == "clean" else [previous[name]], outputs=lambda: {name: str(output)})
+
+    previous = {"fit": "clean", "summarize": "fit"}
+    stages = [stage("clean"), stage("fit"), stage("summarize")]
+
+    with pytest.raises(RuntimeError):
+        run_dag(stages, Job(), Checkpoint(path))
+    assert runs == ["clean", "fit"]
+
+    # A fresh process only has checkpoint.json to go on
+    fit_fails[0] = False
+    runs.clear()
+    checkpoint = Checkpoint(path)
+    assert run_dag(stages, Job(), checkpoint) == {"clean", "fit", "summarize"}
+    assert runs == ["fit", "summarize"]
+    assert all(checkpoint.is_complete(name) for name in ("clean", "fit", "summarize"))
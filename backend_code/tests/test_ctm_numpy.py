@@ -0,0 +1,94 @@
+import re
+
+import numpy as np
+from scipy import sparse
+
+from CTM_Code import ctm_numpy
+from CTM_Code.ctm_numpy import CTMModel, fit_ctm, perplexity, run_numpy_ctm
+
+K, WORDS_PER_TOPIC = 3, 10
+
+def synthetic_corpus(n_docs, seed):
+    """
+    Documents that each draw 90% of their words from one of K disjoint word
+    blocks (their true topic) and the rest from anywhere.
+    """
+    rng = np.random.default_rng(seed)
+    n_terms = K * WORDS_PER_TOPIC
+    labels = np.arange(n_docs) % K
+    rows = []
+    for label in labels:
+        probs = np.full(n_terms, 0.1 / n_terms)
+        probs[label * WORDS_PER_TOPIC:(label + 1) * WORDS_PER_TOPIC] += 0.9 / WORDS_PER_TOPIC
+        rows.append(rng.multinomial(40, probs))
+    return sparse.csr_matrix(np.array(rows, dtype=np.float64)), labels
+
+def test_fit_recovers_planted_topics_and_converges():
+    dtm, labels = synthetic_corpus(90, seed=1)
+    terms = [f"term{j:02d}" for j in range(dtm.shape[1])]
+    lines = []
+    model = fit_ctm(dtm, terms, K, seed=2026, control={"em_tol": 1e-5, "em_max_iter": 200}, on_output=lines.append)
+
+    # Stopped on em_tol, with a bound that never went down by more than rounding
+    bounds = [float(m.group(1)) for m in map(re.compile(r"bound: (\S+)").match, lines) if m]
+    assert len(bounds) < 200
+    assert all(later >= earlier - 1e-6 * abs(earlier) for earlier, later in zip(bounds, bounds[1:]))
+    assert model.loglik >= bounds[-1] - 1e-6 * abs(bounds[-1])
+
+    # Every topic's top words are one planted block, and documents go to their block's topic
+    blocks = [set(np.argsort(-model.log_beta[i])[:WORDS_PER_TOPIC] // WORDS_PER_TOPIC) for i in range(K)]
+    assert all(len(block) == 1 for block in blocks)
+    topic_of_block = {block.pop(): topic for topic, block in enumerate(blocks)}
+    assert sorted(topic_of_block) == list(range(K))
+    assigned = model.doc_topics.argmax(axis=1)
+    assert np.mean(assigned == np.array([topic_of_block[label] for label in labels])) > 0.95
+    assert np.allclose(model.doc_topics.sum(axis=1), 1)
+
+def test_held_out_perplexity_beats_a_uniform_model():
+    dtm, _ = synthetic_corpus(120, seed=2)
+    terms = [f"term{j:02d}" for j in range(dtm.shape[1])]
+    model = fit_ctm(dtm[:90], terms, K, seed=2026, control={"em_max_iter": 100}, on_output=lambda line: None)
+    # A model that ignores the topics can't do better than the vocabulary size
+    assert perplexity(model, dtm[90:]) < 0.6 * dtm.shape[1]
+
+def test_save_and_load_round_trip(tmp_path):
+    dtm, _ = synthetic_corpus(30, seed=3)
+    terms = [f"term{j:02d}" for j in range(dtm.shape[1])]
+    model = fit_ctm(dtm, terms, K, seed=2026, control={"em_max_iter": 5}, on_output=lambda line: None)
+    path = str(tmp_path / "ctm_model.npz")
+    model.save(path)
+    loaded = CTMModel.load(path)
+
+    assert loaded.terms == terms and loaded.k == K
+    assert loaded.loglik == model.loglik
+    for name in ("mu", "sigma", "log_beta", "doc_topics"):
+        assert np.array_equal(getattr(loaded, name), getattr(model, name))
+
+def test_every_e_step_uses_the_requested_control(tmp_path, monkeypatch):
+    dtm, _ = synthetic_corpus(30, seed=4)
+    dtm_dir = tmp_path / "dtm"
+    dtm_dir.mkdir()
+    cells = dtm.tocoo()
+    (dtm_dir / "dtm.mtx").write_text(
+        f"%%MatrixMarket matrix coordinate integer general\n{dtm.shape[0]} {dtm.shape[1]} {dtm.nnz}\n"
+        + "".join(f"{i + 1} {j + 1} {int(n)}\n" for i, j, n in zip(cells.row, cells.col, cells.data))
+    )
+    (dtm_dir / "vocab.txt").write_text("".join(f"term{j:02d}\n" for j in range(dtm.shape[1])))
+
+    settings = []
+    e_step = ctm_numpy.e_step
+
+    def recording_e_step(model, dtm, lam=None, nu2=None, var_tol=ctm_numpy.DEFAULT_CONTROL["var_tol"],
+                         var_max_iter=ctm_numpy.DEFAULT_CONTROL["var_max_iter"]):
+        settings.append((var_tol, var_max_iter))
+        return e_step(model, dtm, lam, nu2, var_tol, var_max_iter)
+
+    monkeypatch.setattr(ctm_numpy, "e_step", recording_e_step)
+    control = {"em_max_iter": 3, "var_tol": 1e-4, "var_max_iter": 7}
+    run_numpy_ctm(
+        str(dtm_dir), str(tmp_path), str(tmp_path / "ctm_model.npz"),
+        {"k": K, "seed": 2026, "holdout": 0.2, "control": control}, on_output=lambda line: None
+    )
+    # Fit passes, the held-out perplexity and the final inference over every document
+    assert len(settings) > 4
+    assert set(settings) == {(1e-4, 7)}
@@ -0,0 +1,69 @@
+import csv
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from CTM_Code import posterior_io
+from CTM_Code.posterior_io import (
+    save_matrix, open_matrix, load_matrix, write_terms, read_terms, topic_shares, write_top_terms, export_csv
+)
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Exercise the block-at-a-time paths on tiny matrices
+    monkeypatch.setattr(posterior_io, "EXPORT_CHUNK", 2)
+
+def test_matrix_round_trip(tmp_path):
+    matrix = np.random.default_rng(0).random((5, 3))
+    path = str(tmp_path / "doc_topic.npy")
+    save_matrix(path, np.asfortranarray(matrix))
+    loaded = load_matrix(path)
+    # Stored C-ordered, so a block of rows is one contiguous read
+    assert loaded.flags["C_CONTIGUOUS"]
+    assert isinstance(loaded, np.memmap)
+    assert loaded.dtype == np.float64
+    assert np.array_equal(loaded, matrix)
+
+def test_open_matrix_is_filled_a_batch_at_a_time(tmp_path):
+    path = str(tmp_path / "doc_topic.npy")
+    rows = np.arange(12, dtype=float).reshape(4, 3)
+    written = open_matrix(path, rows.shape)
+    written[:2] = rows[:2]
+    written[2:] = rows[2:]
+    written.flush()
+    del written
+    assert np.array_equal(load_matrix(path), rows)
+
+def test_terms_round_trip(tmp_path):
+    terms = ["patient", "patient_care", "naïve", "über_model"]
+    write_terms(terms, str(tmp_path / "terms.txt"))
+    assert read_terms(str(tmp_path / "terms.txt")) == terms
+
+def test_topic_shares(tmp_path):
+    path = str(tmp_path / "doc_topic.npy")
+    save_matrix(path, [[0.5, 0.5, 0.0], [1.0, 0.0, 0.0], [0.2, 0.2, 0.6], [0.3, 0.3, 0.4], [1.0, 0.0, 0.0]])
+    assert topic_shares(path) == pytest.approx([3.0 / 5, 1.0 / 5, 1.0 / 5])
+
+def test_top_terms_keep_each_topics_largest_probabilities(tmp_path):
+    beta = np.array([[0.1, 0.6, 0.3, 0.0], [0.4, 0.05, 0.05, 0.5], [0.22, 0.28, 0.2, 0.3]])
+    save_matrix(str(tmp_path / "topic_word.npy"), beta)
+    write_top_terms(str(tmp_path / "topic_word.npy"), str(tmp_path / "top.npz"), 2)
+
+    top = sparse.load_npz(str(tmp_path / "top.npz")).toarray()
+    expected = np.zeros_like(beta)
+    for i, cols in enumerate([[1, 2], [0, 3], [1, 3]]):
+        expected[i, cols] = beta[i, cols]
+    assert top.shape == beta.shape
+    assert np.allclose(top, expected)
+
+def test_export_csv_round_trip(tmp_path):
+    matrix = np.random.default_rng(1).random((5, 3))
+    save_matrix(str(tmp_path / "topic_word.npy"), matrix)
+    export_csv(str(tmp_path / "topic_word.npy"), str(tmp_path / "topic_word.csv"), ["patient", "care", "model"])
+
+    with open(tmp_path / "topic_word.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["patient", "care", "model"]
+    # %.15g keeps enough digits to read back the same doubles (to within one ulp)
+    assert np.allclose(np.array(rows[1:], dtype=float), matrix, rtol=1e-14, atol=0)
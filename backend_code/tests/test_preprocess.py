@@ -0,0 +1,102 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from CTM_Code import preprocess
+
+# corpus.csv with the DTM tm's rules give for it, worked out by hand (R was not available to
+# build it); make_r_dtm.R writes what R itself builds, with the real lemma table, to r/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "tm_rules_dtm")
+R_DTM_DIR = os.path.join(FIXTURE_DIR, "r")
+
+def read_dtm(dtm_dir):
+    # ({(doc, term): count}, number of documents) of a dtm.mtx/vocab.txt pair
+    with open(os.path.join(dtm_dir, "vocab.txt"), encoding="utf-8") as f:
+        vocab = f.read().splitlines()
+    with open(os.path.join(dtm_dir, "dtm.mtx"), encoding="utf-8") as f:
+        lines = [line.split() for line in f if not line.startswith("%")]
+    n_docs, n_terms, nnz = map(int, lines[0])
+    assert (n_terms, nnz) == (len(vocab), len(lines) - 1)
+    return {(int(i), vocab[int(j) - 1]): int(n) for i, j, n in lines[1:]}, n_docs
+
+@pytest.fixture
+def fixture_lemmas(monkeypatch):
+    monkeypatch.setattr(preprocess, "LEMMA_FILE", os.path.join(FIXTURE_DIR, "lemmas.tsv"))
+
+def test_python_dtm_follows_the_tm_rules(tmp_path, fixture_lemmas):
+    # Regression check against the hand-derived DTM, not evidence of parity with R
+    paths = preprocess.build_dtm(os.path.join(FIXTURE_DIR, "corpus.csv"), str(tmp_path), workers=1)
+    assert read_dtm(os.path.dirname(paths["matrix"])) == read_dtm(FIXTURE_DIR)
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(R_DTM_DIR, "dtm.mtx")), reason="make_r_dtm.R has not been run")
+def test_python_dtm_matches_the_r_dtm(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocess, "LEMMA_FILE", os.path.join(R_DTM_DIR, "lemmas.tsv"))
+    paths = preprocess.build_dtm(os.path.join(FIXTURE_DIR, "corpus.csv"), str(tmp_path), workers=1)
+    assert read_dtm(os.path.dirname(paths["matrix"])) == read_dtm(R_DTM_DIR)
+
+def test_normalize_follows_the_tm_chain(fixture_lemmas):
+    preprocess._init_worker(preprocess.LEMMA_FILE)
+    assert preprocess.normalize("Patient-care studies (2019) of the children's models.") == [
+        "patientcare", "study", "childrens", "model"
+    ]
+    # Like tm's wordLengths, the length filter applies to terms: "of" goes, its bigrams stay
+    assert preprocess.document_terms(["patient", "care", "of", "care"]) == {
+        "patient": 1, "care": 2, "patient_care": 1, "care_of": 1, "of_care": 1
+    }
+
+@pytest.fixture
+def no_r(tmp_path, monkeypatch):
+    # A host without R or a bundled table; returns the export attempts made
+    attempts = []
+
+    def run_r(*args, **kwargs):
+        attempts.append(args)
+        raise RuntimeError("Rscript not found")
+
+    monkeypatch.setattr(preprocess, "LEMMA_FILE", str(tmp_path / "lemmas.tsv"))
+    monkeypatch.setattr(preprocess, "BUNDLED_LEMMA_FILE", str(tmp_path / "lemmas_bundled.tsv"))
+    monkeypatch.setattr(preprocess, "_lemma_export_failed", False)
+    monkeypatch.setattr(preprocess, "run_r", run_r)
+    return attempts
+
+def test_missing_lemmas_are_an_error_unless_allowed(no_r, monkeypatch):
+    with pytest.raises(RuntimeError, match="CTM_REQUIRE_LEMMAS=0"):
+        preprocess.lemmatization_ready()
+
+    monkeypatch.setattr(preprocess, "REQUIRE_LEMMAS", False)
+    assert preprocess.lemmatization_ready() is False
+    assert not preprocess.lemmas_available()
+
+def test_failed_export_is_not_retried_and_the_bundled_table_is_used(no_r, tmp_path):
+    assert not preprocess.ensure_lemmas()
+    assert not preprocess.ensure_lemmas()
+    assert len(no_r) == 1
+
+    (tmp_path / "lemmas_bundled.tsv").write_text("token\tlemma\nstudies\tstudy\n")
+    assert preprocess.ensure_lemmas()
+    assert len(no_r) == 1
+    assert preprocess.load_lemmas(preprocess.LEMMA_FILE) == {"studies": "study"}
+
+TOKENIZE_FROM_MAIN = """
+import sys
+print("main script imported", flush=True)
+from CTM_Code import preprocess
+
+if __name__ == "__main__":
+    preprocess.PARALLEL_MIN_DOCS = 1
+    parallel = preprocess.tokenize(["Patients' care for 12 studies."] * 40, workers=3)
+    assert parallel == preprocess.tokenize(["Patients' care for 12 studies."] * 40, workers=1)
+    print(len(parallel), flush=True)
+"""
+
+def test_tokenizer_processes_do_not_rerun_the_main_script(tmp_path, fixture_lemmas):
+    # Under app.py, a child that re-imports __main__ builds the Flask app again
+    script = tmp_path / "server.py"
+    script.write_text(TOKENIZE_FROM_MAIN)
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, CTM_LEMMA_FILE=preprocess.LEMMA_FILE)
+    result = subprocess.run([sys.executable, str(script)], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == ["main script imported", "40"]
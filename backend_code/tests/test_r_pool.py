@@ -0,0 +1,57 @@
+import sys
+import stat
+
+import pytest
+
+from CTM_Code.r_pool import RWorker, WorkerDied, split_status
+
+# Stands in for Rscript r_worker.R: same protocol, and its "scripts" are just names
+FAKE_WORKER = """
+import os
+import sys
+import time
+
+sys.stdout.write("Loading required package: NLP")
+print("@@CTM_WORKER@@ READY", flush=True)
+for line in sys.stdin:
+    script = line.split("\\t")[0]
+    print("**** em iteration 1 ****", flush=True)
+    if script == "die":
+        os._exit(3)
+    if script == "hang":
+        time.sleep(60)
+    # Like cat() without a final newline: the status lands mid-line
+    sys.stdout.write("converged")
+    print("@@CTM_WORKER@@ ERROR" if script == "fail" else "@@CTM_WORKER@@ OK", flush=True)
+"""
+
+@pytest.fixture
+def worker(tmp_path):
+    rscript = tmp_path / "Rscript"
+    rscript.write_text(f"#!{sys.executable}\n{FAKE_WORKER}")
+    rscript.chmod(rscript.stat().st_mode | stat.S_IEXEC)
+    worker = RWorker(str(rscript))
+    yield worker
+    worker.close()
+
+def test_split_status():
+    assert split_status("**** em iteration 3 ****") == ("**** em iteration 3 ****", None)
+    assert split_status("@@CTM_WORKER@@ OK ") == ("", "OK")
+    assert split_status("done@@CTM_WORKER@@ ERROR") == ("done", "ERROR")
+
+def test_status_after_unterminated_output_ends_the_job(worker, tmp_path):
+    output = []
+    assert worker.run("ctm_optimized.R", [], str(tmp_path), output.append, timeout=10)
+    assert output == ["**** em iteration 1 ****", "converged"]
+    assert not worker.run("fail", [], str(tmp_path), output.append, timeout=10)
+    assert worker.alive()
+
+def test_dead_or_hung_workers_raise(worker, tmp_path):
+    with pytest.raises(WorkerDied, match="more than 1s"):
+        worker.run("hang", [], str(tmp_path), lambda line: None, timeout=1)
+    # Killed by the watchdog, not left running
+    assert worker.process.wait(timeout=5) != 0
+
+def test_worker_exiting_mid_job_raises(worker, tmp_path):
+    with pytest.raises(WorkerDied, match="exited"):
+        worker.run("die", [], str(tmp_path), lambda line: None, timeout=10)
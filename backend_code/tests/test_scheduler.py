@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from Pipeline_Code import scheduler
+from Pipeline_Code.artifact_cache import ArtifactCache
+from Pipeline_Code.jobs import Job
+from Pipeline_Code.scheduler import Stage, StageCache, run_dag, pool_size, IO, PYTHON, R_FIT, RESOURCE_LIMITS
+
+def recorder(events, name, fn=None):
+    def run():
+        events.append(("start", name))
+        if fn:
+            fn()
+        events.append(("end", name))
+    return run
+
+def test_stages_start_after_their_dependencies():
+    events = []
+    # b and c only both get past the barrier if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [
+        Stage("a", recorder(events, "a")),
+        Stage("b", recorder(events, "b", barrier.wait), deps=["a"]),
+        Stage("c", recorder(events, "c", barrier.wait), deps=["a"], resource=IO),
+        Stage("d", recorder(events, "d"), deps=["b", "c"]),
+    ]
+    done = run_dag(stages, Job())
+
+    assert done == {"a", "b", "c", "d"}
+    position = {event: i for i, event in enumerate(events)}
+    assert position[("end", "a")] < position[("start", "b")]
+    assert position[("end", "a")] < position[("start", "c")]
+    assert position[("start", "d")] > max(position[("end", "b")], position[("end", "c")])
+
+def test_failure_stops_new_stages_and_is_raised():
+    events = []
+    release = threading.Event()
+
+    def fail():
+        raise RuntimeError("❌ R fit failed")
+
+    stages = [
+        Stage("slow", recorder(events, "slow", lambda: release.wait(5)), resource=IO),
+        Stage("fit", fail, resource=R_FIT),
+        Stage("after_fit", recorder(events, "after_fit"), deps=["fit"]),
+        Stage("after_slow", recorder(events, "after_slow"), deps=["slow"]),
+    ]
+    threading.Timer(0.2, release.set).start()
+    with pytest.raises(RuntimeError, match="R fit failed"):
+        run_dag(stages, Job())
+
+    # The stage already running was allowed to finish, nothing new was started
+    assert ("end", "slow") in events
+    assert not any(name in ("after_fit", "after_slow") for _, name in events)
+
+def test_unknown_dependency_and_cycle_are_rejected():
+    with pytest.raises(ValueError, match="unknown stages"):
+        run_dag([Stage("a", lambda: None, deps=["missing"])], Job())
+    with pytest.raises(RuntimeError, match="cycle"):
+        run_dag([Stage("a", lambda: None, deps=["b"]), Stage("b", lambda: None, deps=["a"])], Job())
+
+def test_unknown_resource_class_is_rejected():
+    with pytest.raises(ValueError, match="Unknown resource class"):
+        Stage("a", lambda: None, resource="gpu")
+
+def test_pool_size_follows_resource_limits():
+    fits = [Stage(f"fit_{i}", lambda: None, resource=R_FIT) for i in range(RESOURCE_LIMITS[R_FIT] + 3)]
+    plots = [Stage(f"plot_{i}", lambda: None) for i in range(2)]
+    assert pool_size(fits) == RESOURCE_LIMITS[R_FIT]
+    assert pool_size(fits + plots) == RESOURCE_LIMITS[R_FIT] + min(2, RESOURCE_LIMITS[PYTHON])
+    assert pool_size([]) == 1
+
+def cached_stage(tmp_path, fn):
+    source = tmp_path / "input.txt"
+    target = tmp_path / "output.txt"
+    cache = StageCache(
+        inputs=lambda: [str(source)],
+        outputs=lambda: {"out": str(target)},
+        params={"k": 5},
+    )
+    return Stage("copy", fn, cache=cache), source, target
+
+def test_cached_outputs_are_restored_on_a_hit(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "artifact_cache", ArtifactCache(str(tmp_path / "cache"), 1 << 20))
+    runs = []
+
+    def copy():
+        runs.append(1)
+        target.write_text(source.read_text().upper())
+
+    stage, source, target = cached_stage(tmp_path, copy)
+    source.write_text("abstract")
+    run_dag([stage], Job())
+    target.unlink()
+
+    run_dag([stage], Job())
+    assert len(runs) == 1
+    assert target.read_text() == "ABSTRACT"
+
+    # New input content is a new key, so the stage runs again
+    source.write_text("another abstract")
+    run_dag([stage], Job())
+    assert len(runs) == 2
+    assert target.read_text() == "ANOTHER ABSTRACT"
+
+def test_outputs_are_not_cached_when_inputs_change_while_running(tmp_path, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1 << 20)
+    monkeypatch.setattr(scheduler, "artifact_cache", cache)
+
+    def copy_then_input_replaced():
+        target.write_text(source.read_text())
+        source.write_text("replaced by a newer upload")
+
+    stage, source, target = cached_stage(tmp_path, copy_then_input_replaced)
+    source.write_text("abstract")
+    key = stage.cache.key("copy")
+    run_dag([stage], Job())
+
+    assert cache.lookup(key) is None
@@ -0,0 +1,87 @@
+import time
+import threading
+
+import pytest
+
+from Pipeline_Code.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "zip"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("query", work, owner="job-1")))
+    leader.start()
+    assert started.wait(5)
+    assert flight.in_flight("query") == "job-1"
+
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do("query", work, owner="job-2")))
+        for _ in range(3)
+    ]
+    for thread in followers:
+        thread.start()
+    # Followers arriving while the leader runs must wait for it, not run work() again
+    time.sleep(0.2)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert sorted(results, key=lambda r: r[1] or "") == [("zip", None)] + [("zip", "job-1")] * 3
+    assert flight.in_flight("query") is None
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, None)
+    assert flight.do("b", lambda: 2) == (2, None)
+
+def test_failure_reaches_waiters_and_clears_the_key():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("R crashed")
+
+    errors = []
+
+    def call(owner):
+        try:
+            flight.do("query", fail, owner=owner)
+        except Exception as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call, args=("job-1",))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call, args=("job-2",))
+    follower.start()
+    # Give the follower time to find the leader's call in flight and wait on it
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    leader_error, follower_error = sorted(errors, key=lambda e: isinstance(e, RuntimeError))
+    assert isinstance(leader_error, ValueError)
+    assert isinstance(follower_error, RuntimeError)
+    assert "job-1" in str(follower_error) and "R crashed" in str(follower_error)
+    assert flight.in_flight("query") is None
+    # A later call runs again instead of replaying the failure
+    assert flight.do("query", lambda: "ok") == ("ok", None)
+
+def test_leader_exception_propagates():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do("query", lambda: {}["missing"])
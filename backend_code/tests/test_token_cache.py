@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from CTM_Code import preprocess
+from Pipeline_Code.token_cache import TokenCache
+
+@pytest.fixture
+def lemma_file(tmp_path, monkeypatch):
+    path = tmp_path / "lemmas.tsv"
+    monkeypatch.setattr(preprocess, "LEMMA_FILE", str(path))
+    return path
+
+def test_get_many_and_put_many(tmp_path):
+    cache = TokenCache(str(tmp_path / "tokens.sqlite3"), 1 << 20)
+    cache.put_many({"a": ["patient", "care"], "b": ["study"]})
+    assert cache.get_many(["a", "b", "c", "a"]) == {"a": ["patient", "care"], "b": ["study"]}
+    assert cache.stats() == {"hits": 2, "misses": 1}
+
+def test_least_recently_used_rows_are_evicted(tmp_path):
+    cache = TokenCache(str(tmp_path / "tokens.sqlite3"), 100)
+    cache.put_many({"old": ["x" * 40]})
+    cache.put_many({"new": ["y" * 40]})
+    # The hit makes "old" more recently used than "new"
+    assert cache.get_many(["old"]) == {"old": ["x" * 40]}
+    # Over the limit: the least recently used rows go until the store is 10% under it
+    cache.put_many({"newest": ["z" * 40]})
+    assert set(cache.get_many(["old", "new", "newest"])) == {"old", "newest"}
+
+def test_keys_follow_abstract_version_and_lemma_table(lemma_file, monkeypatch):
+    no_table = preprocess.token_keys(["Patients care", "Studies"])
+    assert len(set(no_table)) == 2
+    assert preprocess.token_keys(["Patients care"]) == no_table[:1]
+
+    # Writing the table (as ensure_lemmas() does mid-process) changes every key
+    lemma_file.write_text("token\tlemma\npatients\tpatient\n")
+    with_table = preprocess.token_keys(["Patients care"])
+    assert with_table != no_table[:1]
+
+    # So does any edit of it, even one that keeps its size
+    lemma_file.write_text("token\tlemma\nstudies\tstudies\n")
+    os.utime(lemma_file, ns=(0, os.stat(lemma_file).st_mtime_ns + 1_000_000))
+    assert preprocess.token_keys(["Patients care"]) != with_table
+
+    monkeypatch.setattr(preprocess, "PREPROCESS_VERSION", preprocess.PREPROCESS_VERSION + 1)
+    assert preprocess.token_keys(["Patients care"]) not in (with_table, no_table[:1])
+
+def test_count_terms_reuses_cached_tokens(tmp_path, lemma_file):
+    cache = TokenCache(str(tmp_path / "tokens.sqlite3"), 1 << 20)
+    abstracts = ["Patients care for patients.", "Studies of models."]
+    expected = preprocess.count_terms(abstracts, workers=1)
+
+    assert preprocess.count_terms(abstracts, 1, cache) == expected
+    assert cache.stats() == {"hits": 0, "misses": 2}
+    assert preprocess.count_terms(abstracts, 1, cache) == expected
+    assert cache.stats() == {"hits": 2, "misses": 2}
+
+    # A new lemma table misses the old tokens instead of reusing unlemmatized ones
+    lemma_file.write_text("token\tlemma\npatients\tpatient\nstudies\tstudy\nmodels\tmodel\n")
+    lemmatized = preprocess.count_terms(abstracts, 1, cache)
+    assert cache.stats() == {"hits": 2, "misses": 4}
+    assert lemmatized[0] == {"patient": 2, "care": 1, "patient_care": 1, "care_patient": 1}
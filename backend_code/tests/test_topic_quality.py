@@ -0,0 +1,80 @@
+import csv
+import math
+
+import numpy as np
+import pytest
+
+from CTM_Code.posterior_io import save_matrix, write_terms
+from CTM_Code.topic_quality import evaluate_topics, read_quality, umass_coherence
+
+# Four documents over a, b, c:  d1 = a b,  d2 = a b c c,  d3 = a a,  d4 = c
+# D(a) = 3, D(b) = 2, D(c) = 2, D(a, b) = 2, D(a, c) = 1, D(b, c) = 1
+DTM = ["1 1 1", "1 2 1", "2 1 1", "2 2 1", "2 3 2", "3 1 2", "4 3 1"]
+# Topic-word columns in a different order from the DTM's vocabulary, to exercise the remapping
+TERMS = ["c", "a", "b"]
+BETA = [[0.2, 0.5, 0.3],    # top terms a, b, c
+        [0.6, 0.1, 0.3]]    # top terms c, b, a
+THETA = [[1, 0], [0.5, 0.5], [1, 0], [0, 1]]
+
+# UMass, sum over (w_i ranked above w_j) of log((D(w_i, w_j) + 1) / D(w_i))
+UMASS_1 = math.log(3 / 3) + math.log(2 / 3) + math.log(2 / 2)    # (a, b), (a, c), (b, c)
+UMASS_2 = math.log(2 / 2) + math.log(2 / 2) + math.log(3 / 2)    # (c, b), (c, a), (b, a)
+# NPMI is symmetric, so both topics average the same three pairs
+NPMI = (math.log(0.5 / (0.75 * 0.5)) / -math.log(0.5)      # (a, b)
+        + math.log(0.25 / (0.75 * 0.5)) / -math.log(0.25)  # (a, c)
+        + 0.0) / 3                                         # (b, c): independent
+# Share of each top term's probability held by the topic, averaged over its top terms
+EXCLUSIVITY_1 = (0.5 / 0.6 + 0.3 / 0.6 + 0.2 / 0.8) / 3
+EXCLUSIVITY_2 = (0.6 / 0.8 + 0.3 / 0.6 + 0.1 / 0.6) / 3
+# Words: d1 a(.5) b(.3), d2 under (.5, .5): a(.3) b(.3) 2 x c(.4), d3 2 x a(.5), d4 c(.6)
+POSTERIOR_PERPLEXITY = math.exp(-(
+    math.log(0.5) + math.log(0.3) + math.log(0.3) + math.log(0.3) + 2 * math.log(0.4) + 2 * math.log(0.5) + math.log(0.6)
+) / 9)
+
+@pytest.fixture
+def model(tmp_path):
+    dtm_dir = tmp_path / "dtm"
+    dtm_dir.mkdir()
+    (dtm_dir / "dtm.mtx").write_text(
+        "%%MatrixMarket matrix coordinate integer general\n4 3 7\n" + "\n".join(DTM) + "\n"
+    )
+    (dtm_dir / "vocab.txt").write_text("a\nb\nc\n")
+    save_matrix(str(tmp_path / "topic_word.npy"), np.array(BETA))
+    save_matrix(str(tmp_path / "doc_topic.npy"), np.array(THETA, dtype=float))
+    write_terms(TERMS, str(tmp_path / "terms.txt"))
+    (tmp_path / "fit_stats.csv").write_text("k,logLik,n_train,n_test,perplexity\n2,-10.5,3,1,42.5\n")
+    return tmp_path
+
+def test_scores_match_hand_computed_values(model):
+    quality = evaluate_topics(
+        str(model / "topic_word.npy"), str(model / "doc_topic.npy"), str(model / "terms.txt"),
+        str(model / "fit_stats.csv"), str(model / "quality"), dtm_dir=str(model / "dtm")
+    )
+
+    assert quality["umass"] == pytest.approx((UMASS_1 + UMASS_2) / 2, abs=1e-6)
+    assert quality["npmi"] == pytest.approx(NPMI, abs=1e-6)
+    assert quality["diversity"] == 0.5
+    assert quality["exclusivity"] == pytest.approx((EXCLUSIVITY_1 + EXCLUSIVITY_2) / 2, abs=1e-6)
+    assert quality["posterior_perplexity"] == pytest.approx(POSTERIOR_PERPLEXITY, abs=1e-6)
+    assert quality["heldout_perplexity"] == 42.5
+    assert (quality["k"], quality["n_docs"], quality["n_test"]) == (2, 4, 1)
+    assert read_quality(str(model / "quality" / "model_quality.csv")) == quality
+
+    with open(model / "quality" / "topic_quality.csv", newline="") as f:
+        topics = list(csv.DictReader(f))
+    assert [row["Top_Terms"] for row in topics] == ["a; b; c", "c; b; a"]
+    assert [float(row["UMass"]) for row in topics] == pytest.approx([UMASS_1, UMASS_2], abs=1e-6)
+    assert [float(row["NPMI"]) for row in topics] == pytest.approx([NPMI, NPMI], abs=1e-6)
+    assert [float(row["Exclusivity"]) for row in topics] == pytest.approx([EXCLUSIVITY_1, EXCLUSIVITY_2], abs=1e-6)
+
+def test_umass_coherence_of_the_model(model):
+    coherence = umass_coherence(str(model / "dtm"), str(model / "topic_word.npy"), str(model / "terms.txt"))
+    assert coherence == pytest.approx((UMASS_1 + UMASS_2) / 2, abs=1e-6)
+
+def test_without_a_dtm_only_topic_word_scores_are_reported(model):
+    quality = evaluate_topics(
+        str(model / "topic_word.npy"), str(model / "doc_topic.npy"), str(model / "terms.txt"),
+        str(model / "fit_stats.csv"), str(model / "quality")
+    )
+    assert quality["umass"] is None and quality["npmi"] is None and quality["posterior_perplexity"] is None
+    assert quality["diversity"] == 0.5
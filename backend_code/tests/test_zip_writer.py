@@ -0,0 +1,27 @@
+import zipfile
+
+import numpy as np
+
+from Pipeline_Code.zip_writer import write_zip
+
+def test_entries_are_compressed_per_file_type(tmp_path):
+    folder = tmp_path / "health_data"
+    (folder / "CTM Results").mkdir(parents=True)
+    (folder / "CTM Results" / "topics.csv").write_text("topic,keywords\n" + "1,health; care\n" * 200)
+    np.save(folder / "CTM Results" / "doc_topic.npy", np.full((200, 5), 0.2))
+    (folder / "chart.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4)
+
+    zip_path = str(tmp_path / "health.zip")
+    assert write_zip(str(folder), zip_path) == zip_path
+
+    with zipfile.ZipFile(zip_path) as archive:
+        entries = {info.filename: info for info in archive.infolist()}
+        assert set(entries) == {"CTM Results/", "CTM Results/doc_topic.npy", "CTM Results/topics.csv", "chart.png"}
+        assert entries["chart.png"].compress_type == zipfile.ZIP_STORED
+        for name in ("CTM Results/topics.csv", "CTM Results/doc_topic.npy"):
+            assert entries[name].compress_type == zipfile.ZIP_DEFLATED
+            assert entries[name].compress_size < entries[name].file_size
+        assert archive.testzip() is None
+        assert archive.read("chart.png") == (folder / "chart.png").read_bytes()
+
+    assert not (tmp_path / "health.zip.tmp").exists()
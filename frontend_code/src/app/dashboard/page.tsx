@@ -10,6 +10,8 @@ import { LayoutDashboard, User } from "lucide-react";
 import { toast, ToastContainer } from "react-toastify";
 import "react-toastify/dist/ReactToastify.css";
 
+const BACKEND_URL = "http://127.0.0.1:5000";
+
 interface Project {
   name: string;
   keywords: string;
@@ -23,7 +25,10 @@ export default function Dashboard() {
   const [darkMode, setDarkMode] = useState(true);
   const [showDropdown, setShowDropdown] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [progressText, setProgressText] = useState("Generating outputs…");
   const [showAll, setShowAll] = useState(false);
+  const [withPreview, setWithPreview] = useState(false);
+  const [previewUrl, setPreviewUrl] = useState<string | null>(null);
 
   useEffect(() => {
     const storedName = localStorage.getItem("ecliptica_username") || "User";
@@ -37,13 +42,78 @@ export default function Dashboard() {
     window.location.href = "/";
   };
 
+  // Fallback when the event stream is unavailable: poll the job until the pipeline has finished
+  const pollStatus = async (statusUrl: string) => {
+    let status = "queued";
+    while (status === "queued" || status === "running") {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const statusResponse = await fetch(`${BACKEND_URL}${statusUrl}`);
+      if (!statusResponse.ok) throw new Error("Backend error");
+      status = (await statusResponse.json()).status;
+    }
+    return status;
+  };
+
+  // Final job status from its event stream; switches to polling only if the stream fails for good
+  const waitForJob = (events: EventSource, statusUrl: string) =>
+    new Promise<string>((resolve, reject) => {
+      let opened = false;
+      let polling = false;
+      events.addEventListener("open", () => {
+        opened = true;
+      });
+      events.addEventListener("status", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        if (data.status === "done" || data.status === "failed") resolve(data.status);
+      });
+      events.onerror = () => {
+        // After a dropped connection the browser reconnects (and replays missed events) by itself
+        if (polling || (opened && events.readyState !== EventSource.CLOSED)) return;
+        polling = true;
+        events.close();
+        pollStatus(statusUrl).then(resolve, reject);
+      };
+    });
+
   const handleCreateProject = async () => {
     setLoading(true);
+    setProgressText("Generating outputs…");
+    setPreviewUrl(null);
+    let events: EventSource | null = null;
     try {
-      const response = await fetch("http://127.0.0.1:5000/run_ctm", {
+      // Optionally ask for a quick preview fit first; the full model replaces it when done
+      const form = new FormData();
+      if (withPreview) form.append("preview", "1");
+      const submit = await fetch(`${BACKEND_URL}/jobs`, {
         method: "POST",
+        body: form,
       });
 
+      if (!submit.ok) throw new Error("Backend error");
+      const { status_url, result_url, events_url, preview_url } = await submit.json();
+
+      // Live stage and CTM iteration updates from the backend
+      events = new EventSource(`${BACKEND_URL}${events_url}`);
+      events.addEventListener("stage", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        if (data.state === "started") setProgressText(`Running ${data.stage}…`);
+      });
+      events.addEventListener("preview", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        if (data.state === "ready") {
+          setProgressText(`Preview ready (${data.docs} of ${data.total_docs} papers), refining the full model…`);
+          setPreviewUrl(`${BACKEND_URL}${preview_url}`);
+        }
+      });
+      events.addEventListener("iteration", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        setProgressText(`Fitting topic model: iteration ${data.iteration} (about ${Math.ceil(data.eta_seconds)}s left)`);
+      });
+
+      const status = await waitForJob(events, status_url);
+      if (status !== "done") throw new Error("Pipeline failed");
+
+      const response = await fetch(`${BACKEND_URL}${result_url}`);
       if (!response.ok) throw new Error("Backend error");
 
       const blob = await response.blob();
@@ -71,6 +141,8 @@ export default function Dashboard() {
       console.error("Error:", error);
       alert("Something went wrong. Make sure the backend is running.");
     } finally {
+      events?.close();
+      setPreviewUrl(null);
       setLoading(false);
     }
   };
@@ -178,16 +250,27 @@ export default function Dashboard() {
           <div className={`rounded-xl p-6 shadow ${darkMode ? "bg-[#1e293b]" : "bg-gray-100"}`}>
             <div className="flex justify-between items-center mb-4">
               <h2 className="text-2xl font-semibold">Recent Projects</h2>
-              <button onClick={handleCreateProject} disabled={loading} className="flex items-center space-x-2 bg-[#bd7cd0] text-white px-4 py-2 rounded-full hover:bg-purple-600 text-sm">
-                <Plus className="w-4 h-4" />
-                <span>{loading ? "Processing..." : "Create New Project"}</span>
-              </button>
+              <div className="flex items-center space-x-4">
+                <label className="flex items-center space-x-2 text-sm cursor-pointer">
+                  <input type="checkbox" checked={withPreview} disabled={loading} onChange={(e) => setWithPreview(e.target.checked)} />
+                  <span>Quick preview first</span>
+                </label>
+                <button onClick={handleCreateProject} disabled={loading} className="flex items-center space-x-2 bg-[#bd7cd0] text-white px-4 py-2 rounded-full hover:bg-purple-600 text-sm">
+                  <Plus className="w-4 h-4" />
+                  <span>{loading ? "Processing..." : "Create New Project"}</span>
+                </button>
+              </div>
             </div>
 
             {loading && (
               <div className="flex justify-center items-center mb-4">
                 <div className="animate-spin rounded-full h-6 w-6 border-t-4 border-purple-500"></div>
-                <span className="ml-4 text-purple-600">Generating outputs…</span>
+                <span className="ml-4 text-purple-600">{progressText}</span>
+                {previewUrl && (
+                  <a href={previewUrl} download className="ml-4 text-purple-600 underline font-medium">
+                    Download preview
+                  </a>
+                )}
               </div>
             )}
 